@@ -0,0 +1,244 @@
+import json
+import time
+import requests
+
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Gateway errors which are worth retrying.
+RETRY_STATUSES = (502, 503, 504)
+
+
+class EventStream:
+    """
+    This class provides events of a Server-Sent Events response as they
+    arrive.
+    """
+
+    def __init__(self, response):
+        """
+        Constructor for EventStream
+
+        Args:
+            response: Streamed response.
+
+        Returns:
+            None
+        """
+        self._response = response
+
+    def __iter__(self):
+        """
+        This function yields events of the stream until it ends.
+
+        Args:
+            None
+
+        Returns:
+            Generator of tuples of event name and decoded JSON data.
+        """
+        event, data = "message", []
+        # Lines are read as soon as they arrive, not in fixed-size chunks.
+        for line in self._response.iter_lines(
+            chunk_size=None, decode_unicode=True
+        ):
+            if not line:
+                if data:
+                    yield event, json.loads("\n".join(data))
+                event, data = "message", []
+            elif not line.startswith(":"):
+                field, _, value = line.partition(":")
+                value = value[1:] if value.startswith(" ") else value
+                if field == "event":
+                    event = value
+                elif field == "data":
+                    data.append(value)
+
+    def close(self):
+        """
+        This function closes the stream. It may be called from another
+        thread to interrupt iteration.
+
+        Args:
+            None
+
+        Returns:
+            None
+        """
+        self._response.close()
+
+
+class APIClient:
+    """
+    This class provides client of PyStock API shared by all frames and
+    windows. Connections are kept alive and pooled, every request has a
+    timeout, failed connection attempts are retried for all calls and
+    timeouts and gateway errors only for idempotent calls, with exponential
+    backoff.
+    """
+
+    def __init__(
+        self,
+        endpoint,
+        timeout=10.0,
+        retries=3,
+        backoff=0.5,
+        pool_size=4,
+        compress=True,
+    ):
+        """
+        Constructor for APIClient
+
+        Args:
+            endpoint: Base URL of the API (e.g. "http://127.0.0.1:5000/").
+            timeout: Seconds to wait for connection and for response.
+            retries: Number of retries of a failed request.
+            backoff: Seconds to wait before first retry, doubled for every
+            next one.
+            pool_size: Number of connections kept alive (should match
+            number of threads making requests).
+            compress: Whether to accept gzip compressed responses.
+
+        Returns:
+            None
+        """
+        self.endpoint = endpoint if endpoint.endswith("/") else endpoint + "/"
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self._session = requests.Session()
+        # Requests which never reached the server are safe to retry
+        # regardless of method.
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=pool_size,
+            max_retries=Retry(
+                total=None,
+                connect=retries,
+                read=0,
+                redirect=0,
+                status=0,
+                backoff_factor=backoff,
+            ),
+        )
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self._session.headers["Accept-Encoding"] = (
+            "gzip, deflate" if compress else "identity"
+        )
+
+    def post(self, route, payload=None, idempotent=False, headers=None):
+        """
+        This function sends `POST` request to the API.
+
+        Args:
+            route: Route of the API (e.g. "login").
+            payload: Form fields of the request.
+            idempotent: Whether request may be repeated if response is lost
+            (e.g. login, but not a trade).
+            headers: Additional headers (e.g. "If-None-Match").
+
+        Returns:
+            Decoded JSON response or None if it is `304 Not Modified`.
+        """
+        return self._request(
+            "POST", route, idempotent, data=payload, headers=headers
+        )
+
+    def get(self, route, params=None):
+        """
+        This function sends `GET` request to the API. `GET` requests are
+        always retried.
+
+        Args:
+            route: Route of the API (e.g. "cache_stats").
+            params: Query parameters of the request.
+
+        Returns:
+            Decoded JSON response.
+        """
+        return self._request("GET", route, True, params=params)
+
+    def stream(self, route, params=None, read_timeout=60.0, headers=None):
+        """
+        This function opens Server-Sent Events stream of the API.
+
+        Args:
+            route: Route of the API (e.g. "stream").
+            params: Query parameters of the request.
+            read_timeout: Seconds without any data (including heartbeats)
+            after which the stream is considered dead.
+            headers: Headers of the request (e.g. "Authorization").
+
+        Returns:
+            EventStream of the response.
+        """
+        response = self._session.get(
+            self.endpoint + route,
+            params=params,
+            headers=headers,
+            stream=True,
+            timeout=(self.timeout, read_timeout),
+        )
+        try:
+            response.raise_for_status()
+            if not response.headers.get("Content-Type", "").startswith(
+                "text/event-stream"
+            ):
+                raise ValueError(response.json().get("error", "Not a stream."))
+        except BaseException:
+            response.close()
+            raise
+        return EventStream(response)
+
+    def _request(self, method, route, idempotent, **kwargs):
+        """
+        This function sends a request, retrying it if allowed.
+
+        Args:
+            method: HTTP method.
+            route: Route of the API.
+            idempotent: Whether request may be repeated if response is lost.
+            **kwargs: Arguments of `requests.Session.request`.
+
+        Returns:
+            Decoded JSON response or None if it is `304 Not Modified`.
+        """
+        attempt = 0
+        while True:
+            try:
+                response = self._session.request(
+                    method,
+                    self.endpoint + route,
+                    timeout=self.timeout,
+                    **kwargs,
+                )
+            except requests.ReadTimeout:
+                # Request may have been processed, so only idempotent ones
+                # are repeated. Failed connections are retried by adapter.
+                if not idempotent or attempt >= self.retries:
+                    raise
+            else:
+                if (
+                    not idempotent
+                    or response.status_code not in RETRY_STATUSES
+                    or attempt >= self.retries
+                ):
+                    response.raise_for_status()
+                    if response.status_code == 304:
+                        return None
+                    return response.json()
+            time.sleep(self.backoff * 2**attempt)
+            attempt += 1
+
+    def close(self):
+        """
+        This function closes pooled connections.
+
+        Args:
+            None
+
+        Returns:
+            None
+        """
+        self._session.close()
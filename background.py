@@ -0,0 +1,368 @@
+import threading
+import time
+import tkinter as tk
+
+from concurrent import futures
+
+# Shared by all windows, so that recreating the root window doesn't leak
+# threads.
+_executor = futures.ThreadPoolExecutor(
+    max_workers=4, thread_name_prefix="pystock-worker"
+)
+
+
+class Task:
+    """This class represents a call running on the worker threads."""
+
+    def __init__(self, description, future, on_done, on_error, timeout):
+        """
+        Constructor for Task
+
+        Args:
+            description: Text shown while the task is running.
+            future: Future of the call.
+            on_done: Function called with result of the call.
+            on_error: Function called with exception raised by the call,
+            TimeoutError if it took longer than `timeout`.
+            timeout: Seconds after which the task is abandoned.
+
+        Returns:
+            None
+        """
+        self.description = description
+        self.future = future
+        self.on_done = on_done
+        self.on_error = on_error
+        self.timeout = timeout
+        self.started = time.monotonic()
+        self.cancelled = False
+
+    def elapsed(self):
+        """
+        This function provides time since the task was submitted.
+
+        Args:
+            None
+
+        Returns:
+            Elapsed seconds.
+        """
+        return time.monotonic() - self.started
+
+    def cancel(self):
+        """
+        This function cancels the task. A call which has already started
+        can't be interrupted, so its result is discarded instead.
+
+        Args:
+            None
+
+        Returns:
+            None
+        """
+        self.cancelled = True
+        self.future.cancel()
+
+
+class TaskRunner:
+    """
+    This class runs blocking calls (network requests, downloads) on worker
+    threads, so that Tk's main loop keeps processing events. Finished tasks
+    are found by polling with `after()` and their callbacks run on the Tk
+    thread, where widgets may be used safely.
+    """
+
+    def __init__(self, widget, poll_interval=50, on_change=None):
+        """
+        Constructor for TaskRunner
+
+        Args:
+            widget: Tk widget used to schedule polling.
+            poll_interval: Milliseconds between polls.
+            on_change: Function called on the Tk thread with list of
+            running tasks whenever they are polled.
+
+        Returns:
+            None
+        """
+        self._widget = widget
+        self.poll_interval = poll_interval
+        self._on_change = on_change
+        self._tasks = []
+        self._polling = False
+
+    def submit(
+        self,
+        description,
+        func,
+        *args,
+        on_done=None,
+        on_error=None,
+        timeout=30.0,
+    ):
+        """
+        This function runs `func(*args)` on a worker thread.
+
+        Args:
+            description: Text shown while the task is running. Only one task
+            with the same description runs at a time.
+            func: Function to call.
+            *args: Arguments of the call.
+            on_done: Function called with result of the call on Tk thread.
+            on_error: Function called with exception raised by the call (or
+            TimeoutError) on Tk thread.
+            timeout: Seconds after which the task is abandoned.
+
+        Returns:
+            Task or None if the same task is already running.
+        """
+        if any(task.description == description for task in self._tasks):
+            return None
+        task = Task(
+            description,
+            _executor.submit(func, *args),
+            on_done,
+            on_error,
+            timeout,
+        )
+        self._tasks.append(task)
+        if not self._polling:
+            self._polling = True
+            self._widget.after(self.poll_interval, self._poll)
+        if self._on_change is not None:
+            self._on_change(list(self._tasks))
+        return task
+
+    def running(self):
+        """
+        This function lists tasks which haven't finished yet.
+
+        Args:
+            None
+
+        Returns:
+            List of Task.
+        """
+        return list(self._tasks)
+
+    def cancel_all(self):
+        """
+        This function cancels all running tasks.
+
+        Args:
+            None
+
+        Returns:
+            None
+        """
+        for task in self._tasks:
+            task.cancel()
+
+    def _poll(self):
+        """
+        This function delivers results of finished tasks and reschedules
+        itself while any task is running.
+
+        Args:
+            None
+
+        Returns:
+            None
+        """
+        try:
+            for task in list(self._tasks):
+                if task.cancelled:
+                    self._tasks.remove(task)
+                elif task.future.done():
+                    self._tasks.remove(task)
+                    self._deliver(task)
+                elif task.elapsed() > task.timeout:
+                    task.cancel()
+                    self._tasks.remove(task)
+                    if task.on_error is not None:
+                        task.on_error(
+                            TimeoutError(
+                                f"{task.description} took longer than "
+                                f"{task.timeout:g} seconds."
+                            )
+                        )
+            if self._on_change is not None:
+                self._on_change(list(self._tasks))
+        finally:
+            # A failing callback must not stop delivery of other tasks.
+            self._polling = False
+            if self._tasks:
+                try:
+                    self._widget.after(self.poll_interval, self._poll)
+                    self._polling = True
+                except tk.TclError:
+                    # Callbacks destroyed the widget (e.g. switching frames).
+                    pass
+
+    @staticmethod
+    def _deliver(task):
+        """
+        This function calls callback of the finished task with its outcome.
+
+        Args:
+            task: Finished Task.
+
+        Returns:
+            None
+        """
+        try:
+            result = task.future.result()
+        except Exception as e:
+            if task.on_error is not None:
+                task.on_error(e)
+        else:
+            if task.on_done is not None:
+                task.on_done(result)
+
+
+class StreamListener:
+    """
+    This class consumes a stream of events on its own thread, reconnecting
+    with exponential backoff whenever it fails. Dictionary payloads of
+    events arriving between two frames are merged (latest value of each key
+    wins) and delivered on the Tk thread at most `rate` times per second,
+    so bursts of events don't flood the UI.
+    """
+
+    def __init__(self, widget, connect, on_events, rate=4.0, max_backoff=30):
+        """
+        Constructor for StreamListener
+
+        Args:
+            widget: Tk widget used to schedule frames.
+            connect: Function which opens the stream, returning an iterable
+            of (event name, dictionary) tuples with `close()` method.
+            on_events: Function called on the Tk thread with merged payloads
+            of events received since last frame.
+            rate: Maximum number of frames per second.
+            max_backoff: Maximum seconds between reconnection attempts.
+
+        Returns:
+            None
+        """
+        self._widget = widget
+        self._connect = connect
+        self._on_events = on_events
+        self.rate = rate
+        self.max_backoff = max_backoff
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._stream = None
+        self._thread = threading.Thread(
+            target=self._run, name="pystock-stream", daemon=True
+        )
+
+    def start(self):
+        """
+        This function starts consuming the stream and delivering frames.
+
+        Args:
+            None
+
+        Returns:
+            None
+        """
+        self._thread.start()
+        self._widget.after(self._frame_interval(), self._frame)
+
+    def reconnect(self):
+        """
+        This function drops current connection, so that the stream is
+        opened again (e.g. after the streamed tickers changed).
+
+        Args:
+            None
+
+        Returns:
+            None
+        """
+        stream = self._stream
+        if stream is not None:
+            stream.close()
+
+    def stop(self):
+        """
+        This function stops consuming the stream.
+
+        Args:
+            None
+
+        Returns:
+            None
+        """
+        self._stopped.set()
+        self.reconnect()
+
+    def _run(self):
+        """
+        This function reads the stream on its thread until stopped.
+
+        Args:
+            None
+
+        Returns:
+            None
+        """
+        backoff = 1
+        while not self._stopped.is_set():
+            try:
+                self._stream = self._connect()
+                for _, data in self._stream:
+                    backoff = 1
+                    with self._lock:
+                        self._pending.update(data)
+                    if self._stopped.is_set():
+                        break
+            except Exception:
+                # Server is restarting or unreachable, or connection was
+                # dropped by `reconnect`.
+                pass
+            finally:
+                if self._stream is not None:
+                    self._stream.close()
+                    self._stream = None
+            self._stopped.wait(backoff)
+            backoff = min(backoff * 2, self.max_backoff)
+
+    def _frame(self):
+        """
+        This function delivers payloads received since last frame and
+        reschedules itself until stopped.
+
+        Args:
+            None
+
+        Returns:
+            None
+        """
+        if self._stopped.is_set():
+            return
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        try:
+            if pending:
+                self._on_events(pending)
+        finally:
+            try:
+                self._widget.after(self._frame_interval(), self._frame)
+            except tk.TclError:
+                # Widget was destroyed.
+                self._stopped.set()
+
+    def _frame_interval(self):
+        """
+        This function provides milliseconds between frames.
+
+        Args:
+            None
+
+        Returns:
+            Milliseconds between frames.
+        """
+        return max(1, int(1000 / self.rate))
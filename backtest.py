@@ -0,0 +1,572 @@
+"""
+Backtesting of trading strategies over historical bars.
+
+Strategies are evaluated over whole histories at once (with the chart
+indicators of `indicators.py`) and their signals are traded with the BUY
+and SELL rules of the server: a BUY needs enough balance, a SELL needs
+enough stocks and both are filled at bar price. Runs over several tickers
+and parameter combinations are spread over a process pool.
+
+Daily bars come from the history cache of the app's search (downloaded on
+first use); other bars, e.g. minute ones, can be read from CSV files saved
+from `yf.download`. Run from repository root:
+
+    python backtest.py AAPL MSFT --strategy sma_crossover \\
+        --param fast=20,50 --param slow=100,200 --output results/
+"""
+
+import argparse
+import itertools
+import math
+import os
+import numpy as np
+import pandas as pd
+
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from history import HISTORY_DIR, HISTORY_MAX_BYTES, HistoryStore
+from indicators import RSI, SMA, BollingerBands
+
+# Balance of a new user.
+STARTING_BALANCE = 10000.0
+
+
+class Strategy:
+    """
+    This class is the base of all strategies. A strategy decides, for every
+    bar, which fraction of equity should be held in the stock after the bar
+    closes. Subclasses must be defined at module level, so they can be sent
+    to worker processes.
+    """
+
+    # Default value of every parameter, by name.
+    defaults = {}
+
+    def __init__(self, **params):
+        """
+        Constructor for Strategy
+
+        Args:
+            params: Values of parameters overriding `defaults`.
+
+        Returns:
+            None
+        """
+        unknown = set(params) - set(self.defaults)
+        if unknown:
+            raise ValueError(f"Unknown parameters: {', '.join(unknown)}.")
+        self.params = {**self.defaults, **params}
+
+    def targets(self, bars):
+        """
+        This function evaluates the strategy over whole history.
+
+        Args:
+            bars: DataFrame of bars with Open, High, Low, Close and Volume
+            columns indexed by date.
+
+        Returns:
+            Array with target fraction of equity (0 to 1) held in the stock
+            after every bar. NaN keeps the previous target.
+        """
+        raise NotImplementedError
+
+
+class SMACrossover(Strategy):
+    """
+    This class holds the stock while fast moving average of close price is
+    above the slow one.
+    """
+
+    defaults = {"fast": 50, "slow": 200}
+
+    def targets(self, bars):
+        fast = SMA(self.params["fast"]).compute(bars).iloc[:, 0].to_numpy()
+        slow = SMA(self.params["slow"]).compute(bars).iloc[:, 0].to_numpy()
+        with np.errstate(invalid="ignore"):
+            return np.where(np.isnan(slow), np.nan, fast > slow)
+
+
+class RSIReversion(Strategy):
+    """
+    This class buys the stock once RSI falls below `low` and sells it once
+    RSI rises above `high`.
+    """
+
+    defaults = {"period": 14, "low": 30, "high": 70}
+
+    def targets(self, bars):
+        rsi = RSI(self.params["period"]).compute(bars).iloc[:, 0].to_numpy()
+        targets = np.full(len(rsi), np.nan)
+        with np.errstate(invalid="ignore"):
+            targets[rsi < self.params["low"]] = 1.0
+            targets[rsi > self.params["high"]] = 0.0
+        return targets
+
+
+class BollingerReversion(Strategy):
+    """
+    This class buys the stock once close price falls below the lower
+    Bollinger band and sells it once price gets back above the middle one.
+    """
+
+    defaults = {"period": 20, "width": 2.0}
+
+    def targets(self, bars):
+        bands = BollingerBands(self.params["period"], self.params["width"])
+        lower, middle = bands.compute(bars).iloc[:, [2, 1]].to_numpy().T
+        close = bars["Close"].to_numpy()
+        targets = np.full(len(close), np.nan)
+        with np.errstate(invalid="ignore"):
+            targets[close < lower] = 1.0
+            targets[close > middle] = 0.0
+        return targets
+
+
+STRATEGIES = {
+    "sma_crossover": SMACrossover,
+    "rsi": RSIReversion,
+    "bollinger": BollingerReversion,
+}
+
+
+class Account:
+    """
+    This class holds balance and stocks of one ticker during a backtest.
+    Trades follow `DatabaseHandler.apply_trade` of the server.
+    """
+
+    __slots__ = ("balance", "quantity", "investment")
+
+    def __init__(self, balance=STARTING_BALANCE):
+        """
+        Constructor for Account
+
+        Args:
+            balance: Starting balance.
+
+        Returns:
+            None
+        """
+        self.balance = balance
+        self.quantity = 0
+        self.investment = 0.0
+
+    def trade(self, action_type, quantity, stock_price):
+        """
+        This function applies a BUY or SELL.
+
+        Args:
+            action_type: "BUY" or "SELL".
+            quantity: Stock quantity.
+            stock_price: Stock's current price.
+
+        Returns:
+            None if trade was applied otherwise error message.
+        """
+        if action_type == "BUY":
+            if self.balance < quantity * stock_price:
+                return "You don't have enough balance."
+            self.balance -= quantity * stock_price
+            self.quantity += quantity
+            self.investment += quantity * stock_price
+        else:
+            if quantity > self.quantity:
+                return "You don't have enough stocks."
+            self.balance += quantity * stock_price
+            self.quantity -= quantity
+            self.investment -= quantity * stock_price
+        return None
+
+
+def simulate(bars, strategy, balance=STARTING_BALANCE, fill="open"):
+    """
+    This function backtests strategy over bars of one stock. Signals are
+    evaluated over all bars at once and only bars where the target changes
+    are traded, buying or selling whole stocks to bring holding to target
+    fraction of equity. Equity is then valued at every close at once.
+
+    Args:
+        bars: DataFrame of bars with Open, High, Low, Close and Volume
+        columns indexed by date.
+        strategy: Strategy
+        balance: Starting balance.
+        fill: "open" to trade at open of the bar after the signal or "close"
+        to trade at close of the signal's bar.
+
+    Returns:
+        Tuple of equity Series (balance plus value of stocks at every
+        close) and trade log DataFrame with date, action, quantity, price,
+        balance, quantity held afterwards and error of rejected trades.
+    """
+    close = bars["Close"].to_numpy(dtype=float)
+    targets = pd.Series(np.asarray(strategy.targets(bars), dtype=float))
+    targets = targets.ffill().fillna(0.0).clip(0.0, 1.0).to_numpy()
+    if fill == "open":
+        prices = bars["Open"].to_numpy(dtype=float)
+        targets = np.concatenate([[0.0], targets[:-1]])
+    else:
+        prices = close
+
+    account = Account(balance)
+    changes = np.flatnonzero(np.diff(targets, prepend=0.0))
+    # Balance and quantity after every traded bar.
+    balances = np.full(len(changes), balance)
+    quantities = np.zeros(len(changes))
+    trades = []
+    for i, bar in enumerate(changes):
+        price = prices[bar]
+        if price > 0:
+            equity = account.balance + account.quantity * price
+            quantity = math.floor(targets[bar] * equity / price)
+            change = quantity - account.quantity
+            if change:
+                action_type = "BUY" if change > 0 else "SELL"
+                error = account.trade(action_type, abs(change), price)
+                trades.append(
+                    (
+                        bars.index[bar],
+                        action_type,
+                        abs(change),
+                        price,
+                        account.balance,
+                        account.quantity,
+                        error,
+                    )
+                )
+        balances[i] = account.balance
+        quantities[i] = account.quantity
+
+    if len(changes):
+        # Every bar holds what was left after its latest traded bar.
+        latest = np.searchsorted(changes, np.arange(len(close)), "right") - 1
+        held = latest >= 0
+        latest = np.maximum(latest, 0)
+        equity = np.where(held, balances[latest], balance)
+        equity += np.where(held, quantities[latest], 0) * np.nan_to_num(close)
+    else:
+        # Target never changed, so nothing was traded.
+        equity = np.full(len(close), balance)
+    trades = pd.DataFrame(
+        trades,
+        columns=[
+            "date",
+            "action",
+            "quantity",
+            "price",
+            "balance",
+            "held",
+            "error",
+        ],
+    )
+    return pd.Series(equity, index=bars.index, name="equity"), trades
+
+
+def metrics(equity, trades):
+    """
+    This function summarizes a backtest.
+
+    Args:
+        equity: Equity Series returned by `simulate`.
+        trades: Trade log returned by `simulate`.
+
+    Returns:
+        Dictionary with "final_equity", "total_return",
+        "annualized_return", "volatility" (annualized), "sharpe",
+        "max_drawdown", "trades" and "rejected". Metrics which need more
+        bars are NaN.
+    """
+    values = equity.to_numpy()
+    result = dict.fromkeys(
+        ("total_return", "annualized_return", "volatility", "sharpe"), np.nan
+    )
+    result["final_equity"] = values[-1] if len(values) else np.nan
+    result["max_drawdown"] = np.nan
+    result["trades"] = int(trades["error"].isna().sum())
+    result["rejected"] = len(trades) - result["trades"]
+    if len(values) < 2 or values[0] <= 0:
+        return result
+
+    result["total_return"] = values[-1] / values[0] - 1
+    result["max_drawdown"] = (values / np.maximum.accumulate(values)).min() - 1
+    seconds = (equity.index[-1] - equity.index[0]).total_seconds()
+    years = seconds / (365.25 * 86400)
+    if years > 0 and values[-1] > 0:
+        with np.errstate(over="ignore"):
+            result["annualized_return"] = (values[-1] / values[0]) ** (
+                1 / years
+            ) - 1
+    returns = values[1:] / values[:-1] - 1
+    if len(returns) > 1 and years > 0:
+        periods = len(returns) / years
+        result["volatility"] = returns.std(ddof=1) * np.sqrt(periods)
+        if result["volatility"] > 0:
+            result["sharpe"] = returns.mean() * periods / result["volatility"]
+    return result
+
+
+def param_grid(grid):
+    """
+    This function expands a parameter grid.
+
+    Args:
+        grid: Dictionary of parameter name -> list of values.
+
+    Returns:
+        List of dictionaries, one per combination of values.
+    """
+    names = list(grid)
+    return [
+        dict(zip(names, values))
+        for values in itertools.product(*(grid[name] for name in names))
+    ]
+
+
+def _run(stock_ticker, bars, strategy_class, params_list, balance, fill):
+    """
+    This function backtests one stock with several parameter combinations.
+    It runs in worker processes.
+
+    Args:
+        stock_ticker: Stock Ticker
+        bars: DataFrame of bars of the stock.
+        strategy_class: Strategy subclass.
+        params_list: List of dictionaries of strategy parameters.
+        balance: Starting balance.
+        fill: "open" or "close", see `simulate`.
+
+    Returns:
+        List of results, see `backtest`.
+    """
+    results = []
+    for params in params_list:
+        strategy = strategy_class(**params)
+        equity, trades = simulate(bars, strategy, balance, fill)
+        results.append(
+            {
+                "ticker": stock_ticker,
+                "params": strategy.params,
+                "metrics": metrics(equity, trades),
+                "equity": equity,
+                "trades": trades,
+            }
+        )
+    return results
+
+
+def backtest(
+    bars,
+    strategy_class,
+    grid=None,
+    balance=STARTING_BALANCE,
+    fill="open",
+    processes=None,
+):
+    """
+    This function backtests strategy over every stock with every parameter
+    combination of the grid. Work is split into one task per stock (or
+    several per stock when there are fewer stocks than processes) run by a
+    process pool, so bars of a stock are sent to a worker only once per
+    task.
+
+    Args:
+        bars: Dictionary of Stock Ticker -> DataFrame of its bars.
+        strategy_class: Strategy subclass.
+        grid: Dictionary of parameter name -> list of values, see
+        `param_grid`. Defaults to the strategy's defaults.
+        balance: Starting balance.
+        fill: "open" or "close", see `simulate`.
+        processes: Number of worker processes. Defaults to number of CPUs;
+        1 runs everything in this process.
+
+    Returns:
+        List of results in order of stocks and grid, each a dictionary with
+        "ticker", "params", "metrics" (see `metrics`), "equity" Series and
+        "trades" DataFrame (see `simulate`).
+    """
+    combinations = param_grid(grid or {})
+    processes = processes or os.cpu_count() or 1
+    # Parameter combinations per task.
+    chunk = max(1, -(-len(combinations) * len(bars) // processes))
+    tasks = [
+        (stock_ticker, frame, strategy_class, combinations[i : i + chunk])
+        for stock_ticker, frame in bars.items()
+        for i in range(0, len(combinations), chunk)
+    ]
+    if processes == 1 or len(tasks) == 1:
+        chunks = [_run(*task, balance, fill) for task in tasks]
+    else:
+        with ProcessPoolExecutor(min(processes, len(tasks))) as executor:
+            futures = [
+                executor.submit(_run, *task, balance, fill) for task in tasks
+            ]
+            chunks = [future.result() for future in futures]
+    return [result for results in chunks for result in results]
+
+
+def load_bars(stock_tickers, start, end=None, directory=HISTORY_DIR):
+    """
+    This function provides daily bars of stocks from the history cache,
+    downloading those which aren't cached yet.
+
+    Args:
+        stock_tickers: List of Stock Tickers.
+        start: First date ("YYYY-MM-DD").
+        end: Date ("YYYY-MM-DD") after the last date. Defaults to today.
+        directory: Directory of the history cache.
+
+    Returns:
+        Dictionary of Stock Ticker -> DataFrame of bars. Stocks without
+        data are left out.
+    """
+    store = HistoryStore(directory, HISTORY_MAX_BYTES)
+    bars = {}
+    for stock_ticker in stock_tickers:
+        frame = store.get(stock_ticker, start, end)
+        if len(frame):
+            bars[stock_ticker.strip().upper()] = frame
+    return bars
+
+
+def read_bars(path):
+    """
+    This function reads bars saved from `yf.download` with `to_csv`, e.g.
+    minute bars.
+
+    Args:
+        path: Path of the CSV file. Its name (without extension) is used
+        as the ticker.
+
+    Returns:
+        Tuple of Stock Ticker and DataFrame of bars.
+    """
+    frame = pd.read_csv(path, index_col=0, parse_dates=True)
+    return Path(path).stem.upper(), frame.dropna(subset=["Close"])
+
+
+def parse_param(text):
+    """
+    This function parses a "name=value,value,..." command line argument.
+
+    Args:
+        text: Argument.
+
+    Returns:
+        Tuple of name and list of values (numbers where possible).
+    """
+    name, _, values = text.partition("=")
+    parsed = []
+    for value in values.split(","):
+        for kind in (int, float, str):
+            try:
+                parsed.append(kind(value))
+                break
+            except ValueError:
+                pass
+    return name.strip(), parsed
+
+
+def main():
+    """
+    This function is the entry point of this program.
+
+    Args:
+        None
+
+    Returns:
+        None
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("tickers", nargs="*", help="tickers of daily bars")
+    parser.add_argument(
+        "--bars",
+        action="append",
+        default=[],
+        metavar="CSV",
+        help="CSV file of bars (e.g. minute bars) named after its ticker",
+    )
+    parser.add_argument(
+        "--strategy", choices=sorted(STRATEGIES), default="sma_crossover"
+    )
+    parser.add_argument(
+        "--param",
+        action="append",
+        default=[],
+        metavar="NAME=V1,V2",
+        help="values of a strategy parameter to try",
+    )
+    parser.add_argument("--start", default="2017-01-01")
+    parser.add_argument("--end", default=None)
+    parser.add_argument("--balance", type=float, default=STARTING_BALANCE)
+    parser.add_argument("--fill", choices=("open", "close"), default="open")
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument(
+        "--output",
+        default=None,
+        help="directory to write summary, equity curves and trade logs to",
+    )
+    args = parser.parse_args()
+
+    bars = (
+        load_bars(args.tickers, args.start, args.end) if args.tickers else {}
+    )
+    for path in args.bars:
+        stock_ticker, frame = read_bars(path)
+        bars[stock_ticker] = frame
+    if not bars:
+        parser.error("no bars to backtest")
+    strategy_class = STRATEGIES[args.strategy]
+    grid = dict(parse_param(text) for text in args.param)
+    unknown = set(grid) - set(strategy_class.defaults)
+    if unknown:
+        parser.error(f"unknown parameters: {', '.join(unknown)}")
+    results = backtest(
+        bars, strategy_class, grid, args.balance, args.fill, args.processes
+    )
+
+    names = [
+        f"{result['ticker']} "
+        + ",".join(f"{k}={v}" for k, v in result["params"].items())
+        for result in results
+    ]
+    summary = pd.DataFrame(
+        [
+            {
+                "ticker": result["ticker"],
+                **result["params"],
+                **result["metrics"],
+            }
+            for result in results
+        ],
+        index=pd.Index(names, name="run"),
+    )
+    print(f"{args.strategy}: {len(results)} runs over {len(bars)} tickers")
+    print(
+        summary.sort_values("total_return", ascending=False)
+        .head(args.top)
+        .to_string(float_format=lambda value: f"{value:.4f}")
+    )
+    if args.output:
+        output = Path(args.output)
+        output.mkdir(parents=True, exist_ok=True)
+        summary.to_csv(output / "summary.csv")
+        pd.concat(
+            [
+                result["equity"].rename(name)
+                for result, name in zip(results, names)
+            ],
+            axis=1,
+        ).to_csv(output / "equity.csv")
+        pd.concat(
+            [
+                result["trades"].assign(run=name)
+                for result, name in zip(results, names)
+            ],
+            ignore_index=True,
+        ).to_csv(output / "trades.csv", index=False)
+        print(f"Results written to {output}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,611 @@
+"""
+End-to-end load and latency benchmark of the API server.
+
+Starts `server/server.py` with the offline replay price provider (frozen
+synthetic prices and simulated upstream latency, so no network is needed) on
+a temporary user storage populated with users holding 1 to 10,000 stocks,
+and drives a mixed read/trade workload (`/login`, `/portfolio`,
+`/live_price`, `/quotes`, `/update_portfolio`, `/history` and `/signup`) from
+concurrent clients, once per portfolio size. Throughput and p50/p95/p99
+latency are reported per route and can be saved as JSON to be compared with
+a run on another commit:
+
+    python benchmarks/api_latency.py --output before.json
+    git checkout other-branch
+    python benchmarks/api_latency.py --compare before.json
+
+Other server settings (e.g. `PYSTOCK_QUOTE_TTL`) are taken from the
+environment. Run from repository root:
+
+    python benchmarks/api_latency.py --holdings 1 100 10000 --clients 16
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+from collections import defaultdict
+from pathlib import Path
+
+SERVER_DIR = Path(__file__).resolve().parent.parent / "server"
+sys.path.insert(0, str(SERVER_DIR))
+
+from auth import hash_password  # noqa: E402
+from portfolio import Holding, Portfolio  # noqa: E402
+from providers import ReplayProvider  # noqa: E402
+from storage import create_storage  # noqa: E402
+
+PASSWORD = "pwd"
+# Exchange suffixes of generated tickers (one in ten is Indian and one in
+# twenty British), so prices are converted like real portfolios.
+FX_RATES = {"USD/INR": 83.0, "USD/GBp": 79.0}
+DEFAULT_MIX = (
+    "login=5,portfolio=35,live_price=20,quotes=10,update_portfolio=20,"
+    "history=5,signup=5"
+)
+
+
+def free_port():
+    """
+    This function finds a free TCP port on localhost.
+
+    Args:
+        None
+
+    Returns:
+        Port number.
+    """
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def ticker_universe(size):
+    """
+    This function generates tickers held by benchmark users.
+
+    Args:
+        size: Number of tickers.
+
+    Returns:
+        List of tickers.
+    """
+    tickers = []
+    for i in range(size):
+        suffix = ".NS" if i % 10 == 9 else ".L" if i % 20 == 4 else ""
+        tickers.append(f"T{i:05d}{suffix}")
+    return tickers
+
+
+def usd_price(provider, stock_ticker):
+    """
+    This function provides replayed price of a ticker in USD, as the server
+    reports it.
+
+    Args:
+        provider: ReplayProvider used by the server.
+        stock_ticker: Stock Ticker
+
+    Returns:
+        Price in USD.
+    """
+    currency = {".NS": "INR", ".L": "GBp"}.get(
+        stock_ticker[stock_ticker.rfind(".") :] if "." in stock_ticker else ""
+    )
+    price = provider.live_price(stock_ticker)
+    if currency is None:
+        return price
+    return price / FX_RATES[f"USD/{currency}"]
+
+
+def populate(storage, path, tiers, users, seed):
+    """
+    This function writes benchmark users directly to storage, before the
+    server starts. Every user of a tier holds `holdings` stocks, 10 of each.
+
+    Args:
+        storage: Storage backend ("json", "sqlite" or "ledger").
+        path: Path of the storage.
+        tiers: Numbers of holdings per user.
+        users: Number of users per tier.
+        seed: Seed of the replay provider.
+
+    Returns:
+        Dictionary of number of holdings -> list of (username, tickers).
+    """
+    provider = ReplayProvider(speed=0, seed=seed)
+    universe = ticker_universe(max(tiers))
+    prices = {ticker: usd_price(provider, ticker) for ticker in universe}
+    rng = random.Random(seed)
+    # Hashing is the slow part of creating users and all share a password.
+    password = hash_password(PASSWORD, 1000)
+    backend = create_storage(storage, path)
+    population = {}
+    for holdings in tiers:
+        population[holdings] = []
+        for i in range(users):
+            username = f"h{holdings}u{i}"
+            tickers = rng.sample(universe, holdings)
+            backend.create_user(
+                {
+                    "name": username,
+                    "username": username,
+                    "email": f"{username}@example.com",
+                    "password": password,
+                    "balance": 10.0**9,
+                    "portfolio_value": 0.0,
+                    "portfolio": Portfolio(
+                        Holding(t, 10, 10 * prices[t], prices[t])
+                        for t in tickers
+                    ),
+                }
+            )
+            population[holdings].append((username, tickers))
+    backend.close()
+    return population
+
+
+def start_server(args, storage_path, universe_size):
+    """
+    This function starts API server with the replay provider in a
+    subprocess and waits until it accepts connections.
+
+    Args:
+        args: Parsed command line arguments.
+        storage_path: Path of user storage.
+        universe_size: Number of distinct tickers held by users.
+
+    Returns:
+        Tuple of subprocess.Popen and base URL of the server.
+    """
+    port = free_port()
+    env = dict(os.environ)
+    env.update(
+        PYSTOCK_PRICE_PROVIDER="replay",
+        PYSTOCK_REPLAY_SPEED="0",
+        PYSTOCK_REPLAY_LATENCY=str(args.latency),
+        PYSTOCK_REPLAY_SEED=str(args.seed),
+        PYSTOCK_REPLAY_FX_RATES=",".join(
+            f"{pair}={rate}" for pair, rate in FX_RATES.items()
+        ),
+        PYSTOCK_STORAGE=args.storage,
+        PYSTOCK_STORAGE_PATH=str(storage_path),
+        PYSTOCK_PASSWORD_ITERATIONS=str(args.password_iterations),
+    )
+    # Fit all held tickers unless cache size is given.
+    env.setdefault("PYSTOCK_QUOTE_CACHE_SIZE", str(universe_size))
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            "server.py",
+            "--server",
+            "waitress",
+            "--port",
+            str(port),
+            "--workers",
+            str(args.workers),
+        ],
+        cwd=SERVER_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return process, f"http://127.0.0.1:{port}/"
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("server didn't start")
+
+
+class Client:
+    """
+    This class represents one benchmark client, logged in as one user and
+    keeping portfolio version like the app's dashboard does.
+    """
+
+    def __init__(self, url, username, tickers, rng):
+        """
+        Constructor for Client
+
+        Args:
+            url: Base URL of the server.
+            username: Username of the client's user.
+            tickers: Tickers held by the user.
+            rng: random.Random used to pick requests.
+
+        Returns:
+            None
+        """
+        self.url = url
+        self.username = username
+        self.tickers = tickers
+        self.rng = rng
+        self.session = requests.Session()
+        self.token = None
+        self.version = None
+        self.signups = 0
+
+    def _post(self, route, data=None, headers=None):
+        """
+        This function sends a request and records portfolio version and
+        token from its response.
+
+        Args:
+            route: Route without leading slash.
+            data: Form fields.
+            headers: HTTP headers.
+
+        Returns:
+            Whether the request succeeded (no "error" field).
+        """
+        response = self.session.post(
+            self.url + route, data=data, headers=headers
+        )
+        response.raise_for_status()
+        if response.status_code == 304:
+            return True
+        body = response.json()
+        self.version = body.get("version", self.version)
+        self.token = body.get("token", self.token)
+        return "error" not in body
+
+    def login(self):
+        """This function logs in, receiving session token."""
+        data = {"username": self.username, "password": PASSWORD}
+        if self.version is not None:
+            data["since"] = self.version
+        return self._post("login", data)
+
+    def portfolio(self):
+        """This function requests portfolio as the dashboard refreshes it."""
+        headers = {"Authorization": f"Bearer {self.token}"}
+        if self.version is not None:
+            headers["If-None-Match"] = f'W/"{self.version}"'
+        return self._post("portfolio", {"since": self.version}, headers)
+
+    def live_price(self):
+        """This function requests price of a held stock."""
+        return self._post(
+            "live_price", {"stock_ticker": self.rng.choice(self.tickers)}
+        )
+
+    def quotes(self):
+        """This function requests prices of up to 20 held stocks."""
+        tickers = self.rng.sample(self.tickers, min(20, len(self.tickers)))
+        return self._post("quotes", {"stock_tickers": ",".join(tickers)})
+
+    def update_portfolio(self):
+        """
+        This function buys or sells one share of a held stock, which keeps
+        holdings (10 shares each) in place.
+        """
+        return self._post(
+            "update_portfolio",
+            {
+                "action_type": self.rng.choice(("BUY", "SELL")),
+                "stock_ticker": self.rng.choice(self.tickers),
+                "quantity": 1,
+                "since": self.version,
+            },
+            {"Authorization": f"Bearer {self.token}"},
+        )
+
+    def history(self):
+        """This function requests history of a held stock."""
+        return self._post(
+            "history",
+            {
+                "stock_ticker": self.rng.choice(self.tickers),
+                "start": "2015-01-01",
+                "resolution": self.rng.choice(("1d", "1wk", "1mo")),
+            },
+        )
+
+    def signup(self):
+        """This function signs up a new user."""
+        self.signups += 1
+        username = f"new-{self.username}-{self.signups}-{time.time_ns()}"
+        return self._post(
+            "signup",
+            {
+                "name": username,
+                "username": username,
+                "email": f"{username}@example.com",
+                "password": PASSWORD,
+            },
+        )
+
+
+def drive(url, users, mix, clients, duration, seed):
+    """
+    This function sends the mixed workload from concurrent clients, each
+    logged in as one of the given users.
+
+    Args:
+        url: Base URL of the server.
+        users: List of (username, tickers) of a tier.
+        mix: Dictionary of route -> relative weight.
+        clients: Number of concurrent clients.
+        duration: Seconds to run for.
+        seed: Seed of clients' random choices.
+
+    Returns:
+        Dictionary of route -> (list of latencies in seconds, number of
+        errors).
+    """
+    results = defaultdict(lambda: ([], [0]))
+    lock = threading.Lock()
+    routes, weights = zip(*mix.items())
+    barrier = threading.Barrier(clients)
+    stop = []
+
+    def client(i):
+        username, tickers = users[i % len(users)]
+        rng = random.Random(seed * 1000 + i)
+        own = Client(url, username, tickers, rng)
+        own.login()
+        latencies = defaultdict(list)
+        errors = defaultdict(int)
+        barrier.wait()
+        if not stop:
+            stop.append(time.monotonic() + duration)
+        while time.monotonic() < stop[0]:
+            route = rng.choices(routes, weights)[0]
+            start = time.perf_counter()
+            try:
+                ok = getattr(own, route)()
+            except requests.RequestException:
+                ok = False
+            latencies[route].append(time.perf_counter() - start)
+            errors[route] += not ok
+        with lock:
+            for route in latencies:
+                results[route][0].extend(latencies[route])
+                results[route][1][0] += errors[route]
+
+    threads = [
+        threading.Thread(target=client, args=(i,)) for i in range(clients)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return {route: (lat, err[0]) for route, (lat, err) in results.items()}
+
+
+def percentile(values, q):
+    """
+    This function provides nearest-rank percentile.
+
+    Args:
+        values: Sorted list of values.
+        q: Percentile between 0 and 100.
+
+    Returns:
+        Percentile or None if there are no values.
+    """
+    if not values:
+        return None
+    rank = max(1, int(-(-q * len(values) // 100)))
+    return values[min(rank, len(values)) - 1]
+
+
+def summarize(latencies, errors, duration):
+    """
+    This function summarizes latencies of one route.
+
+    Args:
+        latencies: List of latencies in seconds.
+        errors: Number of requests answered with an error.
+        duration: Seconds the workload ran for.
+
+    Returns:
+        Dictionary of "requests", "errors", "rps" and "mean_ms", "p50_ms",
+        "p95_ms" and "p99_ms" latencies.
+    """
+    latencies = sorted(latencies)
+    summary = {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / duration, 1),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1e3, 3),
+    }
+    for q in (50, 95, 99):
+        summary[f"p{q}_ms"] = round(percentile(latencies, q) * 1e3, 3)
+    return summary
+
+
+def parse_mix(mix):
+    """
+    This function parses workload mix.
+
+    Args:
+        mix: Comma separated "route=weight" pairs.
+
+    Returns:
+        Dictionary of route -> weight.
+    """
+    weights = {}
+    for item in mix.split(","):
+        route, weight = item.split("=")
+        if not hasattr(Client, route.strip()):
+            raise ValueError(f"Unknown route in mix: {route}")
+        weights[route.strip()] = float(weight)
+    return weights
+
+
+def git_commit():
+    """
+    This function provides commit of the benchmarked tree.
+
+    Args:
+        None
+
+    Returns:
+        Commit hash (with "-dirty" if tree has changes) or None.
+    """
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=SERVER_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+        dirty = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"],
+            cwd=SERVER_DIR,
+            capture_output=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit + ("-dirty" if dirty else "")
+
+
+def print_results(results, baseline=None):
+    """
+    This function prints results, with change of latencies relative to
+    baseline results when given.
+
+    Args:
+        results: List of results per tier.
+        baseline: Results of an earlier run or None.
+
+    Returns:
+        None
+    """
+    previous = {}
+    for tier in (baseline or {}).get("tiers", []):
+        for route, summary in tier["routes"].items():
+            previous[tier["holdings"], route] = summary
+    header = (
+        f"{'holdings':>8} {'route':>16} {'req':>7} {'err':>5} {'req/s':>8} "
+        f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}"
+    )
+    print(header + (f" {'p50 Δ':>8} {'p99 Δ':>8}" if baseline else ""))
+    for tier in results:
+        for route, summary in tier["routes"].items():
+            line = (
+                f"{tier['holdings']:>8} {route:>16} {summary['requests']:>7} "
+                f"{summary['errors']:>5} {summary['rps']:>8.1f} "
+                f"{summary['p50_ms']:>8.2f} {summary['p95_ms']:>8.2f} "
+                f"{summary['p99_ms']:>8.2f}"
+            )
+            before = previous.get((tier["holdings"], route))
+            if before is not None:
+                for q in ("p50_ms", "p99_ms"):
+                    change = summary[q] / before[q] - 1 if before[q] else 0
+                    line += f" {change:>+8.0%}"
+            print(line)
+
+
+def main():
+    """
+    This function is the entry point of this program.
+
+    Args:
+        None
+
+    Returns:
+        None
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--holdings",
+        type=int,
+        nargs="+",
+        default=[1, 10, 100, 1000, 10000],
+        help="Portfolio sizes, benchmarked one after another.",
+    )
+    parser.add_argument("--users", type=int, default=10, help="Per size.")
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--mix", default=DEFAULT_MIX)
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=0.0,
+        help="Seconds every upstream call waits.",
+    )
+    parser.add_argument(
+        "--storage", default="json", choices=("json", "sqlite", "ledger")
+    )
+    parser.add_argument("--password-iterations", type=int, default=310000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Save results to this JSON file.")
+    parser.add_argument("--compare", help="JSON results of an earlier run.")
+    args = parser.parse_args()
+    mix = parse_mix(args.mix)
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        storage_path = Path(directory) / "userdata"
+        if args.storage == "json":
+            storage_path.mkdir()
+        elif args.storage == "sqlite":
+            storage_path = storage_path.with_suffix(".db")
+        population = populate(
+            args.storage, storage_path, args.holdings, args.users, args.seed
+        )
+        process, url = start_server(args, storage_path, max(args.holdings))
+        try:
+            for holdings in args.holdings:
+                routes = drive(
+                    url,
+                    population[holdings],
+                    mix,
+                    args.clients,
+                    args.duration,
+                    args.seed,
+                )
+                results.append(
+                    {
+                        "holdings": holdings,
+                        "routes": {
+                            route: summarize(*routes[route], args.duration)
+                            for route in mix
+                            if route in routes
+                        },
+                    }
+                )
+        finally:
+            process.terminate()
+            process.wait()
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "config": vars(args),
+        "tiers": results,
+    }
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(f"Compared with {baseline.get('commit')}")
+    print_results(results, baseline)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    # Run this only if this file is executed directly.
+    main()
@@ -0,0 +1,134 @@
+"""
+Benchmark of indicator evaluation over multi-decade daily and minute bars.
+
+For every indicator of `indicators.py` it measures full evaluation of a
+synthetic history (50 years of daily bars and 20 years of minute bars) and
+the cost per bar of evaluating the last 1,000 bars incrementally as they
+arrive one by one, instead of recomputing the whole history for each.
+
+Run from repository root:
+
+    python benchmarks/indicators.py
+"""
+
+import argparse
+import sys
+import timeit
+import numpy as np
+import pandas as pd
+
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from indicators import (  # noqa: E402
+    ATR,
+    EMA,
+    MACD,
+    RSI,
+    SMA,
+    VWAP,
+    BollingerBands,
+)
+
+INDICATORS = {
+    "SMA 200": lambda session: SMA(200),
+    "EMA 20": lambda session: EMA(20),
+    "Bollinger 20": lambda session: BollingerBands(20),
+    "RSI 14": lambda session: RSI(14),
+    "MACD": lambda session: MACD(),
+    "ATR 14": lambda session: ATR(14),
+    "VWAP": lambda session: VWAP(session=session),
+}
+
+
+def make_bars(count, freq, seed):
+    """
+    This function generates random walk OHLCV bars.
+
+    Args:
+        count: Number of bars.
+        freq: Pandas frequency of bars.
+        seed: Seed of the random generator.
+
+    Returns:
+        DataFrame of bars indexed by date.
+    """
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, count)))
+    spread = np.abs(rng.normal(0, 0.005, count)) * close
+    return pd.DataFrame(
+        {
+            "Open": np.roll(close, 1),
+            "High": close + spread,
+            "Low": close - spread,
+            "Close": close,
+            "Volume": rng.integers(100, 10000, count).astype(float),
+        },
+        index=pd.date_range("1970-01-01", periods=count, freq=freq),
+    )
+
+
+def main():
+    """
+    This function is the entry point of this program.
+
+    Args:
+        None
+
+    Returns:
+        None
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--daily-years", type=int, default=50)
+    parser.add_argument("--minute-years", type=int, default=20)
+    parser.add_argument("--updates", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    datasets = {
+        "daily": (make_bars(args.daily_years * 252, "D", args.seed), False),
+        # 252 sessions of 390 minutes a year.
+        "minute": (
+            make_bars(args.minute_years * 252 * 390, "min", args.seed),
+            True,
+        ),
+    }
+    print(
+        f"{'bars':>7} {'count':>10} {'indicator':>13} {'full (ms)':>10} "
+        f"{'update (us/bar)':>16} {'speedup':>10}"
+    )
+    for label, (bars, session) in datasets.items():
+        history = bars.iloc[: -args.updates]
+        new = [bars.iloc[i : i + 1] for i in range(len(history), len(bars))]
+        for name, make in INDICATORS.items():
+            indicator = make(session)
+            full = min(
+                timeit.repeat(
+                    lambda: make(session).compute(bars),
+                    number=1,
+                    repeat=args.repeat,
+                )
+            )
+            # Bars arrive one by one after the history.
+            update = (
+                min(
+                    timeit.repeat(
+                        lambda: [indicator.update(bar) for bar in new],
+                        setup=lambda: indicator.compute(history),
+                        number=1,
+                        repeat=args.repeat,
+                    )
+                )
+                / args.updates
+            )
+            print(
+                f"{label:>7} {len(bars):>10} {name:>13} {full * 1e3:>10.1f} "
+                f"{update * 1e6:>16.1f} {full / update:>9.0f}x"
+            )
+
+
+if __name__ == "__main__":
+    # Run this only if this file is executed directly.
+    main()
@@ -0,0 +1,186 @@
+"""
+Load benchmark comparing serving modes of the API server.
+
+Starts `server/server.py` once per serving mode (Flask's development server
+and the multi-threaded waitress server) on a temporary copy of the user
+storage, signs up users with empty portfolios (so no price is fetched and no
+network is needed) and drives `/portfolio` with concurrent clients
+authenticated by session token, reporting requests per second and latency
+percentiles. Password hashing is made cheap (`--password-iterations`), so
+signing up and logging in don't dominate the run.
+
+Run from repository root:
+
+    python benchmarks/load_server.py --clients 32 --duration 10
+"""
+
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+from pathlib import Path
+
+SERVER_DIR = Path(__file__).resolve().parent.parent / "server"
+
+
+def free_port():
+    """
+    This function finds a free TCP port on localhost.
+
+    Args:
+        None
+
+    Returns:
+        Port number.
+    """
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(mode, workers, storage_path, password_iterations):
+    """
+    This function starts API server in a subprocess and waits until it
+    accepts connections.
+
+    Args:
+        mode: "dev" or "waitress".
+        workers: Number of serving threads.
+        storage_path: Directory used for user storage.
+        password_iterations: PBKDF2 iterations of password hashes.
+
+    Returns:
+        Tuple of subprocess.Popen and base URL of the server.
+    """
+    port = free_port()
+    env = dict(os.environ, PYSTOCK_STORAGE="json")
+    env["PYSTOCK_STORAGE_PATH"] = str(storage_path)
+    env["PYSTOCK_PASSWORD_ITERATIONS"] = str(password_iterations)
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            "server.py",
+            "--server",
+            mode,
+            "--port",
+            str(port),
+            "--workers",
+            str(workers),
+        ],
+        cwd=SERVER_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return process, f"http://127.0.0.1:{port}/"
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError(f"{mode} server didn't start")
+
+
+def drive(url, users, clients, duration):
+    """
+    This function sends `/portfolio` requests from concurrent clients, each
+    logged in once beforehand.
+
+    Args:
+        url: Base URL of the server.
+        users: Usernames to log in with.
+        clients: Number of concurrent clients.
+        duration: Seconds to run for.
+
+    Returns:
+        List of request latencies in seconds.
+    """
+    latencies = []
+    lock = threading.Lock()
+    stop = time.monotonic() + duration
+
+    def client(i):
+        session = requests.Session()
+        payload = {"username": users[i % len(users)], "password": "pwd"}
+        response = session.post(url + "login", payload)
+        response.raise_for_status()
+        session.headers["Authorization"] = "Bearer " + response.json()["token"]
+        own = []
+        while time.monotonic() < stop:
+            start = time.perf_counter()
+            session.get(url + "portfolio").raise_for_status()
+            own.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(own)
+
+    threads = [
+        threading.Thread(target=client, args=(i,)) for i in range(clients)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies
+
+
+def main():
+    """
+    This function is the entry point of this program.
+
+    Args:
+        None
+
+    Returns:
+        None
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--modes", nargs="+", default=["dev", "waitress"])
+    parser.add_argument("--password-iterations", type=int, default=1000)
+    args = parser.parse_args()
+
+    users = [f"user{i}" for i in range(args.users)]
+    print(f"{'mode':>9} {'req/s':>8} {'p50 ms':>7} {'p99 ms':>7}")
+    for mode in args.modes:
+        with tempfile.TemporaryDirectory() as directory:
+            process, url = start_server(
+                mode, args.workers, directory, args.password_iterations
+            )
+            try:
+                for username in users:
+                    requests.post(
+                        url + "signup",
+                        {
+                            "name": username,
+                            "username": username,
+                            "password": "pwd",
+                            "email": f"{username}@example.com",
+                        },
+                    )
+                latencies = drive(url, users, args.clients, args.duration)
+            finally:
+                process.terminate()
+                process.wait()
+        quantiles = statistics.quantiles(latencies, n=100)
+        print(
+            f"{mode:>9} {len(latencies) / args.duration:>8.0f} "
+            f"{quantiles[49] * 1e3:>7.2f} {quantiles[98] * 1e3:>7.2f}"
+        )
+
+
+if __name__ == "__main__":
+    # Run this only if this file is executed directly.
+    main()
@@ -0,0 +1,128 @@
+"""
+Micro-benchmark of in-memory trade cost versus number of holdings.
+
+Applies random BUY/SELL trades with `DatabaseHandler.apply_trade` to
+portfolios of 10 to 10,000 tickers and compares it with the previous
+list-scan implementation, which had to search the whole "portfolio" list for
+the traded ticker.
+
+Run from repository root:
+
+    python benchmarks/portfolio_trades.py
+"""
+
+import argparse
+import random
+import sys
+import timeit
+
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "server"))
+
+from helpers import DatabaseHandler  # noqa: E402
+from portfolio import Portfolio  # noqa: E402
+
+
+def make_user(holdings):
+    """
+    This function creates user data holding the given number of tickers.
+
+    Args:
+        holdings: Number of held tickers.
+
+    Returns:
+        User's data in JSON format.
+    """
+    return {
+        "balance": 1e12,
+        "portfolio_value": 0.0,
+        "portfolio": [
+            {
+                "name": f"T{i}",
+                "quantity": 1000,
+                "investment": 1000.0,
+                "cur_price": 1.0,
+            }
+            for i in range(holdings)
+        ],
+    }
+
+
+def list_scan_trade(data, action_type, stock_ticker, quantity, stock_price):
+    """
+    This function applies trade the way it was done before holdings were
+    indexed by ticker (linear scan of the portfolio list).
+
+    Args:
+        data: User's data in JSON format.
+        action_type: "BUY" or "SELL".
+        stock_ticker: Stock name.
+        quantity: Stock quantity.
+        stock_price: Stock's current price.
+
+    Returns:
+        None
+    """
+    index = [
+        i
+        for i in range(len(data["portfolio"]))
+        if data["portfolio"][i]["name"] == stock_ticker
+    ][0]
+    sign = 1 if action_type == "BUY" else -1
+    data["balance"] -= sign * quantity * stock_price
+    data["portfolio"][index]["quantity"] += sign * quantity
+    data["portfolio"][index]["investment"] += sign * quantity * stock_price
+    data["portfolio"][index]["cur_price"] = stock_price
+
+
+def main():
+    """
+    This function is the entry point of this program.
+
+    Args:
+        None
+
+    Returns:
+        None
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--trades", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'holdings':>9} {'indexed (us/trade)':>19} {'list scan':>10}")
+    for holdings in (10, 100, 1000, 10000):
+        rng = random.Random(args.seed)
+        trades = [
+            (
+                rng.choice(["BUY", "SELL"]),
+                f"T{rng.randrange(holdings)}",
+                1,
+                rng.uniform(0.5, 1.5),
+            )
+            for _ in range(args.trades)
+        ]
+        legacy = make_user(holdings)
+        indexed = dict(legacy)
+        indexed["portfolio"] = Portfolio.from_list(legacy["portfolio"])
+        indexed_time = timeit.timeit(
+            lambda: [
+                DatabaseHandler.apply_trade(indexed, *trade)
+                for trade in trades
+            ],
+            number=1,
+        )
+        legacy_time = timeit.timeit(
+            lambda: [list_scan_trade(legacy, *trade) for trade in trades],
+            number=1,
+        )
+        print(
+            f"{holdings:>9} {indexed_time / args.trades * 1e6:>19.2f} "
+            f"{legacy_time / args.trades * 1e6:>10.2f}"
+        )
+
+
+if __name__ == "__main__":
+    # Run this only if this file is executed directly.
+    main()
@@ -0,0 +1,183 @@
+"""
+Stress benchmark for concurrent trades on `/update_portfolio`.
+
+Fires thousands of concurrent BUY/SELL requests against the Flask app (using
+its test client and a fixed-price quote cache, so no network is needed) and
+verifies afterwards that no update was lost:
+
+    * balance + value of holdings == starting balance (prices are fixed),
+    * held quantity == quantity bought - quantity sold by accepted trades.
+
+Run from repository root:
+
+    python benchmarks/stress_trades.py --requests 5000 --threads 32
+"""
+
+import argparse
+import random
+import sys
+import tempfile
+import threading
+import time
+
+from collections import defaultdict
+from concurrent import futures
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "server"))
+
+import config  # noqa: E402
+import server  # noqa: E402
+from cache import QuoteCache  # noqa: E402
+from helpers import DatabaseHandler  # noqa: E402
+from storage import create_storage  # noqa: E402
+
+PRICES = {"AAPL": 125.5, "TSLA": 700.25, "GOOGL": 2050.0, "MSFT": 240.75}
+STARTING_BALANCE = 10000.0
+
+
+def run(users, requests, threads, seed):
+    """
+    This function fires random trades and tracks accepted ones.
+
+    Args:
+        users: Number of users trading.
+        requests: Total number of trade requests.
+        threads: Number of concurrent client threads.
+        seed: Seed of the random trade generator.
+
+    Returns:
+        Tuple of elapsed seconds and dictionary of
+        (username, ticker) -> net quantity of accepted trades.
+    """
+    rng = random.Random(seed)
+    usernames = [f"user{i}" for i in range(users)]
+    client = server.app.test_client()
+    tokens = {}
+    for username in usernames:
+        client.post(
+            "/signup",
+            data={
+                "name": username,
+                "username": username,
+                "password": "pwd",
+                "email": f"{username}@example.com",
+            },
+        )
+        response = client.post(
+            "/login", data={"username": username, "password": "pwd"}
+        )
+        tokens[username] = response.get_json()["token"]
+    trades = [
+        {
+            "username": rng.choice(usernames),
+            "action_type": rng.choice(["BUY", "BUY", "SELL"]),
+            "stock_ticker": rng.choice(list(PRICES)),
+            "quantity": rng.randint(1, 3),
+        }
+        for _ in range(requests)
+    ]
+    net = defaultdict(int)
+    net_lock = threading.Lock()
+    local = threading.local()
+
+    def trade(payload):
+        if not hasattr(local, "client"):
+            local.client = server.app.test_client()
+        response = local.client.post(
+            "/update_portfolio",
+            data=payload,
+            headers={"Authorization": "Bearer " + tokens[payload["username"]]},
+        )
+        if response.get_json().get("error") is None:
+            sign = 1 if payload["action_type"] == "BUY" else -1
+            with net_lock:
+                net[(payload["username"], payload["stock_ticker"])] += (
+                    sign * payload["quantity"]
+                )
+
+    start = time.perf_counter()
+    with futures.ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(trade, trades))
+    return time.perf_counter() - start, net
+
+
+def verify(net):
+    """
+    This function checks balance and quantity invariants of all users.
+
+    Args:
+        net: Dictionary of (username, ticker) -> net quantity of accepted
+        trades.
+
+    Returns:
+        List of violation messages.
+    """
+    violations = []
+    storage = DatabaseHandler.storage
+    for username in storage.usernames():
+        data = storage.load_user(username)
+        held = {
+            holding.name: holding.quantity for holding in data["portfolio"]
+        }
+        value = sum(PRICES[name] * qty for name, qty in held.items())
+        if abs(data["balance"] + value - STARTING_BALANCE) > 1e-6:
+            violations.append(
+                f"{username}: balance {data['balance']:.4f} + holdings "
+                f"{value:.4f} != {STARTING_BALANCE}"
+            )
+        for ticker in PRICES:
+            if held.get(ticker, 0) != net[(username, ticker)]:
+                violations.append(
+                    f"{username}: holds {held.get(ticker, 0)} {ticker}, "
+                    f"accepted trades net {net[(username, ticker)]}"
+                )
+    return violations
+
+
+def main():
+    """
+    This function is the entry point of this program.
+
+    Args:
+        None
+
+    Returns:
+        None
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument(
+        "--storage", default="json", choices=["json", "sqlite", "ledger"]
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    # Trades are measured, not password hashing of signups and logins.
+    config.PASSWORD_ITERATIONS = 1000
+    with tempfile.TemporaryDirectory() as directory:
+        DatabaseHandler.storage = create_storage(
+            args.storage,
+            f"{directory}/bench.db" if args.storage == "sqlite" else directory,
+        )
+        server.quote_cache = QuoteCache(PRICES.__getitem__)
+        elapsed, net = run(args.users, args.requests, args.threads, args.seed)
+        violations = verify(net)
+        DatabaseHandler.storage.close()
+
+    print(
+        f"{args.requests} trades by {args.users} users on {args.threads} "
+        f"threads ({args.storage}): {elapsed:.2f}s, "
+        f"{args.requests / elapsed:.0f} req/s"
+    )
+    for violation in violations:
+        print("VIOLATION", violation)
+    print("invariants hold" if not violations else "invariants BROKEN")
+    sys.exit(1 if violations else 0)
+
+
+if __name__ == "__main__":
+    # Run this only if this file is executed directly.
+    main()
@@ -1,17 +1,43 @@
+import os
 import tkinter as tk
 import pathlib
 import requests
 import re
 import finplot as fplt
 import matplotlib.pyplot as plt
-import yfinance as yf
 
+from api_client import APIClient
+from background import StreamListener, TaskRunner
 from datetime import datetime
+from history import HISTORY_DIR, HISTORY_MAX_BYTES, HistoryStore
+from indicators import ATR, EMA, MACD, RSI, SMA, VWAP, BollingerBands
 from ttkthemes import ThemedTk
 from tkinter import messagebox
 from tkinter import ttk
 
-API_ENDPOINT = "http://127.0.0.1:5000/"
+API_ENDPOINT = os.environ.get("PYSTOCK_API_ENDPOINT", "http://127.0.0.1:5000/")
+# Client shared by all frames and windows, so connections are reused. Its
+# calls block, so they must be run with `RootWindow.run_task`.
+api = APIClient(API_ENDPOINT, timeout=10)
+# Maximum number of times per second streamed prices are applied to the
+# dashboard. 0 disables streaming.
+UI_FPS = float(os.environ.get("PYSTOCK_UI_FPS", 4))
+# Local cache of daily bars shown by search.
+history_store = HistoryStore(HISTORY_DIR, HISTORY_MAX_BYTES)
+# Indicators selectable in search, by name. Indicators of searched stocks
+# are kept, so that searching a stock again only evaluates new bars.
+INDICATORS = {
+    "SMA 50": lambda: SMA(50),
+    "SMA 200": lambda: SMA(200),
+    "EMA 20": lambda: EMA(20),
+    "Bollinger 20": lambda: BollingerBands(20),
+    "VWAP": lambda: VWAP(),
+    "RSI 14": lambda: RSI(14),
+    "MACD": lambda: MACD(),
+    "ATR 14": lambda: ATR(14),
+}
+DEFAULT_INDICATORS = ("SMA 50", "SMA 200")
+indicator_cache = {}
 
 
 def verify_email(email):
@@ -129,13 +155,20 @@ class LoginFrame(ttk.Frame):
             "username": self.username_entry.get(),
             "password": self.password_entry.get(),
         }
-        response = requests.post(API_ENDPOINT + "login", payload).json()
-        if response.get("error") is not None:
-            messagebox.showerror("Login Error", response["error"])
-        else:
-            self._master.switch_frame(
-                DashboardFrame, "PyStock | Dashboard", response
-            )
+
+        def done(response):
+            if response.get("error") is not None:
+                messagebox.showerror("Login Error", response["error"])
+            else:
+                self._master.switch_frame(
+                    DashboardFrame, "PyStock | Dashboard", response
+                )
+
+        self._master.run_task(
+            "Logging in",
+            lambda: api.post("login", payload, idempotent=True),
+            on_done=done,
+        )
 
 
 class SignUpFrame(ttk.Frame):
@@ -214,16 +247,23 @@ class SignUpFrame(ttk.Frame):
             "email": self.email_entry.get(),
             "password": self.password_entry.get(),
         }
-        response = requests.post(API_ENDPOINT + "signup", payload).json()
-        if response.get("error") is not None:
-            messagebox.showerror(error_title, response["error"])
-        else:
-            messagebox.showinfo(
-                "Registration done",
-                "You have registered with PyStock successfully. Now click OK"
-                " to login into PyStock",
-            )
-            self._master.switch_frame(LoginFrame, "PyStock | Login")
+
+        def done(response):
+            if response.get("error") is not None:
+                messagebox.showerror(error_title, response["error"])
+            else:
+                messagebox.showinfo(
+                    "Registration done",
+                    "You have registered with PyStock successfully. Now click"
+                    " OK to login into PyStock",
+                )
+                self._master.switch_frame(LoginFrame, "PyStock | Login")
+
+        self._master.run_task(
+            "Signing up",
+            lambda: api.post("signup", payload),
+            on_done=done,
+        )
 
 
 class DashboardFrame(ttk.Frame):
@@ -243,6 +283,8 @@ class DashboardFrame(ttk.Frame):
         ttk.Frame.__init__(self, master)
         self._master = master
         self._user_data = user_data
+        # Session token issued by login, used instead of the password.
+        self._token = user_data["token"]
         self.info_frame = ttk.LabelFrame(text="User Info")
         self.info_frame.rowconfigure(0)
         self.info_frame.rowconfigure(1)
@@ -254,15 +296,14 @@ class DashboardFrame(ttk.Frame):
         ttk.Label(
             self.info_frame, text="Email: " + self._user_data["email"]
         ).grid(row=0, column=1, sticky="nsew", padx=(5, 10), pady=(5, 0))
-        ttk.Label(
-            self.info_frame,
-            text="Balance ($): " + str(round(self._user_data["balance"], 4)),
-        ).grid(row=1, column=0, sticky="nsew", padx=(5, 10), pady=(5, 5))
-        ttk.Label(
-            self.info_frame,
-            text="Total Portfolio Value ($): "
-            + str(round(self._user_data["portfolio_value"], 4)),
-        ).grid(row=1, column=1, sticky="nsew", padx=(5, 10), pady=(5, 5))
+        self.balance_label = ttk.Label(self.info_frame)
+        self.balance_label.grid(
+            row=1, column=0, sticky="nsew", padx=(5, 10), pady=(5, 5)
+        )
+        self.value_label = ttk.Label(self.info_frame)
+        self.value_label.grid(
+            row=1, column=1, sticky="nsew", padx=(5, 10), pady=(5, 5)
+        )
         self.info_frame.grid(
             row=0,
             column=0,
@@ -273,6 +314,7 @@ class DashboardFrame(ttk.Frame):
         self.search_frame = ttk.LabelFrame(text="Search stock")
         self.search_frame.rowconfigure(0)
         self.search_frame.rowconfigure(1)
+        self.search_frame.rowconfigure(2)
         self.search_frame.columnconfigure(0)
         self.search_frame.columnconfigure(1)
         ttk.Label(self.search_frame, text="Enter stock name: ").grid(
@@ -282,8 +324,22 @@ class DashboardFrame(ttk.Frame):
         self.search_entry.grid(
             row=0, column=1, padx=(5, 5), pady=(5, 0), sticky="nsew"
         )
+        self.indicators_frame = ttk.Frame(self.search_frame)
+        self.indicator_vars = {}
+        for i, name in enumerate(INDICATORS):
+            self.indicator_vars[name] = tk.BooleanVar(
+                value=name in DEFAULT_INDICATORS
+            )
+            ttk.Checkbutton(
+                self.indicators_frame,
+                text=name,
+                variable=self.indicator_vars[name],
+            ).grid(row=i // 4, column=i % 4, padx=(5, 0), sticky="w")
+        self.indicators_frame.grid(
+            row=1, column=0, columnspan=2, pady=(5, 0), sticky="nsew"
+        )
         ttk.Button(self.search_frame, text="Search", command=self.search).grid(
-            row=1,
+            row=2,
             column=0,
             columnspan=2,
             padx=(5, 5),
@@ -320,36 +376,13 @@ class DashboardFrame(ttk.Frame):
             self.stock_table.column(col, width=100)
             self.stock_table.heading(col, text=col)
         self.stock_table.bind("<Double-1>", self.init_sell)
-        for count, stock in enumerate(self._user_data["portfolio"], start=1):
-            if (
-                abs(
-                    stock["cur_price"] * stock["quantity"]
-                    - stock["investment"]
-                )
-                <= 0.01
-            ):
-                state = "BREAK EVEN"
-            else:
-                state = (
-                    "PROFIT"
-                    if stock["cur_price"] * stock["quantity"]
-                    > stock["investment"]
-                    else "LOSS"
-                )
-            self.stock_table.insert(
-                "",
-                "end",
-                values=(
-                    count,
-                    stock["name"],
-                    stock["quantity"],
-                    round(stock["investment"], 4),
-                    round(stock["cur_price"], 4),
-                    state,
-                ),
-                tags=(state,),
-            )
-
+        # Ticker (row id) -> values of its row, used to patch only rows
+        # which changed.
+        self._rows = {}
+        # Ticker -> holding in JSON format, updated by streamed prices.
+        self._holdings = {}
+        self._stream = None
+        self.update_data(user_data)
         self.stock_table.tag_configure(
             "PROFIT", background="#BEF558", foreground="black"
         )
@@ -382,10 +415,170 @@ class DashboardFrame(ttk.Frame):
             padx=(5, 5),
             pady=(5, 5),
         )
+        if UI_FPS > 0:
+            self._stream = StreamListener(
+                self,
+                lambda: api.stream(
+                    "stream",
+                    headers={"Authorization": "Bearer " + self._token},
+                ),
+                lambda events: self.apply_ticks(events),
+                rate=UI_FPS,
+            )
+            self._stream.start()
+
+    def destroy(self):
+        """
+        This function stops streaming prices and destroys the frame.
+
+        Args:
+            None
+
+        Returns:
+            None
+        """
+        if self._stream is not None:
+            self._stream.stop()
+        ttk.Frame.destroy(self)
+
+    @staticmethod
+    def _row(count, stock):
+        """
+        This function provides values of a portfolio table row.
+
+        Args:
+            count: Serial number of the row.
+            stock: Holding in JSON format.
+
+        Returns:
+            Tuple of row's values, whose last value is its state.
+        """
+        value = stock["cur_price"] * stock["quantity"]
+        if abs(value - stock["investment"]) <= 0.01:
+            state = "BREAK EVEN"
+        else:
+            state = "PROFIT" if value > stock["investment"] else "LOSS"
+        return (
+            count,
+            stock["name"],
+            stock["quantity"],
+            round(stock["investment"], 4),
+            round(stock["cur_price"], 4),
+            state,
+        )
+
+    def update_data(self, user_data):
+        """
+        This function shows new user data by patching only labels and
+        portfolio rows which changed, so the window isn't rebuilt.
+
+        Args:
+            user_data: Userdata in JSON format, delta response of the API
+            or None if it didn't change.
+
+        Returns:
+            None
+        """
+        if user_data is None:
+            return
+        if user_data.get("delta"):
+            user_data = self._merge(user_data)
+        self._user_data = user_data
+        self.balance_label["text"] = "Balance ($): " + str(
+            round(user_data["balance"], 4)
+        )
+        self.value_label["text"] = "Total Portfolio Value ($): " + str(
+            round(user_data["portfolio_value"], 4)
+        )
+        self._holdings = {
+            stock["name"]: stock for stock in user_data["portfolio"]
+        }
+        rows = {
+            stock["name"]: self._row(count, stock)
+            for count, stock in enumerate(user_data["portfolio"], start=1)
+        }
+        removed = [name for name in self._rows if name not in rows]
+        if removed:
+            self.stock_table.delete(*removed)
+        for name, values in rows.items():
+            if name not in self._rows:
+                self.stock_table.insert(
+                    "",
+                    "end",
+                    iid=name,
+                    values=values,
+                    tags=(values[-1],),
+                )
+            elif self._rows[name] != values:
+                self.stock_table.item(name, values=values, tags=(values[-1],))
+        held_changed = rows.keys() != self._rows.keys()
+        self._rows = rows
+        order = list(rows)
+        if list(self.stock_table.get_children()) != order:
+            for index, name in enumerate(order):
+                self.stock_table.move(name, "", index)
+        if held_changed and self._stream is not None:
+            # Stream only covers tickers held when it was opened.
+            self._stream.reconnect()
+
+    def _merge(self, delta):
+        """
+        This function applies delta response of the API to current user
+        data.
+
+        Args:
+            delta: Delta response with changed holdings and totals.
+
+        Returns:
+            Updated userdata in JSON format.
+        """
+        holdings = {
+            stock["name"]: stock for stock in self._user_data["portfolio"]
+        }
+        for name in delta["removed"]:
+            holdings.pop(name, None)
+        for stock in delta["portfolio"]:
+            holdings[stock["name"]] = stock
+        user_data = dict(self._user_data)
+        for field in ("version", "balance", "portfolio_value", "stale_prices"):
+            user_data[field] = delta[field]
+        user_data["portfolio"] = list(holdings.values())
+        return user_data
+
+    def apply_ticks(self, prices):
+        """
+        This function applies streamed prices by patching rows of the
+        ticked stocks and total portfolio value.
+
+        Args:
+            prices: Dictionary of latest prices (in $) keyed by ticker.
+
+        Returns:
+            None
+        """
+        value = self._user_data["portfolio_value"]
+        for name, price in prices.items():
+            stock = self._holdings.get(name)
+            if stock is None:
+                continue
+            value += stock["quantity"] * (price - stock["cur_price"])
+            stock["cur_price"] = price
+            values = self._row(self._rows[name][0], stock)
+            if self._rows[name] != values:
+                self.stock_table.item(name, values=values, tags=(values[-1],))
+                self._rows[name] = values
+        if value != self._user_data["portfolio_value"]:
+            self._user_data["portfolio_value"] = value
+            self.value_label["text"] = "Total Portfolio Value ($): " + str(
+                round(value, 4)
+            )
 
     def search(self):
         """
-        This function displays given stock's history for the period of 4 years.
+        This function displays given stock's history since 2017 together
+        with selected indicators. Bars are served from local history cache,
+        so only bars added since the last search are downloaded and
+        evaluated by indicators.
 
         Args:
             None
@@ -393,23 +586,68 @@ class DashboardFrame(ttk.Frame):
         Returns:
             None
         """
-        try:
-            df = yf.download(
-                self.search_entry.get(),
+        stock_ticker = self.search_entry.get().strip().upper()
+        names = [
+            name
+            for name, selected in self.indicator_vars.items()
+            if selected.get()
+        ]
+
+        def load():
+            # Runs on a worker thread: download and evaluation only, no Tk.
+            df = history_store.get(
+                stock_ticker,
                 start="2017-01-01",
                 end=datetime.today().strftime("%Y-%m-%d"),
             )
-            fplt.candlestick_ochl(df[["Open", "Close", "High", "Low"]])
-            fplt.plot(df.Close.rolling(50).mean())
-            fplt.plot(df.Close.rolling(200).mean())
+            if df.empty:
+                raise IndexError("No data found for this ticker.")
+            cached = indicator_cache.setdefault(stock_ticker, {})
+            for name in names:
+                if name not in cached:
+                    cached[name] = INDICATORS[name]()
+            return df, [
+                (cached[name], cached[name].extend(df)) for name in names
+            ]
+
+        def done(result):
+            df, indicators = result
+            # Indicators which aren't overlays get a pane each.
+            panes = [i for i, _ in indicators if not i.overlay]
+            axes = fplt.create_plot(stock_ticker, rows=1 + len(panes))
+            axes = axes if isinstance(axes, (list, tuple)) else [axes]
+            fplt.candlestick_ochl(
+                df[["Open", "Close", "High", "Low"]], ax=axes[0]
+            )
+            for indicator, values in indicators:
+                ax = (
+                    axes[0]
+                    if indicator.overlay
+                    else axes[1 + panes.index(indicator)]
+                )
+                for column in values:
+                    fplt.plot(values[column], ax=ax, legend=column)
             fplt.show()
-        except IndexError:
-            messagebox.showerror("Stock Name Error", "Invalid Stock name")
+
+        def failed(error):
+            if isinstance(error, IndexError):
+                messagebox.showerror("Stock Name Error", "Invalid Stock name")
+            else:
+                self._master.show_error(error)
+
+        self._master.run_task(
+            f"Loading {stock_ticker} history",
+            load,
+            on_done=done,
+            on_error=failed,
+            timeout=120,
+        )
 
     def refresh(self):
         """
-        This function refreshes dashboard after getting new user data from the
-        API. This function indirectly uses login to get updated user data.
+        This function refreshes dashboard in place after getting new user
+        data from the API. The user is authenticated by session token issued
+        at login and only changes since the shown version are sent back.
 
         Args:
             None
@@ -417,19 +655,35 @@ class DashboardFrame(ttk.Frame):
         Returns:
             None
         """
-        payload = {
-            "username": self._user_data["username"],
-            "password": self._user_data["password"],
+        version = self._user_data.get("version", "")
+        headers = {
+            "Authorization": "Bearer " + self._token,
+            "If-None-Match": f'W/"{version}"',
         }
-        response = requests.post(API_ENDPOINT + "login", payload).json()
-        self._master.switch_frame(
-            DashboardFrame, "PyStock | Dashboard", response
+
+        def done(response):
+            if response is not None and response.get("error") is not None:
+                messagebox.showerror("Session Error", response["error"])
+                self._master.switch_frame(LoginFrame, "PyStock | Login")
+            else:
+                self.update_data(response)
+
+        self._master.run_task(
+            "Refreshing",
+            lambda: api.post(
+                "portfolio",
+                {"since": version},
+                idempotent=True,
+                headers=headers,
+            ),
+            on_done=done,
         )
 
     def analyze(self):
         """
-        This function analyzes user's portfolio and displays it in the form of
-        piechart.
+        This function fetches performance of user's portfolio from the API
+        and displays it along with portfolio distribution according to
+        current prices.
 
         Args:
             None
@@ -437,15 +691,87 @@ class DashboardFrame(ttk.Frame):
         Returns:
             None
         """
+
+        def done(response):
+            if response.get("error") is not None:
+                messagebox.showerror("Analytics Error", response["error"])
+            else:
+                self.show_analytics(response)
+
+        self._master.run_task(
+            "Analyzing",
+            lambda: api.post(
+                "analytics",
+                idempotent=True,
+                headers={"Authorization": "Bearer " + self._token},
+            ),
+            on_done=done,
+        )
+
+    def show_analytics(self, analytics):
+        """
+        This function draws portfolio distribution, equity curve with
+        drawdown and contribution of holdings, with performance metrics in
+        the title.
+
+        Args:
+            analytics: Response of `/analytics`.
+
+        Returns:
+            None
+        """
+        fig, ((pie, contribution), (equity, drawdown)) = plt.subplots(
+            2, 2, figsize=(12, 8)
+        )
         labels = []
         sizes = []
         for stock in self._user_data["portfolio"]:
             labels.append(stock["name"])
             sizes.append(stock["quantity"] * stock["cur_price"])
-        _, ax = plt.subplots()
-        ax.pie(sizes, labels=labels, autopct="%1.1f%%", startangle=90)
-        ax.axis("equal")
-        ax.set_title("Your portfolio distribution according to current prices")
+        pie.pie(sizes, labels=labels, autopct="%1.1f%%", startangle=90)
+        pie.axis("equal")
+        pie.set_title("Distribution according to current prices")
+
+        # Largest gains and losses only, so that labels stay readable.
+        contributions = analytics["contribution"]
+        if len(contributions) > 20:
+            contributions = contributions[:10] + contributions[-10:]
+        contribution.barh(
+            [c["name"] for c in contributions],
+            [c["contribution"] * 100 for c in contributions],
+            color=[
+                "green" if c["contribution"] >= 0 else "red"
+                for c in contributions
+            ],
+        )
+        contribution.invert_yaxis()
+        contribution.set_title("Contribution to return (%)")
+
+        dates = [
+            datetime.fromtimestamp(t) for t in analytics["series"]["time"]
+        ]
+        equity.plot(dates, analytics["series"]["equity"])
+        equity.set_title("Equity (balance + holdings, $)")
+        drawdown.fill_between(
+            dates,
+            [d * 100 for d in analytics["series"]["drawdown"]],
+            color="red",
+            alpha=0.4,
+        )
+        drawdown.set_title("Drawdown (%)")
+        fig.autofmt_xdate()
+
+        def percent(value):
+            return "n/a" if value is None else f"{value * 100:.2f}%"
+
+        sharpe = analytics["sharpe"]
+        fig.suptitle(
+            f"Return {percent(analytics['total_return'])} | "
+            f"Annualized {percent(analytics['annualized_return'])} | "
+            f"Volatility {percent(analytics['volatility'])} | "
+            f"Sharpe {'n/a' if sharpe is None else f'{sharpe:.2f}'} | "
+            f"Max drawdown {percent(analytics['max_drawdown'])}"
+        )
         plt.show()
 
     def init_sell(self, event):
@@ -459,10 +785,10 @@ class DashboardFrame(ttk.Frame):
         Returns:
             None
         """
-        item = self.stock_table.item(
-            self.stock_table.identify("item", event.x, event.y)
-        )
-        SellWindow(self, item["values"][1])
+        # Rows are identified by ticker.
+        stock_ticker = self.stock_table.identify_row(event.y)
+        if stock_ticker:
+            SellWindow(self, stock_ticker)
 
     def init_buy(self):
         """
@@ -527,24 +853,33 @@ class SellWindow(tk.Toplevel):
         """
         try:
             payload = {
-                "username": self._master._user_data["username"],
                 "action_type": "SELL",
                 "stock_ticker": self.stock_name,
                 "quantity": int(self.quantity_entry.get()),
+                # Only holdings changed by the trade are sent back.
+                "since": self._master._user_data.get("version", ""),
             }
             assert payload["quantity"] > 0, "Quantity must be positive."
         except (ValueError, AssertionError) as e:
             messagebox.showerror("Quantity Error", e)
             return
-        response = requests.post(
-            API_ENDPOINT + "update_portfolio", payload
-        ).json()
-        if response.get("error") is not None:
-            messagebox.showerror("Sell Stock Error", response["error"])
-        else:
-            self._master._master.switch_frame(
-                DashboardFrame, "PyStock | Dashboard", response
-            )
+
+        def done(response):
+            if response.get("error") is not None:
+                messagebox.showerror("Sell Stock Error", response["error"])
+            else:
+                self._master.update_data(response)
+                self.destroy()
+
+        self._master._master.run_task(
+            "Selling " + payload["stock_ticker"],
+            lambda: api.post(
+                "update_portfolio",
+                payload,
+                headers={"Authorization": "Bearer " + self._master._token},
+            ),
+            on_done=done,
+        )
 
 
 class BuyWindow(tk.Toplevel):
@@ -598,24 +933,33 @@ class BuyWindow(tk.Toplevel):
         """
         try:
             payload = {
-                "username": self._master._user_data["username"],
                 "action_type": "BUY",
                 "stock_ticker": self.name_entry.get(),
                 "quantity": int(self.quantity_entry.get()),
+                # Only holdings changed by the trade are sent back.
+                "since": self._master._user_data.get("version", ""),
             }
             assert payload["quantity"] > 0, "Quantity must be positive."
         except (ValueError, AssertionError) as e:
             messagebox.showerror("Quantity Error", e)
             return
-        response = requests.post(
-            API_ENDPOINT + "update_portfolio", payload
-        ).json()
-        if response.get("error") is not None:
-            messagebox.showerror("Buy Stock Error", response["error"])
-        else:
-            self._master._master.switch_frame(
-                DashboardFrame, "PyStock | Dashboard", response
-            )
+
+        def done(response):
+            if response.get("error") is not None:
+                messagebox.showerror("Buy Stock Error", response["error"])
+            else:
+                self._master.update_data(response)
+                self.destroy()
+
+        self._master._master.run_task(
+            "Buying " + payload["stock_ticker"],
+            lambda: api.post(
+                "update_portfolio",
+                payload,
+                headers={"Authorization": "Bearer " + self._master._token},
+            ),
+            on_done=done,
+        )
 
 
 class RootWindow(ThemedTk):
@@ -639,22 +983,114 @@ class RootWindow(ThemedTk):
         self._frame = None
         self._user_data = None
         self._theme = theme
-        if user_data is not None:
-            self._frame = frame(self, user_data)
-            self._user_data = user_data
-        else:
-            self._frame = frame(self)
-        self._frame.grid(row=0, column=0)
-        self.title(title)
+        # Status bar shown while requests are running in background.
+        self._status = ttk.Frame(self)
+        self._status_label = ttk.Label(self._status)
+        self._status_label.grid(row=0, column=0, padx=(5, 5), sticky="w")
+        self._status_progress = ttk.Progressbar(
+            self._status, mode="indeterminate", length=100
+        )
+        self._status_progress.grid(row=0, column=1, padx=(0, 5))
+        ttk.Button(
+            self._status, text="Cancel", command=self.cancel_tasks
+        ).grid(row=0, column=2, padx=(0, 5), pady=(0, 5))
+        self._status_shown = False
+        self.tasks = TaskRunner(self, on_change=self._show_tasks)
         self.iconphoto(
             False, tk.PhotoImage(file=pathlib.Path("assets/icon.png"))
         )
         self.resizable(0, 0)
+        self.switch_frame(frame, title, user_data)
+
+    def run_task(
+        self, description, func, *args, on_done=None, on_error=None, timeout=30
+    ):
+        """
+        This function runs a blocking call in background while the window
+        keeps responding, and shows its progress in status bar.
+
+        Args:
+            description: Text shown in status bar.
+            func: Function to call.
+            *args: Arguments of the call.
+            on_done: Function called with result of the call.
+            on_error: Function called with exception raised by the call.
+            Defaults to showing the error.
+            timeout: Seconds after which the call is abandoned.
+
+        Returns:
+            Task or None if the same task is already running.
+        """
+        return self.tasks.submit(
+            description,
+            func,
+            *args,
+            on_done=on_done,
+            on_error=on_error or self.show_error,
+            timeout=timeout,
+        )
+
+    def show_error(self, error):
+        """
+        This function reports failed background call.
+
+        Args:
+            error: Exception raised by the call.
+
+        Returns:
+            None
+        """
+        if isinstance(error, TimeoutError):
+            messagebox.showerror("Timeout Error", str(error))
+        elif isinstance(error, requests.RequestException):
+            messagebox.showerror(
+                "Connection Error", "Could not reach PyStock server."
+            )
+        else:
+            messagebox.showerror("Error", str(error))
+
+    def cancel_tasks(self):
+        """
+        This function cancels all background calls.
+
+        Args:
+            None
+
+        Returns:
+            None
+        """
+        self.tasks.cancel_all()
+        self._show_tasks([])
+
+    def _show_tasks(self, tasks):
+        """
+        This function updates status bar with running background calls.
+
+        Args:
+            tasks: List of running Task.
+
+        Returns:
+            None
+        """
+        tasks = [task for task in tasks if not task.cancelled]
+        if not tasks:
+            self._status_progress.stop()
+            self._status.grid_remove()
+            self._status_shown = False
+            return
+        text = f"{tasks[-1].description}... {tasks[-1].elapsed():.1f}s"
+        if len(tasks) > 1:
+            text += f" (+{len(tasks) - 1} more)"
+        self._status_label["text"] = text
+        if not self._status_shown:
+            self._status.grid(row=100, column=0, columnspan=10, sticky="ew")
+            self._status_progress.start(10)
+            self._status_shown = True
 
     def switch_frame(self, frame, title, user_data=None):
         """
-        This function destroys current window and opens a new one with given
-        frame.
+        This function replaces widgets of current frame with the given frame.
+        The window itself (with its theme and icon) is kept.
 
         Args:
             frame: New frame,.
@@ -662,8 +1098,20 @@ class RootWindow(ThemedTk):
             user_data: If it is not None, it is supplied in DashboardFrame
             if new frame is DashboardFrame.
         """
-        self.destroy()
-        self.__init__(frame, title, self._theme, user_data)
+        # Results of calls made for the old frame are of no use anymore.
+        self.tasks.cancel_all()
+        # Frames place their widgets directly in the window.
+        for child in self.winfo_children():
+            if child is not self._status:
+                child.destroy()
+        if user_data is not None:
+            self._frame = frame(self, user_data)
+            self._user_data = user_data
+        else:
+            self._frame = frame(self)
+            self._user_data = None
+        self._frame.grid(row=0, column=0)
+        self.title(title)
 
     def change_theme(self, theme):
         """
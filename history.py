@@ -0,0 +1,338 @@
+import json
+import re
+import threading
+import time
+import numpy as np
+import pandas as pd
+import yfinance as yf
+
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Layout of one daily bar on disk. Dates are stored as days since epoch.
+BAR_DTYPE = np.dtype(
+    [
+        ("date", "<i8"),
+        ("open", "<f8"),
+        ("high", "<f8"),
+        ("low", "<f8"),
+        ("close", "<f8"),
+        ("adj_close", "<f8"),
+        ("volume", "<f8"),
+    ]
+)
+# DataFrame column -> field of BAR_DTYPE, in yfinance's column order.
+COLUMNS = {
+    "Open": "open",
+    "High": "high",
+    "Low": "low",
+    "Close": "close",
+    "Adj Close": "adj_close",
+    "Volume": "volume",
+}
+EPOCH = datetime(1970, 1, 1)
+# Cache shared by the app's search and backtests.
+HISTORY_DIR = Path.home() / ".pystock" / "history"
+HISTORY_MAX_BYTES = 256 * 2**20
+
+
+def to_day(date):
+    """
+    This function converts date to number of days since epoch.
+
+    Args:
+        date: Date as "YYYY-MM-DD" string or datetime.
+
+    Returns:
+        Number of days since 1970-01-01.
+    """
+    if isinstance(date, str):
+        date = datetime.strptime(date, "%Y-%m-%d")
+    return (date - EPOCH).days
+
+
+def from_day(day):
+    """
+    This function converts number of days since epoch to date string.
+
+    Args:
+        day: Number of days since 1970-01-01.
+
+    Returns:
+        Date as "YYYY-MM-DD" string.
+    """
+    return (EPOCH + timedelta(days=int(day))).strftime("%Y-%m-%d")
+
+
+class HistoryStore:
+    """
+    This class provides on-disk cache of daily OHLCV bars. Bars of every
+    ticker are kept in a memory-mapped NumPy file; later requests only
+    download the bars missing from the cached range. When the cache grows
+    beyond `max_bytes`, tickers which weren't accessed for the longest time
+    are evicted.
+    """
+
+    def __init__(self, directory, max_bytes=256 * 2**20, download=None):
+        """
+        Constructor for HistoryStore
+
+        Args:
+            directory: Directory holding cached bars.
+            max_bytes: Maximum total size of cached bars.
+            download: Function with signature of `yf.download` used to
+            fetch bars. Defaults to `yf.download`.
+
+        Returns:
+            None
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._download = download or yf.download
+        # Lock of the store, not held while downloading.
+        self._lock = threading.Lock()
+        # ticker -> lock held while its bars are downloaded and merged
+        self._ticker_locks = {}
+        self._index_path = self.directory / "index.json"
+        # ticker -> {"file", "first", "last", "checked_until", "accessed",
+        # "bytes"}
+        self._index = {}
+        if self._index_path.is_file():
+            with open(self._index_path) as file:
+                self._index = json.load(file)
+
+    def get(self, stock_ticker, start, end=None):
+        """
+        This function provides daily bars of the given stock, downloading
+        only the part of the range which isn't cached yet.
+
+        Args:
+            stock_ticker: Stock Ticker
+            start: First date ("YYYY-MM-DD") of the range.
+            end: Date ("YYYY-MM-DD") after the last date of the range.
+            Defaults to today.
+
+        Returns:
+            DataFrame indexed by date with Open, High, Low, Close,
+            Adj Close and Volume columns. It is empty if the stock has no
+            data.
+        """
+        stock_ticker = stock_ticker.strip().upper()
+        start_day = to_day(start)
+        end_day = to_day(end) if end else to_day(datetime.today())
+        with self._lock:
+            ticker_lock = self._ticker_locks.setdefault(
+                stock_ticker, threading.Lock()
+            )
+        # Requests of the same ticker wait for each other's download, the
+        # rest only while bars are merged and saved.
+        with ticker_lock:
+            while True:
+                with self._lock:
+                    entry = self._index.get(stock_ticker)
+                    if entry is None or start_day < entry["first"]:
+                        # Nothing cached before this start, so fetch whole
+                        # range.
+                        fetch_from = start_day
+                    else:
+                        # Only bars after the last check can be missing.
+                        fetch_from = entry["checked_until"]
+                fetched = None
+                if fetch_from < end_day:
+                    fetched = self._fetch(stock_ticker, fetch_from, end_day)
+                with self._lock:
+                    entry = self._index.get(stock_ticker)
+                    if entry is None and fetch_from > start_day:
+                        # Cached bars were evicted meanwhile, start over.
+                        continue
+                    bars = self._merge(
+                        stock_ticker, entry, fetched, fetch_from, end_day
+                    )
+                    if bars is None:
+                        # Unknown ticker, nothing worth caching.
+                        return self._to_frame(np.empty(0, dtype=BAR_DTYPE))
+                    self._index[stock_ticker]["accessed"] = time.time()
+                    self._evict(keep=stock_ticker)
+                    self._write_index()
+                    break
+        lo, hi = np.searchsorted(bars["date"], [start_day, end_day])
+        return self._to_frame(bars[lo:hi])
+
+    def _fetch(self, stock_ticker, start_day, end_day):
+        """
+        This function downloads bars of the given range.
+
+        Args:
+            stock_ticker: Stock Ticker
+            start_day: First day of the range.
+            end_day: Day after the last day of the range.
+
+        Returns:
+            Structured array of BAR_DTYPE sorted by date.
+        """
+        df = self._download(
+            stock_ticker,
+            start=from_day(start_day),
+            end=from_day(end_day),
+            progress=False,
+        )
+        if isinstance(df.columns, pd.MultiIndex):
+            df.columns = df.columns.get_level_values(0)
+        if "Close" not in df:
+            return np.empty(0, dtype=BAR_DTYPE)
+        df = df.dropna(subset=["Close"])
+        bars = np.empty(len(df), dtype=BAR_DTYPE)
+        bars["date"] = df.index.values.astype("datetime64[D]").astype("int64")
+        for column, field in COLUMNS.items():
+            bars[field] = (
+                df[column].to_numpy(dtype="f8")
+                if column in df
+                else df["Close"].to_numpy(dtype="f8")
+            )
+        return bars
+
+    def _merge(self, stock_ticker, entry, fetched, fetch_from, end_day):
+        """
+        This function merges downloaded bars into cached ones, saving them.
+        Caller must hold the lock.
+
+        Args:
+            stock_ticker: Stock Ticker
+            entry: Index entry of the ticker or None.
+            fetched: Structured array of bars downloaded from `fetch_from`
+            until `end_day` or None if nothing was downloaded.
+            fetch_from: First day of downloaded range.
+            end_day: Day after the last day of downloaded range.
+
+        Returns:
+            Structured array of all cached bars of the ticker, or None if
+            nothing is cached and nothing was downloaded.
+        """
+        if fetched is None:
+            return self._load(entry)
+        if (
+            entry is not None
+            and fetch_from <= entry["checked_until"]
+            and end_day >= entry["first"]
+        ):
+            # Downloaded range adjoins cached one, so they are joined.
+            first = min(fetch_from, entry["first"])
+            checked_until = max(end_day, entry["checked_until"])
+            cached = self._load(entry)
+            if not len(fetched):
+                if fetch_from >= entry["first"]:
+                    # No new bars since the last check.
+                    entry["checked_until"] = checked_until
+                return cached
+            dates = cached["date"]
+            bars = np.concatenate(
+                [
+                    cached[dates < fetch_from],
+                    fetched,
+                    cached[dates >= end_day],
+                ]
+            )
+            self._save(stock_ticker, bars, first, checked_until)
+            return bars
+        if not len(fetched):
+            return None
+        self._save(stock_ticker, fetched, fetch_from, end_day)
+        return fetched
+
+    def _load(self, entry):
+        """
+        This function memory-maps cached bars.
+
+        Args:
+            entry: Index entry of the ticker or None.
+
+        Returns:
+            Structured array of BAR_DTYPE (empty if nothing is cached).
+        """
+        if entry is None or not (self.directory / entry["file"]).is_file():
+            return np.empty(0, dtype=BAR_DTYPE)
+        return np.load(self.directory / entry["file"], mmap_mode="r")
+
+    def _save(self, stock_ticker, bars, first_day, checked_until):
+        """
+        This function stores bars of the given ticker and updates index.
+
+        Args:
+            stock_ticker: Stock Ticker
+            bars: Structured array of BAR_DTYPE.
+            first_day: First day covered by the cache.
+            checked_until: Day up to which upstream has been checked.
+
+        Returns:
+            None
+        """
+        name = re.sub(r"[^A-Z0-9.\-]", "_", stock_ticker) + ".npy"
+        tmp_path = self.directory / (name + ".tmp")
+        with open(tmp_path, "wb") as file:
+            np.save(file, np.ascontiguousarray(bars))
+        tmp_path.replace(self.directory / name)
+        self._index[stock_ticker] = {
+            "file": name,
+            "first": first_day,
+            "last": int(bars["date"][-1]) if len(bars) else first_day,
+            "checked_until": checked_until,
+            "accessed": time.time(),
+            "bytes": (self.directory / name).stat().st_size,
+        }
+
+    def _evict(self, keep):
+        """
+        This function removes least recently accessed tickers until cache
+        fits into `max_bytes`.
+
+        Args:
+            keep: Ticker which must not be evicted.
+
+        Returns:
+            None
+        """
+        total = sum(entry["bytes"] for entry in self._index.values())
+        for stock_ticker in sorted(
+            self._index, key=lambda t: self._index[t]["accessed"]
+        ):
+            if total <= self.max_bytes:
+                break
+            if stock_ticker == keep:
+                continue
+            entry = self._index.pop(stock_ticker)
+            (self.directory / entry["file"]).unlink(missing_ok=True)
+            total -= entry["bytes"]
+
+    def _write_index(self):
+        """
+        This function persists index of cached tickers.
+
+        Args:
+            None
+
+        Returns:
+            None
+        """
+        tmp_path = self._index_path.with_suffix(".tmp")
+        with open(tmp_path, "w") as file:
+            json.dump(self._index, file)
+        tmp_path.replace(self._index_path)
+
+    @staticmethod
+    def _to_frame(bars):
+        """
+        This function converts bars to a DataFrame like `yf.download`'s.
+
+        Args:
+            bars: Structured array of BAR_DTYPE.
+
+        Returns:
+            DataFrame indexed by date.
+        """
+        return pd.DataFrame(
+            {column: bars[field] for column, field in COLUMNS.items()},
+            index=pd.DatetimeIndex(
+                bars["date"].astype("datetime64[D]"), name="Date"
+            ),
+        )
@@ -0,0 +1,501 @@
+import numpy as np
+import pandas as pd
+
+
+def ewm(values, alpha, last=np.nan):
+    """
+    This function computes exponential moving average
+    `y[i] = y[i - 1] + alpha * (x[i] - y[i - 1])`, continuing from `last`.
+
+    Args:
+        values: 1-D array of values.
+        alpha: Smoothing factor.
+        last: Average before the first value. NaN starts a new average at
+        the first value.
+
+    Returns:
+        Array of averages, one per value.
+    """
+    if len(values) > 16:
+        seeded = pd.Series(np.concatenate([[last], values]))
+        return seeded.ewm(alpha=alpha, adjust=False).mean().to_numpy()[1:]
+    # Few new values are cheaper to average in Python than in pandas.
+    averages = np.empty(len(values))
+    for i, value in enumerate(values):
+        if np.isnan(last):
+            last = value
+        elif not np.isnan(value):
+            last += alpha * (value - last)
+        averages[i] = last
+    return averages
+
+
+class _Windows:
+    """
+    This class provides sliding windows over a short array with the subset
+    of pandas' `Rolling` interface used by window indicators.
+    """
+
+    def __init__(self, values, period, count):
+        """
+        Constructor for _Windows
+
+        Args:
+            values: 1-D array of values.
+            period: Number of values in a window.
+            count: Number of windows (ending at the last values) to
+            evaluate. Windows which don't have enough values yield NaN.
+
+        Returns:
+            None
+        """
+        if len(values) >= period:
+            windows = np.lib.stride_tricks.sliding_window_view(values, period)
+            self._windows = windows[max(0, len(windows) - count) :]
+        else:
+            self._windows = np.empty((0, period))
+        self._missing = count - len(self._windows)
+
+    def mean(self):
+        return np.concatenate(
+            [np.full(self._missing, np.nan), self._windows.mean(axis=1)]
+        )
+
+    def std(self, ddof=1):
+        return np.concatenate(
+            [
+                np.full(self._missing, np.nan),
+                self._windows.std(axis=1, ddof=ddof),
+            ]
+        )
+
+
+class Indicator:
+    """
+    This class is the base of all indicators. `compute` evaluates indicator
+    over whole history at once and keeps the state needed by `update`, which
+    evaluates only newly arrived bars. `extend` picks the cheaper of the two
+    for a history that grew since the last call.
+    """
+
+    # Whether indicator is drawn over the price chart (otherwise it gets a
+    # pane of its own).
+    overlay = True
+
+    def __init__(self, name):
+        """
+        Constructor for Indicator
+
+        Args:
+            name: Name of the indicator, used as prefix of its columns.
+
+        Returns:
+            None
+        """
+        self.name = name
+        # Values of all bars seen so far, merged lazily so that an update
+        # doesn't copy the whole history.
+        self._chunks = []
+        self._count = 0
+
+    @property
+    def values(self):
+        """
+        This function provides indicator values of all bars seen so far.
+
+        Args:
+            None
+
+        Returns:
+            DataFrame of indicator values or None before first `compute`.
+        """
+        if len(self._chunks) == 0:
+            return None
+        if len(self._chunks) > 1:
+            self._chunks = [pd.concat(self._chunks)]
+        return self._chunks[0]
+
+    def compute(self, bars):
+        """
+        This function evaluates indicator over the given bars, discarding
+        any previous state.
+
+        Args:
+            bars: DataFrame of bars with Open, High, Low, Close and Volume
+            columns indexed by date.
+
+        Returns:
+            DataFrame of indicator values indexed like `bars`.
+        """
+        values = pd.DataFrame(self._compute(bars), index=bars.index)
+        self._chunks = [values]
+        self._count = len(values)
+        return values
+
+    def update(self, bars):
+        """
+        This function evaluates indicator over bars following the bars it
+        has already seen.
+
+        Args:
+            bars: DataFrame of new bars.
+
+        Returns:
+            DataFrame of indicator values of the new bars.
+        """
+        if len(self._chunks) == 0:
+            return self.compute(bars)
+        values = pd.DataFrame(self._update(bars), index=bars.index)
+        self._chunks.append(values)
+        self._count += len(values)
+        return values
+
+    def extend(self, bars):
+        """
+        This function provides indicator values of the given history. If it
+        continues the history seen so far, only new bars are evaluated.
+
+        Args:
+            bars: DataFrame of bars.
+
+        Returns:
+            DataFrame of indicator values indexed like `bars`.
+        """
+        if (
+            self._count == 0
+            or len(bars) < self._count
+            or bars.index[0] != self._chunks[0].index[0]
+            or bars.index[self._count - 1] != self._chunks[-1].index[-1]
+        ):
+            return self.compute(bars)
+        if len(bars) > self._count:
+            self.update(bars.iloc[self._count :])
+        return self.values
+
+    def _compute(self, bars):
+        """
+        This function evaluates indicator over whole history and resets the
+        state kept for `_update`.
+
+        Args:
+            bars: DataFrame of bars.
+
+        Returns:
+            Dictionary of column name -> array of values.
+        """
+        raise NotImplementedError
+
+    def _update(self, bars):
+        """
+        This function evaluates indicator over new bars using the kept state
+        and updates it.
+
+        Args:
+            bars: DataFrame of new bars.
+
+        Returns:
+            Dictionary of column name -> array of values.
+        """
+        raise NotImplementedError
+
+
+class _WindowIndicator(Indicator):
+    """
+    This class is the base of indicators over a fixed window of bars. New
+    bars are evaluated together with the last `period - 1` bars only.
+    """
+
+    def __init__(self, name, period):
+        """
+        Constructor for _WindowIndicator
+
+        Args:
+            name: Name of the indicator.
+            period: Number of bars in the window.
+
+        Returns:
+            None
+        """
+        Indicator.__init__(self, name)
+        self.period = period
+        self._tail = None
+
+    def _compute(self, bars):
+        close = bars["Close"].to_numpy()
+        self._tail = close[max(0, len(close) - self.period + 1) :]
+        return self._window(bars["Close"].rolling(self.period))
+
+    def _update(self, bars):
+        close = np.concatenate([self._tail, bars["Close"].to_numpy()])
+        self._tail = close[max(0, len(close) - self.period + 1) :]
+        return self._window(_Windows(close, self.period, len(bars)))
+
+    def _window(self, rolling):
+        """
+        This function evaluates indicator from windows of close price.
+
+        Args:
+            rolling: pandas' `Rolling` or `_Windows` of close price.
+
+        Returns:
+            Dictionary of column name -> array of values.
+        """
+        raise NotImplementedError
+
+
+class SMA(_WindowIndicator):
+    """This class provides simple moving average of close price."""
+
+    def __init__(self, period=50):
+        """
+        Constructor for SMA
+
+        Args:
+            period: Number of averaged bars.
+
+        Returns:
+            None
+        """
+        _WindowIndicator.__init__(self, f"SMA {period}", period)
+
+    def _window(self, rolling):
+        return {self.name: np.asarray(rolling.mean())}
+
+
+class BollingerBands(_WindowIndicator):
+    """
+    This class provides Bollinger bands: moving average of close price and
+    bands `width` standard deviations above and below it.
+    """
+
+    def __init__(self, period=20, width=2.0):
+        """
+        Constructor for BollingerBands
+
+        Args:
+            period: Number of averaged bars.
+            width: Distance of bands in standard deviations.
+
+        Returns:
+            None
+        """
+        _WindowIndicator.__init__(self, f"Bollinger {period}", period)
+        self.width = width
+
+    def _window(self, rolling):
+        middle = np.asarray(rolling.mean())
+        deviation = self.width * np.asarray(rolling.std(ddof=0))
+        return {
+            f"{self.name} upper": middle + deviation,
+            f"{self.name} middle": middle,
+            f"{self.name} lower": middle - deviation,
+        }
+
+
+class EMA(Indicator):
+    """This class provides exponential moving average of close price."""
+
+    def __init__(self, period=20):
+        """
+        Constructor for EMA
+
+        Args:
+            period: Span of the average in bars.
+
+        Returns:
+            None
+        """
+        Indicator.__init__(self, f"EMA {period}")
+        self.alpha = 2 / (period + 1)
+        self._last = np.nan
+
+    def _compute(self, bars):
+        self._last = np.nan
+        return self._update(bars)
+
+    def _update(self, bars):
+        values = ewm(bars["Close"].to_numpy(), self.alpha, self._last)
+        if len(values):
+            self._last = values[-1]
+        return {self.name: values}
+
+
+class MACD(Indicator):
+    """
+    This class provides moving average convergence divergence: difference
+    of fast and slow EMA of close price, its signal EMA and their
+    difference (histogram).
+    """
+
+    overlay = False
+
+    def __init__(self, fast=12, slow=26, signal=9):
+        """
+        Constructor for MACD
+
+        Args:
+            fast: Span of the fast EMA in bars.
+            slow: Span of the slow EMA in bars.
+            signal: Span of the signal EMA in bars.
+
+        Returns:
+            None
+        """
+        Indicator.__init__(self, "MACD")
+        self.alphas = (2 / (fast + 1), 2 / (slow + 1), 2 / (signal + 1))
+        self._last = (np.nan, np.nan, np.nan)
+
+    def _compute(self, bars):
+        self._last = (np.nan, np.nan, np.nan)
+        return self._update(bars)
+
+    def _update(self, bars):
+        close = bars["Close"].to_numpy()
+        fast = ewm(close, self.alphas[0], self._last[0])
+        slow = ewm(close, self.alphas[1], self._last[1])
+        macd = fast - slow
+        signal = ewm(macd, self.alphas[2], self._last[2])
+        if len(close):
+            self._last = (fast[-1], slow[-1], signal[-1])
+        return {
+            self.name: macd,
+            f"{self.name} signal": signal,
+            f"{self.name} histogram": macd - signal,
+        }
+
+
+class RSI(Indicator):
+    """
+    This class provides relative strength index of close price with
+    Wilder's smoothing of gains and losses.
+    """
+
+    overlay = False
+
+    def __init__(self, period=14):
+        """
+        Constructor for RSI
+
+        Args:
+            period: Smoothing period in bars.
+
+        Returns:
+            None
+        """
+        Indicator.__init__(self, f"RSI {period}")
+        self.alpha = 1 / period
+        self._last = (np.nan, np.nan, np.nan)
+
+    def _compute(self, bars):
+        self._last = (np.nan, np.nan, np.nan)
+        return self._update(bars)
+
+    def _update(self, bars):
+        close = bars["Close"].to_numpy()
+        change = np.diff(np.concatenate([[self._last[0]], close]))
+        gain = ewm(np.clip(change, 0, None), self.alpha, self._last[1])
+        loss = ewm(np.clip(-change, 0, None), self.alpha, self._last[2])
+        if len(close):
+            self._last = (close[-1], gain[-1], loss[-1])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rsi = np.where(loss == 0, 100.0, 100 - 100 / (1 + gain / loss))
+        return {self.name: np.where(np.isnan(gain), np.nan, rsi)}
+
+
+class ATR(Indicator):
+    """
+    This class provides average true range with Wilder's smoothing.
+    """
+
+    overlay = False
+
+    def __init__(self, period=14):
+        """
+        Constructor for ATR
+
+        Args:
+            period: Smoothing period in bars.
+
+        Returns:
+            None
+        """
+        Indicator.__init__(self, f"ATR {period}")
+        self.alpha = 1 / period
+        self._last = (np.nan, np.nan)
+
+    def _compute(self, bars):
+        self._last = (np.nan, np.nan)
+        return self._update(bars)
+
+    def _update(self, bars):
+        high = bars["High"].to_numpy()
+        low = bars["Low"].to_numpy()
+        close = bars["Close"].to_numpy()
+        previous = np.concatenate([[self._last[0]], close[:-1]])
+        # True range of the very first bar is just its range.
+        true_range = np.fmax(
+            high - low,
+            np.fmax(np.abs(high - previous), np.abs(low - previous)),
+        )
+        atr = ewm(true_range, self.alpha, self._last[1])
+        if len(close):
+            self._last = (close[-1], atr[-1])
+        return {self.name: atr}
+
+
+class VWAP(Indicator):
+    """
+    This class provides volume weighted average of typical price
+    `(High + Low + Close) / 3`. It is accumulated over whole history or,
+    with `session=True`, restarted every calendar day (for intraday bars).
+    """
+
+    def __init__(self, session=False):
+        """
+        Constructor for VWAP
+
+        Args:
+            session: Whether to restart the average every calendar day.
+
+        Returns:
+            None
+        """
+        Indicator.__init__(self, "VWAP")
+        self.session = session
+        self._last = (None, 0.0, 0.0)
+
+    def _compute(self, bars):
+        self._last = (None, 0.0, 0.0)
+        return self._update(bars)
+
+    def _update(self, bars):
+        typical = (
+            bars["High"].to_numpy()
+            + bars["Low"].to_numpy()
+            + bars["Close"].to_numpy()
+        ) / 3
+        volume = bars["Volume"].to_numpy(dtype="f8")
+        if self.session:
+            day = bars.index.normalize().to_numpy()
+        else:
+            day = np.zeros(len(bars), dtype="datetime64[ns]")
+        last_day, last_pv, last_volume = self._last
+        new_session = np.concatenate([[True], day[1:] != day[:-1]])
+        starts = np.flatnonzero(new_session)
+        session = np.cumsum(new_session) - 1
+        cum_pv = np.cumsum(typical * volume)
+        cum_volume = np.cumsum(volume)
+        # Subtract sums accumulated before each session started.
+        offset_pv = np.concatenate([[0.0], cum_pv])[starts][session]
+        offset_volume = np.concatenate([[0.0], cum_volume])[starts][session]
+        cum_pv -= offset_pv
+        cum_volume -= offset_volume
+        if len(bars) and day[0] == last_day:
+            # First session continues the one of the previous bars.
+            first = session == 0
+            cum_pv[first] += last_pv
+            cum_volume[first] += last_volume
+        if len(bars):
+            self._last = (day[-1], cum_pv[-1], cum_volume[-1])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return {self.name: cum_pv / cum_volume}
@@ -0,0 +1,112 @@
+import numpy as np
+
+# Seconds per year, used to annualize returns and volatility.
+YEAR = 365.25 * 86400
+
+
+def _finite(value):
+    """
+    This function converts a NumPy scalar to JSON-friendly float.
+
+    Args:
+        value: Number.
+
+    Returns:
+        Float or None if value isn't finite.
+    """
+    value = float(value)
+    return value if np.isfinite(value) else None
+
+
+def performance(totals, holdings, tickers, risk_free_rate=0.0, max_points=500):
+    """
+    This function computes performance of a portfolio from its snapshots.
+    Equity is balance plus value of holdings, so trades (which exchange
+    balance for stocks at market price) don't move it and every change is
+    gain or loss.
+
+    Contribution of a holding is change of its profit (value minus net
+    amount invested, which sales reduce by their proceeds, so realized
+    gains count too) between its first and last snapshot in the period,
+    relative to equity at start.
+
+    Args:
+        totals: Records of snapshots' totals (see `TOTALS_DTYPE`), ordered
+        by time.
+        holdings: Records of snapshots' holdings (see `HOLDINGS_DTYPE`),
+        ordered by time.
+        tickers: Tickers indexed by holding records.
+        risk_free_rate: Annual risk-free rate subtracted in Sharpe ratio.
+        max_points: Maximum number of points of returned series.
+
+    Returns:
+        Dictionary with "series" ("time", "equity" and "drawdown" lists),
+        "total_return", "annualized_return", "volatility" (annualized),
+        "sharpe", "max_drawdown", "current_drawdown" and "contribution"
+        (list of "name", "profit" and "contribution", largest first).
+        Metrics which need more snapshots are None.
+    """
+    times = totals["time"]
+    equity = totals["balance"] + totals["value"]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        peak = np.maximum.accumulate(equity) if len(equity) else equity
+        drawdown = np.where(peak > 0, equity / peak - 1, 0.0)
+        returns = equity[1:] / equity[:-1] - 1
+    result = {
+        "total_return": None,
+        "annualized_return": None,
+        "volatility": None,
+        "sharpe": None,
+        "max_drawdown": _finite(drawdown.min()) if len(drawdown) else None,
+        "current_drawdown": _finite(drawdown[-1]) if len(drawdown) else None,
+        "contribution": [],
+    }
+
+    if len(equity) > 1 and equity[0] > 0:
+        result["total_return"] = _finite(equity[-1] / equity[0] - 1)
+        years = (times[-1] - times[0]) / YEAR
+        if years > 0 and equity[-1] > 0:
+            # Short periods may overflow, leaving it unknown.
+            with np.errstate(over="ignore"):
+                result["annualized_return"] = _finite(
+                    (equity[-1] / equity[0]) ** (1 / years) - 1
+                )
+        returns = returns[np.isfinite(returns)]
+        if len(returns) > 1:
+            # Snapshots are periodic, with the live point possibly closer.
+            periods = YEAR / np.median(np.diff(times))
+            volatility = returns.std(ddof=1) * np.sqrt(periods)
+            result["volatility"] = _finite(volatility)
+            if volatility > 0:
+                result["sharpe"] = _finite(
+                    (returns.mean() * periods - risk_free_rate) / volatility
+                )
+
+        profit = holdings["quantity"] * holdings["price"]
+        profit -= holdings["investment"]
+        ids = holdings["ticker"]
+        held, first = np.unique(ids, return_index=True)
+        # Last record of every ticker is the first one in reversed order.
+        _, last = np.unique(ids[::-1], return_index=True)
+        last = len(ids) - 1 - last
+        change = profit[last] - profit[first]
+        order = np.argsort(-change, kind="stable")
+        result["contribution"] = [
+            {
+                "name": tickers[held[i]],
+                "profit": float(change[i]),
+                "contribution": float(change[i] / equity[0]),
+            }
+            for i in order
+        ]
+
+    # Every `step`-th point is returned, always including the latest one.
+    step = max(1, -(-len(times) // max_points))
+    points = np.unique(np.r_[np.arange(0, len(times), step), len(times) - 1])
+    points = points[points >= 0]
+    result["series"] = {
+        "time": times[points].tolist(),
+        "equity": equity[points].tolist(),
+        "drawdown": drawdown[points].tolist(),
+    }
+    return result
@@ -0,0 +1,196 @@
+import base64
+import hashlib
+import hmac
+import os
+import threading
+import time
+import uuid
+
+from collections import OrderedDict
+from itsdangerous import BadData, URLSafeTimedSerializer
+
+# Prefix of hashed passwords. Stored passwords without it are plaintext
+# ones written by older versions.
+HASH_ALGORITHM = "pbkdf2_sha256"
+
+
+def hash_password(password, iterations):
+    """
+    This function hashes password with PBKDF2-HMAC-SHA256 and random salt.
+
+    Args:
+        password: Password to hash.
+        iterations: Number of iterations, i.e. cost of hashing (and of every
+        login).
+
+    Returns:
+        Hash as "pbkdf2_sha256$iterations$salt$hash" string.
+    """
+    salt = os.urandom(16)
+    digest = hashlib.pbkdf2_hmac("sha256", password.encode(), salt, iterations)
+    return "$".join(
+        (
+            HASH_ALGORITHM,
+            str(iterations),
+            base64.b64encode(salt).decode(),
+            base64.b64encode(digest).decode(),
+        )
+    )
+
+
+def verify_password(password, stored, iterations):
+    """
+    This function checks password against its stored hash (or plaintext
+    password stored by older versions).
+
+    Args:
+        password: Supplied password.
+        stored: Stored hash or plaintext password.
+        iterations: Currently configured number of iterations.
+
+    Returns:
+        Tuple of whether the password is correct and whether stored password
+        should be re-hashed (plaintext or hashed with other cost).
+    """
+    parts = stored.split("$")
+    if len(parts) != 4 or parts[0] != HASH_ALGORITHM:
+        return hmac.compare_digest(password.encode(), stored.encode()), True
+    digest = hashlib.pbkdf2_hmac(
+        "sha256",
+        password.encode(),
+        base64.b64decode(parts[2]),
+        int(parts[1]),
+    )
+    return (
+        hmac.compare_digest(digest, base64.b64decode(parts[3])),
+        int(parts[1]) != iterations,
+    )
+
+
+class SessionStore:
+    """
+    This class issues and verifies signed session tokens and caches data of
+    users with sessions. Tokens carry username, so verifying them needs no
+    storage access; logged out sessions are remembered until their tokens
+    expire. User data is cached by username, so that it is only read from
+    storage once and then kept up to date by trades, with least recently
+    used users evicted once `max_users` users are cached.
+    """
+
+    def __init__(self, secret_key, max_age=86400.0, max_users=1024):
+        """
+        Constructor for SessionStore
+
+        Args:
+            secret_key: Key used to sign tokens. Tokens signed with another
+            key (e.g. before a restart with random key) are rejected.
+            max_age: Seconds for which a token is valid.
+            max_users: Maximum number of users whose data is cached.
+
+        Returns:
+            None
+        """
+        self._serializer = URLSafeTimedSerializer(
+            secret_key, salt="pystock-session"
+        )
+        self.max_age = max_age
+        self.max_users = max_users
+        # session id -> expiry time of its token
+        self._revoked = {}
+        # username -> user's data
+        self._users = OrderedDict()
+        self._lock = threading.Lock()
+
+    def issue(self, username):
+        """
+        This function creates a new session of the user.
+
+        Args:
+            username: Username.
+
+        Returns:
+            Signed token of the session.
+        """
+        return self._serializer.dumps(
+            {"username": username, "session": uuid.uuid4().hex}
+        )
+
+    def verify(self, token):
+        """
+        This function checks the given token.
+
+        Args:
+            token: Token issued by `issue`.
+
+        Returns:
+            Username of the session or None if token is invalid, expired or
+            logged out.
+        """
+        try:
+            session = self._serializer.loads(token, max_age=self.max_age)
+        except BadData:
+            return None
+        with self._lock:
+            if session["session"] in self._revoked:
+                return None
+        return session["username"]
+
+    def revoke(self, token):
+        """
+        This function logs out the session of the given token.
+
+        Args:
+            token: Token issued by `issue`.
+
+        Returns:
+            True if token was valid otherwise False.
+        """
+        try:
+            session = self._serializer.loads(token, max_age=self.max_age)
+        except BadData:
+            return False
+        now = time.time()
+        with self._lock:
+            # Tokens of forgotten sessions have expired anyway.
+            self._revoked = {
+                session_id: expiry
+                for session_id, expiry in self._revoked.items()
+                if expiry > now
+            }
+            self._revoked[session["session"]] = now + self.max_age
+        return True
+
+    def cache_user(self, data):
+        """
+        This function stores copy of user's data.
+
+        Args:
+            data: User's data with "portfolio" as Portfolio.
+
+        Returns:
+            None
+        """
+        data = dict(data, portfolio=data["portfolio"].copy())
+        with self._lock:
+            self._users[data["username"]] = data
+            self._users.move_to_end(data["username"])
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+
+    def cached_user(self, username):
+        """
+        This function provides copy of cached user's data, which the caller
+        may modify.
+
+        Args:
+            username: Username.
+
+        Returns:
+            User's data or None if it isn't cached.
+        """
+        with self._lock:
+            data = self._users.get(username)
+            if data is None:
+                return None
+            self._users.move_to_end(username)
+        return dict(data, portfolio=data["portfolio"].copy())
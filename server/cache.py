@@ -0,0 +1,372 @@
+import threading
+import time
+
+from collections import OrderedDict
+
+
+class _Flight:
+    """This class represents a single in-progress fetch of a quote."""
+
+    def __init__(self):
+        """
+        Constructor for _Flight
+
+        Args:
+            None
+
+        Returns:
+            None
+        """
+        self._done = threading.Event()
+        self._price = None
+        self._error = None
+
+    def resolve(self, price):
+        """
+        This function publishes fetched price to all waiters.
+
+        Args:
+            price: Fetched price.
+
+        Returns:
+            None
+        """
+        self._price = price
+        self._done.set()
+
+    def fail(self, error):
+        """
+        This function publishes fetch error to all waiters.
+
+        Args:
+            error: Exception raised by the fetch.
+
+        Returns:
+            None
+        """
+        self._error = error
+        self._done.set()
+
+    def wait(self):
+        """
+        This function blocks until fetch is finished.
+
+        Args:
+            None
+
+        Returns:
+            Fetched price. Exception raised by the fetch is re-raised.
+        """
+        self._done.wait()
+        if self._error is not None:
+            raise self._error
+        return self._price
+
+
+class QuoteCache:
+    """
+    This class provides thread-safe in-process cache of stock quotes keyed by
+    ticker. Entries expire after `ttl` seconds, least recently used entries
+    are evicted once cache holds `max_size` tickers and concurrent misses for
+    the same ticker are coalesced into a single upstream fetch.
+    """
+
+    def __init__(
+        self, fetch_func, fetch_many_func=None, ttl=15.0, max_size=1024
+    ):
+        """
+        Constructor for QuoteCache
+
+        Args:
+            fetch_func: Function which fetches price of a ticker from
+            upstream.
+            fetch_many_func: Function which fetches prices of a list of
+            tickers in one upstream call and returns a dictionary of the
+            prices it found. Defaults to calling `fetch_func` per ticker.
+            ttl: Seconds for which fetched price is considered fresh.
+            max_size: Maximum number of tickers stored in cache.
+
+        Returns:
+            None
+        """
+        self._fetch_func = fetch_func
+        self._fetch_many_func = fetch_many_func
+        self.ttl = ttl
+        self.max_size = max_size
+        # ticker -> (price, expiry time)
+        self._entries = OrderedDict()
+        # ticker -> _Flight of the fetch currently in progress
+        self._inflight = {}
+        self._lock = threading.Lock()
+        # Functions called with dictionary of newly stored prices.
+        self._listeners = []
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def get(self, stock_ticker):
+        """
+        This function provides price of the given stock from cache, fetching
+        it from upstream if it is missing or expired.
+
+        Args:
+            stock_ticker: Stock Ticker
+
+        Returns:
+            Price of the given stock.
+        """
+        with self._lock:
+            entry = self._entries.get(stock_ticker)
+            if entry is not None and entry[1] > time.monotonic():
+                self._entries.move_to_end(stock_ticker)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+            flight = self._inflight.get(stock_ticker)
+            is_leader = flight is None
+            if is_leader:
+                flight = self._inflight[stock_ticker] = _Flight()
+            else:
+                self.coalesced += 1
+        if is_leader:
+            return self._fetch(stock_ticker, flight)
+        return flight.wait()
+
+    def _fetch(self, stock_ticker, flight):
+        """
+        This function fetches price from upstream on behalf of all callers
+        waiting on `flight`.
+
+        Args:
+            stock_ticker: Stock Ticker
+            flight: _Flight registered for this fetch.
+
+        Returns:
+            Fetched price.
+        """
+        try:
+            price = self._fetch_func(stock_ticker)
+        except BaseException as e:
+            with self._lock:
+                self._inflight.pop(stock_ticker, None)
+            flight.fail(e)
+            raise
+        with self._lock:
+            self._store(stock_ticker, price, self.ttl)
+            self._inflight.pop(stock_ticker, None)
+        flight.resolve(price)
+        self._notify({stock_ticker: price})
+        return price
+
+    def get_many(self, stock_tickers):
+        """
+        This function provides prices of the given stocks from cache. All
+        missing or expired tickers are fetched together in one upstream
+        call, except those already being fetched by another request.
+
+        Args:
+            stock_tickers: List of Stock Tickers.
+
+        Returns:
+            Tuple of dictionary of prices and dictionary of error messages,
+            both keyed by ticker.
+        """
+        prices = {}
+        errors = {}
+        leading = {}
+        following = {}
+        with self._lock:
+            now = time.monotonic()
+            for stock_ticker in dict.fromkeys(stock_tickers):
+                entry = self._entries.get(stock_ticker)
+                if entry is not None and entry[1] > now:
+                    self._entries.move_to_end(stock_ticker)
+                    self.hits += 1
+                    prices[stock_ticker] = entry[0]
+                    continue
+                self.misses += 1
+                flight = self._inflight.get(stock_ticker)
+                if flight is None:
+                    flight = self._inflight[stock_ticker] = _Flight()
+                    leading[stock_ticker] = flight
+                else:
+                    self.coalesced += 1
+                    following[stock_ticker] = flight
+        if leading:
+            fetched, error = self._fetch_many(list(leading))
+            with self._lock:
+                for stock_ticker in leading:
+                    if stock_ticker in fetched:
+                        self._store(
+                            stock_ticker, fetched[stock_ticker], self.ttl
+                        )
+                    self._inflight.pop(stock_ticker, None)
+            self._notify(fetched)
+            for stock_ticker, flight in leading.items():
+                if stock_ticker in fetched:
+                    prices[stock_ticker] = fetched[stock_ticker]
+                    flight.resolve(fetched[stock_ticker])
+                else:
+                    errors[stock_ticker] = str(error)
+                    flight.fail(error)
+        for stock_ticker, flight in following.items():
+            try:
+                prices[stock_ticker] = flight.wait()
+            except Exception as e:
+                errors[stock_ticker] = str(e)
+        return prices, errors
+
+    def _fetch_many(self, stock_tickers):
+        """
+        This function fetches prices of the given stocks from upstream.
+
+        Args:
+            stock_tickers: List of Stock Tickers.
+
+        Returns:
+            Tuple of dictionary of fetched prices and the exception to
+            report for tickers that are missing from it.
+        """
+        # Same error yahoo_fin raises for unknown tickers.
+        error = AssertionError("No data found for this ticker.")
+        if self._fetch_many_func is not None:
+            try:
+                return self._fetch_many_func(stock_tickers), error
+            except Exception as e:
+                return {}, e
+        fetched = {}
+        for stock_ticker in stock_tickers:
+            try:
+                fetched[stock_ticker] = self._fetch_func(stock_ticker)
+            except Exception as e:
+                error = e
+        return fetched, error
+
+    def refresh_many(self, stock_tickers, ttl=None):
+        """
+        This function fetches prices of the given stocks from upstream in
+        one call and stores them, even if cached prices are still fresh.
+
+        Args:
+            stock_tickers: List of Stock Tickers.
+            ttl: Seconds for which fetched prices are fresh. Defaults to
+            cache's ttl.
+
+        Returns:
+            Dictionary of error messages keyed by ticker.
+        """
+        fetched, error = self._fetch_many(list(stock_tickers))
+        with self._lock:
+            for stock_ticker, price in fetched.items():
+                self._store(
+                    stock_ticker, price, self.ttl if ttl is None else ttl
+                )
+        self._notify(fetched)
+        return {
+            stock_ticker: str(error)
+            for stock_ticker in stock_tickers
+            if stock_ticker not in fetched
+        }
+
+    def put(self, stock_ticker, price, ttl=None):
+        """
+        This function stores the given price in cache.
+
+        Args:
+            stock_ticker: Stock Ticker
+            price: Price of the stock.
+            ttl: Seconds for which price is fresh. Defaults to cache's ttl.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._store(stock_ticker, price, self.ttl if ttl is None else ttl)
+        self._notify({stock_ticker: price})
+
+    def peek_many(self, stock_tickers):
+        """
+        This function provides cached prices of the given stocks, including
+        expired ones, without fetching anything.
+
+        Args:
+            stock_tickers: List of Stock Tickers.
+
+        Returns:
+            Dictionary of cached prices keyed by ticker.
+        """
+        with self._lock:
+            return {
+                stock_ticker: self._entries[stock_ticker][0]
+                for stock_ticker in stock_tickers
+                if stock_ticker in self._entries
+            }
+
+    def subscribe(self, listener):
+        """
+        This function registers a function which is called with dictionary
+        of prices (keyed by ticker) whenever they are fetched and stored.
+        It is called on the fetching thread, so it must not block.
+
+        Args:
+            listener: Function taking dictionary of prices.
+
+        Returns:
+            None
+        """
+        self._listeners.append(listener)
+
+    def _notify(self, prices):
+        """
+        This function passes newly stored prices to all listeners.
+
+        Args:
+            prices: Dictionary of prices keyed by ticker.
+
+        Returns:
+            None
+        """
+        if prices:
+            for listener in self._listeners:
+                listener(prices)
+
+    def _store(self, stock_ticker, price, ttl):
+        """
+        This function stores price and evicts least recently used entries.
+        Caller must hold the lock.
+
+        Args:
+            stock_ticker: Stock Ticker
+            price: Price of the stock.
+            ttl: Seconds for which price is fresh.
+
+        Returns:
+            None
+        """
+        self._entries[stock_ticker] = (price, time.monotonic() + ttl)
+        self._entries.move_to_end(stock_ticker)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self):
+        """
+        This function provides counters of the cache.
+
+        Args:
+            None
+
+        Returns:
+            Dictionary with size, hits, misses, coalesced and evictions.
+        """
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,141 @@
+import os
+import secrets
+
+# Every setting can be overridden with an environment variable of the same
+# name prefixed by `PYSTOCK_` (e.g. `PYSTOCK_QUOTE_TTL=30`).
+
+# Seconds for which a fetched quote is served from the cache.
+QUOTE_TTL = float(os.environ.get("PYSTOCK_QUOTE_TTL", 15))
+# Maximum number of tickers kept in the quote cache.
+QUOTE_CACHE_SIZE = int(os.environ.get("PYSTOCK_QUOTE_CACHE_SIZE", 1024))
+# Seconds after which FX rates used for non-USD tickers are re-fetched.
+FX_REFRESH_INTERVAL = float(os.environ.get("PYSTOCK_FX_REFRESH_INTERVAL", 600))
+# Threads used to fetch prices of portfolio holdings concurrently.
+PRICE_WORKERS = int(os.environ.get("PYSTOCK_PRICE_WORKERS", 16))
+# Seconds a request waits for portfolio prices before falling back to the
+# last stored price of the remaining holdings.
+PRICE_DEADLINE = float(os.environ.get("PYSTOCK_PRICE_DEADLINE", 5))
+# Maximum number of tickers accepted by a single `/quotes` request.
+MAX_BATCH_TICKERS = int(os.environ.get("PYSTOCK_MAX_BATCH_TICKERS", 200))
+# Seconds after which latest bars of a ticker in the history cache are
+# re-fetched.
+HISTORY_TTL = float(os.environ.get("PYSTOCK_HISTORY_TTL", 900))
+# Maximum number of tickers kept in the history cache.
+HISTORY_CACHE_SIZE = int(os.environ.get("PYSTOCK_HISTORY_CACHE_SIZE", 256))
+# Default and maximum number of bars returned by `/history`.
+HISTORY_MAX_POINTS = int(os.environ.get("PYSTOCK_HISTORY_MAX_POINTS", 2000))
+# Number of users whose portfolio versions are remembered for delta
+# responses of `/login` and `/update_portfolio`.
+VERSIONED_USERS = int(os.environ.get("PYSTOCK_VERSIONED_USERS", 10000))
+# Responses larger than this many bytes are gzip compressed for clients
+# accepting it. 0 disables compression.
+COMPRESS_MIN_SIZE = int(os.environ.get("PYSTOCK_COMPRESS_MIN_SIZE", 1024))
+# Key signing session tokens. Defaults to a random key, so sessions end
+# when server restarts.
+SECRET_KEY = os.environ.get("PYSTOCK_SECRET_KEY") or secrets.token_hex(32)
+# Seconds for which a session token issued by `/login` is valid.
+SESSION_MAX_AGE = float(os.environ.get("PYSTOCK_SESSION_MAX_AGE", 86400))
+# Number of users whose data is kept in memory for `/portfolio` and trades.
+SESSION_CACHE_USERS = int(os.environ.get("PYSTOCK_SESSION_CACHE_USERS", 1024))
+# PBKDF2 iterations of password hashes. Higher values slow down brute
+# forcing and every login; existing hashes are upgraded at login.
+PASSWORD_ITERATIONS = int(
+    os.environ.get("PYSTOCK_PASSWORD_ITERATIONS", 310000)
+)
+# Storage backend for user data: "json" (one document per user), "sqlite"
+# or "ledger" (append-only trade log with snapshots).
+STORAGE = os.environ.get("PYSTOCK_STORAGE", "json")
+# Default storage path of every backend: directory of JSON documents, path
+# of the SQLite database or directory of trade ledgers.
+DEFAULT_STORAGE_PATHS = {
+    "json": "userdata",
+    "sqlite": "userdata/pystock.db",
+    "ledger": "userdata/ledger",
+}
+STORAGE_PATH = os.environ.get(
+    "PYSTOCK_STORAGE_PATH", DEFAULT_STORAGE_PATHS.get(STORAGE, "userdata")
+)
+# Number of trades after which the ledger backend snapshots a user.
+LEDGER_SNAPSHOT_INTERVAL = int(
+    os.environ.get("PYSTOCK_LEDGER_SNAPSHOT_INTERVAL", 100)
+)
+# File keeping resting limit/stop orders (outside STORAGE_PATH's JSON
+# documents) and number of closed orders remembered per user.
+ORDERS_PATH = os.environ.get(
+    "PYSTOCK_ORDERS_PATH", "userdata/orders/book.json"
+)
+ORDER_HISTORY = int(os.environ.get("PYSTOCK_ORDER_HISTORY", 100))
+# Directory of users' balance and holdings snapshots, taken every
+# SNAPSHOT_INTERVAL seconds (0 disables snapshots).
+SNAPSHOT_PATH = os.environ.get("PYSTOCK_SNAPSHOT_PATH", "userdata/snapshots")
+SNAPSHOT_INTERVAL = float(os.environ.get("PYSTOCK_SNAPSHOT_INTERVAL", 3600))
+# Annual risk-free rate used in Sharpe ratio of `/analytics`.
+RISK_FREE_RATE = float(os.environ.get("PYSTOCK_RISK_FREE_RATE", 0))
+# Maximum number of points of series returned by `/analytics`.
+ANALYTICS_MAX_POINTS = int(os.environ.get("PYSTOCK_ANALYTICS_MAX_POINTS", 500))
+# Maximum page size of `/transactions`.
+MAX_TRANSACTIONS_PAGE = int(
+    os.environ.get("PYSTOCK_MAX_TRANSACTIONS_PAGE", 500)
+)
+# Address and port the server listens on.
+HOST = os.environ.get("PYSTOCK_HOST", "127.0.0.1")
+PORT = int(os.environ.get("PYSTOCK_PORT", 5000))
+# "waitress" (multi-threaded production server) or "dev" (Flask's server).
+SERVER = os.environ.get("PYSTOCK_SERVER", "waitress")
+# Number of threads serving requests.
+WORKERS = int(os.environ.get("PYSTOCK_WORKERS", 8))
+# Maximum number of concurrent `/stream` clients. Each of them holds one
+# serving thread, so it defaults to half of WORKERS.
+STREAM_MAX_CLIENTS = int(
+    os.environ.get("PYSTOCK_STREAM_MAX_CLIENTS", max(1, WORKERS // 2))
+)
+# Seconds between heartbeats of idle `/stream` responses, which detect
+# disconnected clients.
+STREAM_HEARTBEAT = float(os.environ.get("PYSTOCK_STREAM_HEARTBEAT", 15))
+# Enables Flask's debugger. Never enable it on a reachable host.
+DEBUG = os.environ.get("PYSTOCK_DEBUG", "0").lower() in ("1", "true", "yes")
+# Sampling profiler: "off", "toggle" (controlled with `/profiler`) or "on"
+# (started with the server and controlled with `/profiler`).
+PROFILER = os.environ.get("PYSTOCK_PROFILER", "off").lower()
+# Token `/profiler` requests must send as `Authorization: Bearer <token>`.
+# Without it `/profiler` only serves clients on loopback, as sampling slows
+# every request and sampled stacks expose internals.
+PROFILER_TOKEN = os.environ.get("PYSTOCK_PROFILER_TOKEN", "")
+# Seconds between stack samples of the profiler.
+PROFILER_INTERVAL = float(os.environ.get("PYSTOCK_PROFILER_INTERVAL", 0.01))
+# Source of prices, history and FX rates: "yahoo" (live data) or "replay"
+# (deterministic offline data, for tests and load benchmarks).
+PRICE_PROVIDER = os.environ.get("PYSTOCK_PRICE_PROVIDER", "yahoo").lower()
+# Recorded ticks replayed by the "replay" provider (CSV or Parquet file with
+# "timestamp", "ticker" and "price" columns). Synthetic random walks seeded
+# by REPLAY_SEED are generated for any ticker if empty.
+REPLAY_PATH = os.environ.get("PYSTOCK_REPLAY_PATH", "")
+# Replay seconds per real second (0 freezes prices).
+REPLAY_SPEED = float(os.environ.get("PYSTOCK_REPLAY_SPEED", 1))
+# Seconds every replayed upstream call waits, to simulate network latency.
+REPLAY_LATENCY = float(os.environ.get("PYSTOCK_REPLAY_LATENCY", 0))
+REPLAY_SEED = int(os.environ.get("PYSTOCK_REPLAY_SEED", 0))
+# Replayed FX rates as comma separated "BASE/QUOTE=rate" pairs (e.g.
+# "USD/INR=83.1,USD/GBP=0.79"). Other pairs have rate 1.
+REPLAY_FX_RATES = {
+    pair.strip(): float(rate)
+    for pair, rate in (
+        item.split("=")
+        for item in os.environ.get("PYSTOCK_REPLAY_FX_RATES", "").split(",")
+        if item.strip()
+    )
+}
+# Background refresh of all held tickers. Tickers are refreshed every
+# REFRESH_INTERVAL_OPEN seconds while their market is open and every
+# REFRESH_INTERVAL_CLOSED seconds otherwise.
+REFRESH_ENABLED = os.environ.get("PYSTOCK_REFRESH", "1").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+REFRESH_INTERVAL_OPEN = float(
+    os.environ.get("PYSTOCK_REFRESH_INTERVAL_OPEN", 30)
+)
+REFRESH_INTERVAL_CLOSED = float(
+    os.environ.get("PYSTOCK_REFRESH_INTERVAL_CLOSED", 900)
+)
@@ -0,0 +1,231 @@
+import threading
+import time
+
+from datetime import datetime, timezone
+
+# Exchange suffix of a Yahoo ticker -> (currency, minor units per quote unit).
+# London, Johannesburg and Tel Aviv quote in pence/cents/agorot.
+EXCHANGE_CURRENCIES = {
+    "NS": ("INR", 1),
+    "BO": ("INR", 1),
+    "L": ("GBP", 100),
+    "IL": ("GBP", 100),
+    "AX": ("AUD", 1),
+    "NZ": ("NZD", 1),
+    "BE": ("EUR", 1),
+    "DE": ("EUR", 1),
+    "F": ("EUR", 1),
+    "DU": ("EUR", 1),
+    "HM": ("EUR", 1),
+    "HA": ("EUR", 1),
+    "MU": ("EUR", 1),
+    "SG": ("EUR", 1),
+    "PA": ("EUR", 1),
+    "AS": ("EUR", 1),
+    "BR": ("EUR", 1),
+    "MI": ("EUR", 1),
+    "MC": ("EUR", 1),
+    "LS": ("EUR", 1),
+    "VI": ("EUR", 1),
+    "HE": ("EUR", 1),
+    "IR": ("EUR", 1),
+    "SW": ("CHF", 1),
+    "ST": ("SEK", 1),
+    "OL": ("NOK", 1),
+    "CO": ("DKK", 1),
+    "TO": ("CAD", 1),
+    "V": ("CAD", 1),
+    "CN": ("CAD", 1),
+    "HK": ("HKD", 1),
+    "T": ("JPY", 1),
+    "SS": ("CNY", 1),
+    "SZ": ("CNY", 1),
+    "KS": ("KRW", 1),
+    "KQ": ("KRW", 1),
+    "SI": ("SGD", 1),
+    "JK": ("IDR", 1),
+    "BK": ("THB", 1),
+    "KL": ("MYR", 1),
+    "SA": ("BRL", 1),
+    "MX": ("MXN", 1),
+    "JO": ("ZAR", 100),
+    "TA": ("ILS", 100),
+}
+
+
+def exchange_suffix(stock_ticker):
+    """
+    This function extracts exchange suffix of the given Yahoo ticker.
+
+    Args:
+        stock_ticker: Stock Ticker
+
+    Returns:
+        Upper-case suffix (e.g. "NS" for "TCS.NS") or "" for US tickers.
+    """
+    if "." in stock_ticker:
+        suffix = stock_ticker.rsplit(".", 1)[1].upper()
+        if suffix in EXCHANGE_CURRENCIES:
+            return suffix
+    return ""
+
+
+def ticker_currency(stock_ticker):
+    """
+    This function derives quote currency of the given ticker from its
+    exchange suffix.
+
+    Args:
+        stock_ticker: Stock Ticker
+
+    Returns:
+        Tuple of currency code and number of minor units per quote unit.
+        Tickers without a known suffix are assumed to be quoted in USD.
+    """
+    return EXCHANGE_CURRENCIES.get(exchange_suffix(stock_ticker), ("USD", 1))
+
+
+class FXRateProvider:
+    """
+    This class provides thread-safe in-memory FX rates. Each currency pair is
+    fetched at most once per `refresh_interval` and served to all callers
+    from memory. If a refresh fails, the last known rate keeps being served
+    and is reported as stale.
+    """
+
+    def __init__(self, fetch_func, refresh_interval=600.0):
+        """
+        Constructor for FXRateProvider
+
+        Args:
+            fetch_func: Function taking base and quote currency and
+            returning the rate (e.g. `CurrencyRates().get_rate`).
+            refresh_interval: Seconds after which a rate is re-fetched.
+
+        Returns:
+            None
+        """
+        self._fetch_func = fetch_func
+        self.refresh_interval = refresh_interval
+        # (base, quote) -> {"rate", "fetched_at", "expires", "error"}
+        self._rates = {}
+        self._lock = threading.Lock()
+        # (base, quote) -> lock held by the thread refreshing that pair
+        self._refresh_locks = {}
+
+    def get_rate(self, base, quote):
+        """
+        This function provides rate of the given currency pair.
+
+        Args:
+            base: Base currency code (e.g. "USD").
+            quote: Quote currency code (e.g. "INR").
+
+        Returns:
+            Units of `quote` per unit of `base`.
+        """
+        if base == quote:
+            return 1.0
+        pair = (base, quote)
+        entry = self._rates.get(pair)
+        if entry is not None and entry["expires"] > time.monotonic():
+            return entry["rate"]
+        with self._lock:
+            refresh_lock = self._refresh_locks.setdefault(
+                pair, threading.Lock()
+            )
+        with refresh_lock:
+            # Another thread may have refreshed this pair while we waited.
+            entry = self._rates.get(pair)
+            if entry is not None and entry["expires"] > time.monotonic():
+                return entry["rate"]
+            return self._refresh(pair, entry)
+
+    def _refresh(self, pair, entry):
+        """
+        This function fetches rate of the given pair from upstream.
+
+        Args:
+            pair: Tuple of base and quote currency.
+            entry: Previously stored entry of the pair or None.
+
+        Returns:
+            Fresh rate, or the last known rate if fetch fails.
+        """
+        try:
+            rate = float(self._fetch_func(*pair))
+        except Exception as e:
+            if entry is None:
+                raise
+            # Keep serving the old rate but retry after a short back-off.
+            entry["error"] = str(e)
+            entry["expires"] = time.monotonic() + min(
+                60.0, self.refresh_interval
+            )
+            return entry["rate"]
+        self._rates[pair] = {
+            "rate": rate,
+            "fetched_at": time.time(),
+            "expires": time.monotonic() + self.refresh_interval,
+            "error": None,
+        }
+        return rate
+
+    def to_usd(self, stock_ticker, price):
+        """
+        This function converts price of the given stock to USD.
+
+        Args:
+            stock_ticker: Stock Ticker
+            price: Price in ticker's quote currency.
+
+        Returns:
+            Price in USD.
+        """
+        currency, minor_units = ticker_currency(stock_ticker)
+        if currency == "USD":
+            return price
+        return price / minor_units / self.get_rate("USD", currency)
+
+    def usd_rate(self, stock_ticker):
+        """
+        This function provides rate used to convert price of the given stock
+        to USD.
+
+        Args:
+            stock_ticker: Stock Ticker
+
+        Returns:
+            Units of ticker's quote currency (minor units for pence/cents
+            quotes) per USD.
+        """
+        currency, minor_units = ticker_currency(stock_ticker)
+        if currency == "USD":
+            return 1.0
+        return self.get_rate("USD", currency) * minor_units
+
+    def info(self):
+        """
+        This function provides known rates along with staleness metadata.
+
+        Args:
+            None
+
+        Returns:
+            Dictionary keyed by "BASE/QUOTE" with rate, fetch time, age in
+            seconds, stale flag and last refresh error.
+        """
+        now = time.time()
+        info = {}
+        for (base, quote), entry in list(self._rates.items()):
+            age = now - entry["fetched_at"]
+            info[f"{base}/{quote}"] = {
+                "rate": entry["rate"],
+                "fetched_at": datetime.fromtimestamp(
+                    entry["fetched_at"], timezone.utc
+                ).isoformat(),
+                "age": age,
+                "stale": age > self.refresh_interval,
+                "error": entry["error"],
+            }
+        return info
@@ -1,8 +1,19 @@
-import os
-import json
+import config
+import threading
+import time
+import numpy as np
 
-from pathlib import Path
-from flask import jsonify
+from analytics import performance
+from auth import SessionStore, hash_password, verify_password
+from collections import defaultdict
+from concurrent import futures
+from flask import Response, jsonify
+from metrics import HANDLER_SECONDS, SERIALIZATION_SECONDS, STORAGE_SECONDS
+from metrics import instrument
+from portfolio import Portfolio, encode_user
+from snapshots import SnapshotStore
+from storage import create_storage
+from versions import PortfolioVersions
 
 
 class DatabaseHandler:
@@ -11,37 +22,149 @@ class DatabaseHandler:
     database.
     """
 
+    # Backend holding all users' data.
+    storage = instrument(
+        create_storage(config.STORAGE, config.STORAGE_PATH),
+        STORAGE_SECONDS,
+        (
+            "load_user",
+            "create_user",
+            "save_user",
+            "transactions",
+            "all_tickers",
+        ),
+        backend=config.STORAGE,
+    )
+    # username -> lock serializing read-modify-write of that user's data.
+    _user_locks = defaultdict(threading.Lock)
+    _user_locks_guard = threading.Lock()
+    # Session tokens and data of logged in users, so that `/portfolio` and
+    # trades don't read storage.
+    sessions = SessionStore(
+        config.SECRET_KEY,
+        max_age=config.SESSION_MAX_AGE,
+        max_users=config.SESSION_CACHE_USERS,
+    )
+    # Time series of users' balance and holdings valuation, used by
+    # `/analytics`.
+    snapshots = SnapshotStore(config.SNAPSHOT_PATH)
+    # Versions of portfolios sent to clients, used for delta responses.
+    versions = PortfolioVersions(max_users=config.VERSIONED_USERS)
+    # Shared bounded pool used to fetch prices of portfolio holdings.
+    _price_executor = futures.ThreadPoolExecutor(
+        max_workers=config.PRICE_WORKERS, thread_name_prefix="price"
+    )
+    # (price function, ticker) -> queued or running fetch in the pool, so a
+    # ticker isn't submitted again while its fetch is still running.
+    _price_fetches = {}
+    _price_fetches_lock = threading.Lock()
+
     @staticmethod
-    def verify_user(username, password, price_func):
+    @HANDLER_SECONDS.time(method="verify_user")
+    def verify_user(username, password, price_func, since=None):
         """
         This function verifies credentials of the user. If they are correct
-        their updated portfolio is returned is JSON format.
+        a new session is started and their updated portfolio is returned is
+        JSON format together with the session's "token". Passwords stored in
+        plaintext (or hashed with other cost) are re-hashed.
 
         Args:
             username: Username of the user.
             password: Supplied password.
             price_func: Function to be used for updating prices of portfolio.
+            since: Portfolio version held by the client (see
+            `portfolio_response`).
 
         Returns:
             User's portfolio in JSON format if credentials are correct
             otherwise JSON object with an "error" field.
         """
-        if not os.path.isfile(Path(f"userdata/{username}.json")):
-            return jsonify({"error": "No such user exist."})
-        else:
-            with open(Path(f"userdata/{username}.json")) as file:
-                data = json.load(file)
-            if data["password"] != password:
+        with DatabaseHandler.user_lock(username):
+            data = DatabaseHandler.storage.load_user(username)
+            if data is None:
+                return jsonify({"error": "No such user exist."})
+            correct, rehash = verify_password(
+                password, data["password"], config.PASSWORD_ITERATIONS
+            )
+            if not correct:
                 return jsonify({"error": "Incorrect password."})
-            else:
-                data = DatabaseHandler.update_prices(data, price_func)
-                return jsonify(data)
+            if rehash:
+                data["password"] = hash_password(
+                    password, config.PASSWORD_ITERATIONS
+                )
+                DatabaseHandler.storage.save_user(data, changed=set())
+            DatabaseHandler.sessions.cache_user(data)
+        data = DatabaseHandler.update_prices(data, price_func)
+        return DatabaseHandler.portfolio_response(
+            data, since, token=DatabaseHandler.sessions.issue(username)
+        )
+
+    @staticmethod
+    @HANDLER_SECONDS.time(method="portfolio")
+    def portfolio(username, price_func, since=None, if_none_match=None):
+        """
+        This function provides updated portfolio of an authenticated user.
+
+        Args:
+            username: Username of the session.
+            price_func: Function to be used for updating prices of portfolio.
+            since: Portfolio version held by the client (see
+            `portfolio_response`).
+            if_none_match: ETags of `If-None-Match` header.
+
+        Returns:
+            User's portfolio in JSON format otherwise JSON object with an
+            "error" field.
+        """
+        data = DatabaseHandler.cached_user(username)
+        if data is None:
+            return jsonify({"error": "No such user exist."})
+        data = DatabaseHandler.update_prices(data, price_func)
+        return DatabaseHandler.portfolio_response(data, since, if_none_match)
+
+    @staticmethod
+    def cached_user(username):
+        """
+        This function provides user's data from session cache, reading it
+        from storage only if it isn't cached.
+
+        Args:
+            username: Username.
+
+        Returns:
+            Copy of user's data or None if user doesn't exist.
+        """
+        data = DatabaseHandler.sessions.cached_user(username)
+        if data is not None:
+            return data
+        with DatabaseHandler.user_lock(username):
+            return DatabaseHandler._load_user(username)
+
+    @staticmethod
+    def _load_user(username):
+        """
+        This function provides user's data from session cache or storage,
+        caching it. Caller must hold the user's lock.
+
+        Args:
+            username: Username.
+
+        Returns:
+            Copy of user's data or None if user doesn't exist.
+        """
+        data = DatabaseHandler.sessions.cached_user(username)
+        if data is None:
+            data = DatabaseHandler.storage.load_user(username)
+            if data is not None:
+                DatabaseHandler.sessions.cache_user(data)
+        return data
 
     @staticmethod
+    @HANDLER_SECONDS.time(method="create_user")
     def create_user(name, username, email, password):
         """
         This function creates the new user with given information and stores
-        it in the JSON format.
+        it in the database.
 
         Args:
             name: User's name.
@@ -53,25 +176,32 @@ class DatabaseHandler:
             JSON with "ack" field if sign-up is successful other wise JSON
             with "error" field.
         """
-        if os.path.isfile(Path(f"userdata/{username}.json")):
+        data = {
+            "name": name,
+            "username": username,
+            "email": email,
+            "password": hash_password(password, config.PASSWORD_ITERATIONS),
+            "balance": 10000.0,
+            "portfolio_value": 0.0,
+            "portfolio": Portfolio(),
+        }
+        with DatabaseHandler.user_lock(username):
+            created = DatabaseHandler.storage.create_user(data)
+        if not created:
             return jsonify({"error": "Username already exists."})
-        else:
-            data = {
-                "name": name,
-                "username": username,
-                "email": email,
-                "password": password,
-                "balance": 10000.0,
-                "portfolio_value": 0.0,
-                "portfolio": [],
-            }
-            with open(Path(f"userdata/{username}.json"), "w") as file:
-                json.dump(data, file)
-            return jsonify({"ack": "User has been added successfully."})
+        return jsonify({"ack": "User has been added successfully."})
 
     @staticmethod
+    @HANDLER_SECONDS.time(method="update_portfolio")
     def update_portfolio(
-        username, action_type, stock_ticker, quantity, stock_price, price_func
+        username,
+        action_type,
+        stock_ticker,
+        quantity,
+        stock_price,
+        price_func,
+        fx_rate=1.0,
+        since=None,
     ):
         """
         This function updates the portfolio according to supplied action.
@@ -84,71 +214,347 @@ class DatabaseHandler:
             stock_price: Stock's current price.
             price_func: Price function to be used for updating portfolio
             with current prices.
+            fx_rate: Rate used to convert stock's price to USD, recorded
+            with the trade.
+            since: Portfolio version held by the client (see
+            `portfolio_response`).
 
         Returns:
             Updated portfolio in JSON format if update is successfull
             otherwise JSON with an "error" field.
         """
-        with open(Path(f"userdata/{username}.json")) as file:
-            data = json.load(file)
+        data, error = DatabaseHandler.trade(
+            username, action_type, stock_ticker, quantity, stock_price, fx_rate
+        )
+        if error is not None:
+            return jsonify({"error": error})
+        # Revaluation fetches prices, so it is done without holding the lock.
+        data = DatabaseHandler.update_prices(data, price_func)
+        return DatabaseHandler.portfolio_response(data, since)
+
+    @staticmethod
+    def trade(
+        username, action_type, stock_ticker, quantity, stock_price, fx_rate
+    ):
+        """
+        This function applies a BUY or SELL to stored user's data and
+        records the trade, without revaluing the portfolio.
+
+        Args:
+            username: Username.
+            action_type: "BUY" or "SELL".
+            stock_ticker: Stock name.
+            quantity: Stock quantity.
+            stock_price: Stock's current price.
+            fx_rate: Rate used to convert stock's price to USD.
+
+        Returns:
+            Tuple of updated user's data and None if trade was applied,
+            otherwise tuple of None and error message.
+        """
+        with DatabaseHandler.user_lock(username):
+            data = DatabaseHandler._load_user(username)
+            if data is None:
+                return None, "No such user exist."
+            error = DatabaseHandler.apply_trade(
+                data, action_type, stock_ticker, quantity, stock_price
+            )
+            if error is not None:
+                return None, error
+            DatabaseHandler.storage.save_user(
+                data,
+                changed={stock_ticker},
+                trade={
+                    "action": action_type,
+                    "ticker": stock_ticker,
+                    "quantity": quantity,
+                    "price": stock_price,
+                    "fx_rate": fx_rate,
+                    "timestamp": time.time(),
+                },
+            )
+            DatabaseHandler.sessions.cache_user(data)
+        return data, None
+
+    @staticmethod
+    def portfolio_response(data, since=None, if_none_match=None, token=None):
+        """
+        This function builds response with user's data, versioned by a weak
+        ETag. If the client already holds current version (`If-None-Match`)
+        `304 Not Modified` is returned. If it holds an older version
+        (`since`) only balance, portfolio value, stale prices and holdings
+        which changed since are returned, with "delta" set to true and
+        "removed" listing tickers sold entirely. Otherwise whole user's data
+        (except password) is returned.
+
+        Args:
+            data: User's data.
+            since: Portfolio version held by the client or None.
+            if_none_match: ETags of `If-None-Match` header or None.
+            token: Session token to be included as "token" field or None.
+
+        Returns:
+            Response with user's data in JSON format.
+        """
+        version, changes = DatabaseHandler.versions.observe(data, since)
+        if if_none_match is not None and if_none_match.contains_weak(
+            str(version)
+        ):
+            response = Response(status=304)
+        else:
+            kind = "full" if changes is None else "delta"
+            with SERIALIZATION_SECONDS.time(kind=kind):
+                if changes is not None:
+                    changed, removed = changes
+                    document = {
+                        "delta": True,
+                        "since": since,
+                        "balance": data["balance"],
+                        "portfolio_value": data["portfolio_value"],
+                        "stale_prices": data.get("stale_prices", []),
+                        "portfolio": [
+                            data["portfolio"].get(stock_ticker).to_dict()
+                            for stock_ticker in changed
+                        ],
+                        "removed": removed,
+                    }
+                else:
+                    document = encode_user(data)
+                    del document["password"]
+                document["version"] = version
+                if token is not None:
+                    document["token"] = token
+                response = jsonify(document)
+        response.set_etag(str(version), weak=True)
+        return response
+
+    @staticmethod
+    def apply_trade(data, action_type, stock_ticker, quantity, stock_price):
+        """
+        This function applies a BUY or SELL to user's data in place.
+
+        Args:
+            data: User's data.
+            action_type: "BUY" or "SELL".
+            stock_ticker: Stock name.
+            quantity: Stock quantity.
+            stock_price: Stock's current price.
+
+        Returns:
+            None if trade was applied otherwise error message.
+        """
+        portfolio = data["portfolio"]
         if action_type == "BUY":
             if data["balance"] < quantity * stock_price:
-                return jsonify({"error": "You don't have enough balance."})
+                return "You don't have enough balance."
             data["balance"] -= quantity * stock_price
-            index = [
-                i
-                for i in range(len(data["portfolio"]))
-                if data["portfolio"][i]["name"] == stock_ticker
-            ]
-            if len(index) == 0:
-                data["portfolio"].append(
-                    {
-                        "name": stock_ticker,
-                        "quantity": quantity,
-                        "investment": quantity * stock_price,
-                        "cur_price": stock_price,
-                    }
-                )
-            else:
-                index = index[0]
-                data["portfolio"][index]["quantity"] += quantity
-                data["portfolio"][index]["investment"] += (
-                    quantity * stock_price
-                )
-                data["portfolio"][index]["cur_price"] = stock_price
+            portfolio.buy(stock_ticker, quantity, stock_price)
         else:
+            holding = portfolio.get(stock_ticker)
+            if holding is None or quantity > holding.quantity:
+                return "You don't have enough stocks."
             data["balance"] += quantity * stock_price
-            index = [
-                i
-                for i in range(len(data["portfolio"]))
-                if data["portfolio"][i]["name"] == stock_ticker
-            ][0]
-            if quantity > data["portfolio"][index]["quantity"]:
-                return jsonify({"error": "You don't have enough stocks."})
-            data["portfolio"][index]["quantity"] -= quantity
-            data["portfolio"][index]["investment"] -= quantity * stock_price
-            data["portfolio"][index]["cur_price"] = stock_price
-            if data["portfolio"][index]["quantity"] == 0:
-                data["portfolio"].pop(index)
-        data = DatabaseHandler.update_prices(data, price_func)
-        with open(Path(f"userdata/{username}.json"), "w") as file:
-            json.dump(data, file)
-        return jsonify(data)
+            portfolio.sell(stock_ticker, quantity, stock_price)
+        data["portfolio_value"] = portfolio.value
+        return None
+
+    @staticmethod
+    def user_lock(username):
+        """
+        This function provides lock guarding the given user's data.
+
+        Args:
+            username: Username.
+
+        Returns:
+            threading.Lock
+        """
+        with DatabaseHandler._user_locks_guard:
+            return DatabaseHandler._user_locks[username]
 
     @staticmethod
-    def update_prices(data, price_func):
+    @HANDLER_SECONDS.time(method="transactions")
+    def transactions(username, page, per_page):
+        """
+        This function provides one page of user's trade history, newest
+        trade first.
+
+        Args:
+            username: Username.
+            page: Page number starting from 1.
+            per_page: Number of trades per page.
+
+        Returns:
+            JSON with "transactions", "page", "per_page" and "total" fields
+            otherwise JSON with an "error" field.
+        """
+        if not DatabaseHandler.storage.user_exists(username):
+            return jsonify({"error": "No such user exist."})
+        try:
+            with DatabaseHandler.user_lock(username):
+                trades, total = DatabaseHandler.storage.transactions(
+                    username, (page - 1) * per_page, per_page
+                )
+        except NotImplementedError as e:
+            return jsonify({"error": str(e)})
+        return jsonify(
+            {
+                "transactions": trades,
+                "page": page,
+                "per_page": per_page,
+                "total": total,
+            }
+        )
+
+    @staticmethod
+    def snapshot(username, prices_func):
+        """
+        This function appends current balance and holdings valuation of the
+        user to their snapshots.
+
+        Args:
+            username: Username.
+            prices_func: Function taking list of tickers and returning
+            dictionary of their known prices (in $), without fetching them.
+
+        Returns:
+            None
+        """
+        data = DatabaseHandler.sessions.cached_user(username)
+        if data is None:
+            data = DatabaseHandler.storage.load_user(username)
+        if data is not None:
+            DatabaseHandler.snapshots.take(
+                data, prices_func(data["portfolio"].tickers())
+            )
+
+    @staticmethod
+    @HANDLER_SECONDS.time(method="analytics")
+    def analytics(username, prices_func, start=None, end=None):
+        """
+        This function computes performance of user's portfolio over
+        snapshots taken between `start` and `end`. Unless `end` is given,
+        current valuation is included as the latest point.
+
+        Args:
+            username: Username.
+            prices_func: Function taking list of tickers and returning
+            dictionary of their known prices (in $), without fetching them.
+            start: First UNIX timestamp or None.
+            end: Last UNIX timestamp or None.
+
+        Returns:
+            JSON with performance metrics (see `analytics.performance`)
+            otherwise JSON with an "error" field.
+        """
+        data = DatabaseHandler.cached_user(username)
+        if data is None:
+            return jsonify({"error": "No such user exist."})
+        totals, holdings, tickers = DatabaseHandler.snapshots.series(
+            username, start, end
+        )
+        if end is None:
+            live_totals, live_holdings, tickers = (
+                DatabaseHandler.snapshots.take(
+                    data,
+                    prices_func(data["portfolio"].tickers()),
+                    persist=False,
+                )
+            )
+            totals = np.concatenate([totals, live_totals])
+            holdings = np.concatenate([holdings, live_holdings])
+        return jsonify(
+            performance(
+                totals,
+                holdings,
+                tickers,
+                risk_free_rate=config.RISK_FREE_RATE,
+                max_points=config.ANALYTICS_MAX_POINTS,
+            )
+        )
+
+    @staticmethod
+    def close():
+        """
+        This function stops background work and flushes storage. It is
+        called once when server shuts down.
+
+        Args:
+            None
+
+        Returns:
+            None
+        """
+        DatabaseHandler._price_executor.shutdown(wait=False)
+        DatabaseHandler.storage.close()
+
+    @staticmethod
+    def _submit_price(price_func, stock_ticker):
+        """
+        This function submits fetch of a price to the shared pool, unless a
+        fetch of the same price is already queued or running.
+
+        Args:
+            price_func: Price function.
+            stock_ticker: Stock Ticker
+
+        Returns:
+            Future of the price.
+        """
+        key = (price_func, stock_ticker)
+        with DatabaseHandler._price_fetches_lock:
+            future = DatabaseHandler._price_fetches.get(key)
+            if future is not None:
+                return future
+            future = DatabaseHandler._price_executor.submit(
+                price_func, stock_ticker
+            )
+            DatabaseHandler._price_fetches[key] = future
+
+        def forget(future):
+            with DatabaseHandler._price_fetches_lock:
+                if DatabaseHandler._price_fetches.get(key) is future:
+                    del DatabaseHandler._price_fetches[key]
+
+        # Added outside the lock, as it runs right away if already done.
+        future.add_done_callback(forget)
+        return future
+
+    @staticmethod
+    @HANDLER_SECONDS.time(method="update_prices")
+    def update_prices(data, price_func, deadline=None):
         """
         This function updates current prices of all stocks in portfolio.
+        Prices are fetched concurrently (once per distinct ticker). Stocks
+        whose price could not be fetched within `deadline` seconds keep
+        their last stored price and are listed in "stale_prices". Their
+        fetches which haven't started yet are cancelled, so a slow upstream
+        doesn't leave the shared pool busy with stale work.
 
         Args:
-            data: User's data in JSON format.
+            data: User's data.
             price_func: Price function to be used for updating stock prices.
+            deadline: Seconds to wait for prices. Defaults to
+            `config.PRICE_DEADLINE`.
 
         Returns:
-            Updated data in JSON format.
+            Updated data.
         """
-        data["portfolio_value"] = 0
-        for stock in data["portfolio"]:
-            stock["cur_price"] = price_func(stock["name"])
-            data["portfolio_value"] += stock["quantity"] * stock["cur_price"]
+        if deadline is None:
+            deadline = config.PRICE_DEADLINE
+        portfolio = data["portfolio"]
+        pending = {
+            DatabaseHandler._submit_price(price_func, ticker): ticker
+            for ticker in portfolio.tickers()
+        }
+        done, not_done = futures.wait(pending, timeout=deadline)
+        for future in not_done:
+            future.cancel()
+        data["stale_prices"] = [pending[future] for future in not_done]
+        for future in done:
+            if not future.cancelled() and future.exception() is None:
+                portfolio.set_price(pending[future], future.result())
+            else:
+                data["stale_prices"].append(pending[future])
+        data["portfolio_value"] = portfolio.revalue()
         return data
@@ -0,0 +1,281 @@
+import os
+import json
+import threading
+import time
+
+from pathlib import Path
+from portfolio import Holding, decode_user, encode_user
+from storage import StorageBackend, write_json_atomic
+
+
+class LedgerStorage(StorageBackend):
+    """
+    This class stores every user as an append-only trade log plus a periodic
+    snapshot. A trade appends a single record (O(1) write) to
+    `{directory}/{username}.log`; every `snapshot_interval` trades the
+    current state is written to `{directory}/{username}.snapshot.json`
+    together with the log offset it covers. On startup each user is rebuilt
+    from its snapshot and the tail of the log after that offset, and all
+    reads are then served from memory.
+    """
+
+    def __init__(self, directory="userdata/ledger", snapshot_interval=100):
+        """
+        Constructor for LedgerStorage
+
+        Args:
+            directory: Directory holding logs and snapshots.
+            snapshot_interval: Number of trades after which a new snapshot
+            is written.
+
+        Returns:
+            None
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.snapshot_interval = snapshot_interval
+        self._lock = threading.Lock()
+        # username -> current user data
+        self._users = {}
+        # username -> {"seq", "log_offset", "tail"} of the user's log
+        self._state = {}
+        # username -> byte offsets of log records, built on first use
+        self._offsets = {}
+        for path in self.directory.glob("*.snapshot.json"):
+            self._replay(path.name[: -len(".snapshot.json")])
+
+    def _log_path(self, username):
+        """
+        This function provides path of the given user's trade log.
+
+        Args:
+            username: Username.
+
+        Returns:
+            Path of the log.
+        """
+        return self.directory / f"{username}.log"
+
+    def _snapshot_path(self, username):
+        """
+        This function provides path of the given user's snapshot.
+
+        Args:
+            username: Username.
+
+        Returns:
+            Path of the snapshot.
+        """
+        return self.directory / f"{username}.snapshot.json"
+
+    def _replay(self, username):
+        """
+        This function rebuilds the given user from snapshot and the log
+        records written after it. A partially written last record (crash
+        during append) is discarded.
+
+        Args:
+            username: Username.
+
+        Returns:
+            None
+        """
+        with open(self._snapshot_path(username)) as file:
+            snapshot = json.load(file)
+        data = decode_user(snapshot["data"])
+        seq = snapshot["seq"]
+        offset = snapshot["log_offset"]
+        tail = 0
+        log_path = self._log_path(username)
+        if os.path.isfile(log_path):
+            with open(log_path, "rb+") as file:
+                file.seek(offset)
+                for line in file:
+                    if not line.endswith(b"\n"):
+                        break
+                    record = json.loads(line)
+                    self._apply(data, record)
+                    seq = record["seq"]
+                    offset += len(line)
+                    tail += 1
+                file.truncate(offset)
+        self._users[username] = data
+        self._state[username] = {
+            "seq": seq,
+            "log_offset": offset,
+            "tail": tail,
+        }
+
+    @staticmethod
+    def _apply(data, record):
+        """
+        This function applies a log record to user's data in place.
+
+        Args:
+            data: User's data.
+            record: Trade record read from log.
+
+        Returns:
+            None
+        """
+        data["balance"] = record["balance"]
+        data["portfolio_value"] = record["portfolio_value"]
+        if record["holding"] is None:
+            data["portfolio"].remove(record["ticker"])
+        else:
+            data["portfolio"].put(Holding.from_dict(record["holding"]))
+
+    def _snapshot(self, username):
+        """
+        This function writes snapshot of the given user's current state.
+
+        Args:
+            username: Username.
+
+        Returns:
+            None
+        """
+        state = self._state[username]
+        write_json_atomic(
+            self._snapshot_path(username),
+            {
+                "seq": state["seq"],
+                "log_offset": state["log_offset"],
+                "data": encode_user(self._users[username]),
+            },
+        )
+        state["tail"] = 0
+
+    def user_exists(self, username):
+        return username in self._users
+
+    @staticmethod
+    def _copy(data):
+        """
+        This function copies user's data so that stored and returned data
+        can be modified independently.
+
+        Args:
+            data: User's data.
+
+        Returns:
+            Copy of user's data.
+        """
+        data = dict(data)
+        data["portfolio"] = data["portfolio"].copy()
+        return data
+
+    def load_user(self, username):
+        data = self._users.get(username)
+        return None if data is None else self._copy(data)
+
+    def create_user(self, data):
+        with self._lock:
+            if data["username"] in self._users:
+                return False
+            self._users[data["username"]] = self._copy(data)
+            self._state[data["username"]] = {
+                "seq": 0,
+                "log_offset": 0,
+                "tail": 0,
+            }
+        self._snapshot(data["username"])
+        return True
+
+    def save_user(self, data, changed=None, trade=None):
+        username = data["username"]
+        if trade is None:
+            # Not a trade (e.g. profile change), so state is snapshotted.
+            self._users[username] = self._copy(data)
+            self._snapshot(username)
+            return
+        state = self._state[username]
+        holding = data["portfolio"].get(trade["ticker"])
+        record = {
+            "seq": state["seq"] + 1,
+            "action": trade["action"],
+            "ticker": trade["ticker"],
+            "quantity": trade["quantity"],
+            "price": trade["price"],
+            "fx_rate": trade.get("fx_rate", 1.0),
+            "timestamp": trade.get("timestamp", time.time()),
+            "balance": data["balance"],
+            "portfolio_value": data["portfolio_value"],
+            "holding": None if holding is None else holding.to_dict(),
+        }
+        line = (json.dumps(record) + "\n").encode()
+        with open(self._log_path(username), "ab") as file:
+            file.write(line)
+            file.flush()
+            os.fsync(file.fileno())
+        if username in self._offsets:
+            self._offsets[username].append(state["log_offset"])
+        state["seq"] = record["seq"]
+        state["log_offset"] += len(line)
+        state["tail"] += 1
+        self._apply(self._users[username], record)
+        if state["tail"] >= self.snapshot_interval:
+            self._snapshot(username)
+
+    def transactions(self, username, offset=0, limit=50):
+        if username not in self._users:
+            return [], 0
+        if username not in self._offsets:
+            offsets = []
+            position = 0
+            if os.path.isfile(self._log_path(username)):
+                with open(self._log_path(username), "rb") as file:
+                    for line in file:
+                        offsets.append(position)
+                        position += len(line)
+            self._offsets[username] = offsets
+        offsets = self._offsets[username]
+        total = len(offsets)
+        # Newest record is the last one in the log.
+        newest = total - 1 - offset
+        oldest = max(0, newest - limit + 1)
+        if newest < 0:
+            return [], total
+        trades = []
+        with open(self._log_path(username), "rb") as file:
+            for i in range(newest, oldest - 1, -1):
+                file.seek(offsets[i])
+                record = json.loads(file.readline())
+                trades.append(
+                    {
+                        key: record[key]
+                        for key in (
+                            "action",
+                            "ticker",
+                            "quantity",
+                            "price",
+                            "fx_rate",
+                            "timestamp",
+                        )
+                    }
+                )
+        return trades, total
+
+    def usernames(self):
+        return sorted(self._users)
+
+    def holders(self, stock_ticker):
+        holders = {}
+        for username, data in list(self._users.items()):
+            holding = data["portfolio"].get(stock_ticker)
+            if holding is not None and holding.quantity > 0:
+                holders[username] = holding.quantity
+        return holders
+
+    def all_tickers(self):
+        return {
+            stock_ticker
+            for data in list(self._users.values())
+            for stock_ticker in data["portfolio"].tickers()
+        }
+
+    def close(self):
+        # Compact so the next startup doesn't have to replay any tail.
+        for username, state in list(self._state.items()):
+            if state["tail"] > 0:
+                self._snapshot(username)
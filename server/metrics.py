@@ -0,0 +1,595 @@
+import bisect
+import functools
+import sys
+import threading
+import time
+
+from collections import Counter as Tally
+
+# Upper bounds (in seconds) of latency histogram buckets.
+LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+def _format_labels(labels):
+    """
+    This function formats labels of a sample in Prometheus text format.
+
+    Args:
+        labels: Tuple of (name, value) pairs.
+
+    Returns:
+        Labels as string, e.g. '{route="/login"}', or "" if there are none.
+    """
+    if not labels:
+        return ""
+    return (
+        "{"
+        + ",".join(f'{name}="{_escape(value)}"' for name, value in labels)
+        + "}"
+    )
+
+
+def _escape(value):
+    """
+    This function escapes label value for Prometheus text format.
+
+    Args:
+        value: Label value.
+
+    Returns:
+        Escaped string.
+    """
+    return (
+        str(value)
+        .replace("\\", r"\\")
+        .replace('"', r"\"")
+        .replace("\n", r"\n")
+    )
+
+
+def _format_value(value):
+    """
+    This function formats value of a sample in Prometheus text format.
+
+    Args:
+        value: Number.
+
+    Returns:
+        Value as string.
+    """
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Timer:
+    """
+    This class measures duration of a block (as context manager) or of
+    every call of a function (as decorator) into a Histogram.
+    """
+
+    def __init__(self, histogram, labels):
+        """
+        Constructor for _Timer
+
+        Args:
+            histogram: Histogram receiving the durations.
+            labels: Labels of the measured samples.
+
+        Returns:
+            None
+        """
+        self._histogram = histogram
+        self._labels = labels
+        self._start = None
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._histogram.observe(
+            time.perf_counter() - self._start, **self._labels
+        )
+
+    def __call__(self, func):
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            with _Timer(self._histogram, self._labels):
+                return func(*args, **kwargs)
+
+        return timed
+
+
+class Counter:
+    """This class provides thread-safe monotonically increasing counts."""
+
+    def __init__(self, name, documentation, labels=()):
+        """
+        Constructor for Counter
+
+        Args:
+            name: Metric name.
+            documentation: Help text of the metric.
+            labels: Names of labels of the metric.
+
+        Returns:
+            None
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        # label values -> count
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        """
+        This function increases count of the given labels.
+
+        Args:
+            amount: Increment.
+            **labels: Value of every label of the metric.
+
+        Returns:
+            None
+        """
+        key = tuple(labels[name] for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        """
+        This function formats the metric in Prometheus text format.
+
+        Args:
+            None
+
+        Returns:
+            List of lines.
+        """
+        with self._lock:
+            values = sorted(self._values.items())
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} counter",
+        ]
+        for key, value in values:
+            labels = _format_labels(tuple(zip(self.labels, key)))
+            lines.append(f"{self.name}{labels} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    """
+    This class provides thread-safe distribution of observed values in
+    cumulative buckets, with their count and sum.
+    """
+
+    def __init__(
+        self, name, documentation, labels=(), buckets=LATENCY_BUCKETS
+    ):
+        """
+        Constructor for Histogram
+
+        Args:
+            name: Metric name.
+            documentation: Help text of the metric.
+            labels: Names of labels of the metric.
+            buckets: Sorted upper bounds of buckets.
+
+        Returns:
+            None
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # label values -> [count per bucket (not cumulative), sum, count]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        """
+        This function records a value.
+
+        Args:
+            value: Observed value (e.g. seconds).
+            **labels: Value of every label of the metric.
+
+        Returns:
+            None
+        """
+        key = tuple(labels[name] for name in self.labels)
+        # Index of the first bucket whose bound is at least the value.
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [
+                    [0] * (len(self.buckets) + 1),
+                    0.0,
+                    0,
+                ]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def time(self, **labels):
+        """
+        This function measures durations in seconds, e.g.
+        `with histogram.time(route="/login"):` or
+        `@histogram.time(method="verify_user")`.
+
+        Args:
+            **labels: Value of every label of the metric.
+
+        Returns:
+            Context manager which is also a function decorator.
+        """
+        return _Timer(self, labels)
+
+    def render(self):
+        """
+        This function formats the metric in Prometheus text format.
+
+        Args:
+            None
+
+        Returns:
+            List of lines.
+        """
+        with self._lock:
+            values = sorted(
+                (key, (list(entry[0]), entry[1], entry[2]))
+                for key, entry in self._values.items()
+            )
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} histogram",
+        ]
+        for key, (counts, total, count) in values:
+            labels = tuple(zip(self.labels, key))
+            cumulative = 0
+            for bound, bucket_count in zip(
+                self.buckets + (float("inf"),), counts
+            ):
+                cumulative += bucket_count
+                bucket_labels = _format_labels(
+                    labels + (("le", _format_value(float(bound))),)
+                )
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(
+                f"{self.name}_sum{_format_labels(labels)} "
+                f"{_format_value(total)}"
+            )
+            lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return lines
+
+
+class Gauge:
+    """
+    This class provides values read when metrics are collected (e.g.
+    counters kept by a cache).
+    """
+
+    def __init__(
+        self, name, documentation, collect, labels=(), metric_type="gauge"
+    ):
+        """
+        Constructor for Gauge
+
+        Args:
+            name: Metric name.
+            documentation: Help text of the metric.
+            collect: Function returning current value, or dictionary of
+            values keyed by tuple of label values if the metric has labels.
+            labels: Names of labels of the metric.
+            metric_type: "gauge" or "counter" if collected values only
+            increase.
+
+        Returns:
+            None
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.metric_type = metric_type
+        self._collect = collect
+
+    def render(self):
+        """
+        This function formats the metric in Prometheus text format.
+
+        Args:
+            None
+
+        Returns:
+            List of lines.
+        """
+        values = self._collect()
+        if not self.labels:
+            values = {(): values}
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.metric_type}",
+        ]
+        for key, value in sorted(values.items()):
+            labels = _format_labels(tuple(zip(self.labels, key)))
+            lines.append(f"{self.name}{labels} {_format_value(value)}")
+        return lines
+
+
+class Registry:
+    """This class collects metrics exposed together."""
+
+    def __init__(self):
+        """
+        Constructor for Registry
+
+        Args:
+            None
+
+        Returns:
+            None
+        """
+        self._metrics = []
+
+    def register(self, metric):
+        """
+        This function adds a metric to the registry.
+
+        Args:
+            metric: Counter, Histogram or Gauge.
+
+        Returns:
+            The metric.
+        """
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """
+        This function formats all metrics in Prometheus text format.
+
+        Args:
+            None
+
+        Returns:
+            Metrics as string.
+        """
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class SamplingProfiler:
+    """
+    This class provides statistical profiler of all threads of the process.
+    A background thread records stacks of the other threads every
+    `interval` seconds, which costs little enough to be enabled on a live
+    server. Stacks are reported in folded format ("a;b;c count") read by
+    flame graph tools.
+    """
+
+    def __init__(self, interval=0.01, max_depth=64):
+        """
+        Constructor for SamplingProfiler
+
+        Args:
+            interval: Seconds between samples.
+            max_depth: Maximum number of innermost frames kept per stack.
+
+        Returns:
+            None
+        """
+        self.interval = interval
+        self.max_depth = max_depth
+        self._stacks = Tally()
+        self._samples = 0
+        self._thread = None
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def running(self):
+        """Whether the profiler is sampling."""
+        return self._thread is not None
+
+    def start(self):
+        """
+        This function starts sampling, keeping stacks sampled before.
+
+        Args:
+            None
+
+        Returns:
+            None
+        """
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stopped.clear()
+            self._thread = threading.Thread(
+                target=self._run, name="profiler", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self):
+        """
+        This function stops sampling.
+
+        Args:
+            None
+
+        Returns:
+            None
+        """
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stopped.set()
+            thread.join()
+
+    def reset(self):
+        """
+        This function forgets sampled stacks.
+
+        Args:
+            None
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._stacks.clear()
+            self._samples = 0
+
+    def _run(self):
+        """
+        This function samples stacks until stopped.
+
+        Args:
+            None
+
+        Returns:
+            None
+        """
+        own = threading.get_ident()
+        while not self._stopped.wait(self.interval):
+            stacks = []
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < self.max_depth:
+                    code = frame.f_code
+                    stack.append(
+                        f"{code.co_name} ({code.co_filename}:"
+                        f"{code.co_firstlineno})"
+                    )
+                    frame = frame.f_back
+                stacks.append(";".join(reversed(stack)))
+            with self._lock:
+                self._stacks.update(stacks)
+                self._samples += 1
+
+    def folded(self):
+        """
+        This function provides sampled stacks in folded format, most
+        frequent first.
+
+        Args:
+            None
+
+        Returns:
+            Stacks as string.
+        """
+        with self._lock:
+            stacks = self._stacks.most_common()
+        return "".join(f"{stack} {count}\n" for stack, count in stacks)
+
+    def info(self):
+        """
+        This function provides state of the profiler.
+
+        Args:
+            None
+
+        Returns:
+            Dictionary with "running", "interval", "samples" and number of
+            distinct "stacks".
+        """
+        with self._lock:
+            return {
+                "running": self.running,
+                "interval": self.interval,
+                "samples": self._samples,
+                "stacks": len(self._stacks),
+            }
+
+
+# Metrics exposed by `/metrics`. Gauges reading caches are registered by
+# the server.
+registry = Registry()
+REQUEST_SECONDS = registry.register(
+    Histogram(
+        "pystock_request_duration_seconds",
+        "Time spent serving requests, until response is returned.",
+        ("route", "method", "status"),
+    )
+)
+HANDLER_SECONDS = registry.register(
+    Histogram(
+        "pystock_handler_duration_seconds",
+        "Time spent in DatabaseHandler methods.",
+        ("method",),
+    )
+)
+STORAGE_SECONDS = registry.register(
+    Histogram(
+        "pystock_storage_duration_seconds",
+        "Time spent reading and writing user storage.",
+        ("backend", "operation"),
+    )
+)
+SERIALIZATION_SECONDS = registry.register(
+    Histogram(
+        "pystock_serialization_duration_seconds",
+        "Time spent encoding JSON responses.",
+        ("kind",),
+    )
+)
+UPSTREAM_SECONDS = registry.register(
+    Histogram(
+        "pystock_upstream_duration_seconds",
+        "Time spent waiting for upstream data providers.",
+        ("source", "exchange"),
+    )
+)
+UPSTREAM_REQUESTS = registry.register(
+    Counter(
+        "pystock_upstream_requests_total",
+        "Calls made to upstream data providers.",
+        ("source", "exchange", "outcome"),
+    )
+)
+
+
+def instrument(obj, histogram, operations, **labels):
+    """
+    This function times calls of the given methods of an object, by
+    replacing them on the instance.
+
+    Args:
+        obj: Object whose methods are timed.
+        histogram: Histogram receiving durations, with "operation" label.
+        operations: Names of methods to time.
+        **labels: Values of other labels of the histogram.
+
+    Returns:
+        The object.
+    """
+    for operation in operations:
+        method = getattr(obj, operation)
+        setattr(
+            obj,
+            operation,
+            histogram.time(operation=operation, **labels)(method),
+        )
+    return obj
@@ -0,0 +1,77 @@
+import argparse
+
+from config import DEFAULT_STORAGE_PATHS
+from storage import create_storage
+
+
+def migrate(source, target, overwrite=False):
+    """
+    This function copies every user from one storage backend to another.
+
+    Args:
+        source: StorageBackend to read users from.
+        target: StorageBackend to write users to.
+        overwrite: If True, users already present in target are replaced,
+        otherwise they are skipped.
+
+    Returns:
+        Tuple of number of copied and skipped users.
+    """
+    copied = skipped = 0
+    for username in source.usernames():
+        data = source.load_user(username)
+        if not target.create_user(data):
+            if not overwrite:
+                skipped += 1
+                continue
+            target.save_user(data)
+        copied += 1
+    return copied, skipped
+
+
+def main():
+    """
+    This function is the entry point of this program.
+
+    Args:
+        None
+
+    Returns:
+        None
+    """
+    parser = argparse.ArgumentParser(
+        description="Copy PyStock users between storage backends."
+    )
+    parser.add_argument(
+        "--source", default="json", choices=["json", "sqlite", "ledger"]
+    )
+    parser.add_argument(
+        "--source-path", help="Defaults to the server's path of --source."
+    )
+    parser.add_argument(
+        "--target", default="sqlite", choices=["json", "sqlite", "ledger"]
+    )
+    parser.add_argument(
+        "--target-path", help="Defaults to the server's path of --target."
+    )
+    parser.add_argument(
+        "--overwrite",
+        action="store_true",
+        help="Replace users which already exist in target.",
+    )
+    args = parser.parse_args()
+    source = create_storage(
+        args.source, args.source_path or DEFAULT_STORAGE_PATHS[args.source]
+    )
+    target = create_storage(
+        args.target, args.target_path or DEFAULT_STORAGE_PATHS[args.target]
+    )
+    copied, skipped = migrate(source, target, args.overwrite)
+    source.close()
+    target.close()
+    print(f"Copied {copied} users, skipped {skipped} existing users.")
+
+
+if __name__ == "__main__":
+    # Run this only if this file is executed directly.
+    main()
@@ -0,0 +1,257 @@
+import threading
+import time
+import numpy as np
+import pandas as pd
+
+from cache import _Flight
+from collections import OrderedDict
+
+# Resolution -> pandas resample rule. Weeks and months are labelled by
+# their first day, like Yahoo's weekly and monthly bars.
+RESOLUTIONS = {"1d": None, "1wk": "W-MON", "1mo": "MS"}
+# How bars are combined when several of them become one.
+AGGREGATION = {
+    "Open": "first",
+    "High": "max",
+    "Low": "min",
+    "Close": "last",
+    "Adj Close": "last",
+    "Volume": "sum",
+}
+
+
+def resample(bars, resolution):
+    """
+    This function aggregates daily bars to the given resolution.
+
+    Args:
+        bars: DataFrame of daily bars indexed by date.
+        resolution: One of RESOLUTIONS.
+
+    Returns:
+        DataFrame of bars at the given resolution.
+    """
+    rule = RESOLUTIONS[resolution]
+    if rule is None or bars.empty:
+        return bars
+    aggregation = {c: f for c, f in AGGREGATION.items() if c in bars}
+    return (
+        bars.resample(rule, label="left", closed="left")
+        .agg(aggregation)
+        .dropna(subset=["Close"])
+    )
+
+
+def aggregate(bars, max_points):
+    """
+    This function merges runs of consecutive bars into OHLC bars so that at
+    most `max_points` bars are left. Every merged bar is labelled by the
+    date of its first bar.
+
+    Args:
+        bars: DataFrame of bars indexed by date.
+        max_points: Maximum number of bars to return.
+
+    Returns:
+        DataFrame of at most `max_points` bars.
+    """
+    size = -(-len(bars) // max_points)
+    if size <= 1:
+        return bars
+    aggregation = {c: f for c, f in AGGREGATION.items() if c in bars}
+    merged = bars.groupby(np.arange(len(bars)) // size).agg(aggregation)
+    merged.index = bars.index[::size]
+    return merged
+
+
+def lttb(values, max_points):
+    """
+    This function selects points of a series with the Largest Triangle
+    Three Buckets algorithm, which keeps the visual shape of the series.
+
+    Args:
+        values: 1-D array of values sampled at equal steps.
+        max_points: Number of points to select.
+
+    Returns:
+        Sorted array of indices of the selected points.
+    """
+    length = len(values)
+    if max_points >= length:
+        return np.arange(length)
+    if max_points < 3:
+        return np.array([0, length - 1][:max_points])
+    values = np.asarray(values, dtype="f8")
+    positions = np.arange(length, dtype="f8")
+    # Points between the first and the last one are split into
+    # `max_points - 2` buckets and one point is selected from each.
+    edges = np.linspace(1, length - 1, max_points - 1).astype(int)
+    selected = np.empty(max_points, dtype=int)
+    selected[0] = 0
+    selected[-1] = length - 1
+    for i in range(max_points - 2):
+        lo, hi = edges[i], edges[i + 1]
+        next_lo = hi
+        next_hi = edges[i + 2] if i + 2 < len(edges) else length
+        avg_x = positions[next_lo:next_hi].mean()
+        avg_y = values[next_lo:next_hi].mean()
+        a = selected[i]
+        # Twice the area of triangles formed with the previously selected
+        # point and the average of the next bucket.
+        areas = np.abs(
+            (positions[a] - avg_x) * (values[lo:hi] - values[a])
+            - (positions[a] - positions[lo:hi]) * (avg_y - values[a])
+        )
+        selected[i + 1] = lo + int(np.argmax(areas))
+    return selected
+
+
+def downsample(bars, max_points, method="ohlc"):
+    """
+    This function reduces bars to at most `max_points` bars.
+
+    Args:
+        bars: DataFrame of bars indexed by date.
+        max_points: Maximum number of bars to return.
+        method: "ohlc" to merge consecutive bars or "lttb" to keep the bars
+        which best preserve the shape of the close price.
+
+    Returns:
+        DataFrame of at most `max_points` bars.
+    """
+    if len(bars) <= max_points:
+        return bars
+    if method == "lttb":
+        return bars.iloc[lttb(bars["Close"].to_numpy(), max_points)]
+    return aggregate(bars, max_points)
+
+
+def to_columns(bars):
+    """
+    This function converts bars to column-oriented JSON format.
+
+    Args:
+        bars: DataFrame of bars indexed by date.
+
+    Returns:
+        Dictionary of "date" list ("YYYY-MM-DD") and one list per column.
+    """
+    columns = {"date": bars.index.strftime("%Y-%m-%d").tolist()}
+    for column in AGGREGATION:
+        if column in bars:
+            key = column.lower().replace(" ", "_")
+            columns[key] = bars[column].astype(float).tolist()
+    return columns
+
+
+class HistoryCache:
+    """
+    This class provides thread-safe in-process cache of daily bars keyed by
+    ticker and shared by all requests. Each ticker's bars cover the earliest
+    requested start up to today; once they are older than `ttl` seconds only
+    bars since the last cached date are re-fetched. Concurrent fetches of the
+    same ticker are coalesced and least recently used tickers are evicted
+    once cache holds `max_size` tickers.
+    """
+
+    def __init__(self, fetch_func, ttl=900.0, max_size=256):
+        """
+        Constructor for HistoryCache
+
+        Args:
+            fetch_func: Function taking ticker and start date which fetches
+            daily bars from that date up to today from upstream.
+            ttl: Seconds after which latest bars are re-fetched.
+            max_size: Maximum number of tickers stored in cache.
+
+        Returns:
+            None
+        """
+        self._fetch_func = fetch_func
+        self.ttl = ttl
+        self.max_size = max_size
+        # ticker -> (bars, first covered date, expiry time)
+        self._entries = OrderedDict()
+        # ticker -> _Flight of the fetch currently in progress
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def get(self, stock_ticker, start, end=None):
+        """
+        This function provides daily bars of the given stock from cache,
+        fetching the missing part from upstream.
+
+        Args:
+            stock_ticker: Stock Ticker
+            start: First date of the range.
+            end: Last date of the range. Defaults to today.
+
+        Returns:
+            DataFrame of daily bars indexed by date.
+        """
+        start = pd.Timestamp(start)
+        while True:
+            with self._lock:
+                entry = self._entries.get(stock_ticker)
+                if (
+                    entry is not None
+                    and entry[1] <= start
+                    and entry[2] > time.monotonic()
+                ):
+                    self._entries.move_to_end(stock_ticker)
+                    return entry[0].loc[start:end]
+                flight = self._inflight.get(stock_ticker)
+                is_leader = flight is None
+                if is_leader:
+                    flight = self._inflight[stock_ticker] = _Flight()
+            if is_leader:
+                return self._fetch(stock_ticker, entry, start, flight).loc[
+                    start:end
+                ]
+            # The finished fetch may not cover this range, so look again.
+            flight.wait()
+
+    def _fetch(self, stock_ticker, entry, start, flight):
+        """
+        This function fetches bars from upstream on behalf of all callers
+        waiting on `flight`.
+
+        Args:
+            stock_ticker: Stock Ticker
+            entry: Cached entry of the ticker or None.
+            start: First date the bars must cover.
+            flight: _Flight registered for this fetch.
+
+        Returns:
+            Cached bars of the ticker.
+        """
+        try:
+            if entry is None or start < entry[1]:
+                bars = self._fetch_func(stock_ticker, start)
+                first = start
+            else:
+                # Last cached bar is re-fetched too, as it may have been
+                # incomplete.
+                bars, first = entry[0], entry[1]
+                tail = self._fetch_func(stock_ticker, bars.index[-1])
+                if len(tail) > 0:
+                    bars = pd.concat([bars[bars.index < tail.index[0]], tail])
+            if bars.empty:
+                raise AssertionError("No data found for this ticker.")
+        except BaseException as e:
+            with self._lock:
+                self._inflight.pop(stock_ticker, None)
+            flight.fail(e)
+            raise
+        with self._lock:
+            self._entries[stock_ticker] = (
+                bars,
+                first,
+                time.monotonic() + self.ttl,
+            )
+            self._entries.move_to_end(stock_ticker)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            self._inflight.pop(stock_ticker, None)
+        flight.resolve(bars)
+        return bars
@@ -0,0 +1,644 @@
+import heapq
+import itertools
+import json
+import os
+import threading
+import time
+
+from collections import defaultdict, deque
+from pathlib import Path
+from storage import write_json_atomic
+
+ORDER_TYPES = ("limit", "stop", "stop_limit")
+TIME_IN_FORCE = ("GTC", "DAY")
+
+
+class Order:
+    """
+    This class represents a resting order: a BUY or SELL executed once price
+    of its stock crosses a level.
+
+        * "limit" is filled at its `limit_price` or better: when price falls
+          to it (BUY) or rises to it (SELL).
+        * "stop" is filled at market once price rises to `stop_price` (BUY)
+          or falls to it (SELL).
+        * "stop_limit" becomes a limit order at `limit_price` once price
+          reaches `stop_price` like a stop order.
+
+    Prices are in $.
+    """
+
+    __slots__ = (
+        "order_id",
+        "username",
+        "action_type",
+        "stock_ticker",
+        "quantity",
+        "order_type",
+        "limit_price",
+        "stop_price",
+        "time_in_force",
+        "created",
+        "expires",
+        "triggered",
+        "status",
+        "fill_price",
+        "closed",
+        "reason",
+    )
+
+    def __init__(
+        self,
+        order_id,
+        username,
+        action_type,
+        stock_ticker,
+        quantity,
+        order_type,
+        limit_price=None,
+        stop_price=None,
+        time_in_force="GTC",
+        created=None,
+        expires=None,
+    ):
+        """
+        Constructor for Order
+
+        Args:
+            order_id: Unique id of the order.
+            username: Username of the user who placed the order.
+            action_type: "BUY" or "SELL".
+            stock_ticker: Stock Ticker
+            quantity: Stock quantity.
+            order_type: "limit", "stop" or "stop_limit".
+            limit_price: Limit price of limit and stop-limit orders.
+            stop_price: Stop price of stop and stop-limit orders.
+            time_in_force: "GTC" (good till cancelled) or "DAY".
+            created: UNIX timestamp of placement. Defaults to now.
+            expires: UNIX timestamp after which the order is cancelled or
+            None if it never expires.
+
+        Returns:
+            None
+        """
+        self.order_id = order_id
+        self.username = username
+        self.action_type = action_type
+        self.stock_ticker = stock_ticker
+        self.quantity = quantity
+        self.order_type = order_type
+        self.limit_price = limit_price
+        self.stop_price = stop_price
+        self.time_in_force = time_in_force
+        self.created = time.time() if created is None else created
+        self.expires = expires
+        # Whether stop price of a stop-limit order has been reached.
+        self.triggered = False
+        # "open", "filled", "cancelled", "expired" or "rejected"
+        self.status = "open"
+        self.fill_price = None
+        self.closed = None
+        self.reason = None
+
+    @property
+    def level(self):
+        """Price at which the order (currently) triggers."""
+        if self.order_type == "limit" or self.triggered:
+            return self.limit_price
+        return self.stop_price
+
+    @property
+    def triggers_above(self):
+        """Whether the order triggers when price rises to its level."""
+        limit = self.order_type == "limit" or self.triggered
+        return (self.action_type == "SELL") == limit
+
+    @staticmethod
+    def from_dict(order):
+        """
+        This function creates Order from its JSON format.
+
+        Args:
+            order: Dictionary in format of `to_dict`.
+
+        Returns:
+            Order
+        """
+        result = Order(
+            order["order_id"],
+            order["username"],
+            order["action_type"],
+            order["stock_ticker"],
+            order["quantity"],
+            order["order_type"],
+            order["limit_price"],
+            order["stop_price"],
+            order["time_in_force"],
+            order["created"],
+            order["expires"],
+        )
+        for field in ("triggered", "status", "fill_price", "closed", "reason"):
+            setattr(result, field, order[field])
+        return result
+
+    def to_dict(self):
+        """
+        This function provides Order in JSON format.
+
+        Args:
+            None
+
+        Returns:
+            Dictionary with a field per attribute.
+        """
+        return {field: getattr(self, field) for field in self.__slots__}
+
+
+class OrderBook:
+    """
+    This class provides thread-safe book of resting orders of all users.
+    Open orders of every ticker are indexed by trigger price in two heaps:
+    orders triggering when price rises to their level (min-heap) and orders
+    triggering when price falls to it (max-heap), so a price update only
+    touches orders it triggers, in O(log n) each, however many orders rest.
+    Cancelled and expired orders are removed from the heaps lazily.
+
+    Every change appends a record with the changed order to a log next to
+    the JSON snapshot of open orders and the last `history` closed orders of
+    every user. Once the log holds more records than the snapshot holds
+    orders (and at least `snapshot_interval`), a new snapshot is written and
+    the log is emptied, so writes cost O(1) amortized.
+    """
+
+    def __init__(self, path=None, history=100, snapshot_interval=1000):
+        """
+        Constructor for OrderBook
+
+        Args:
+            path: Path of the JSON snapshot of orders (its log is the same
+            path with ".log" suffix), or None to keep orders only in memory.
+            history: Number of closed orders remembered per user.
+            snapshot_interval: Minimum number of logged changes after which
+            a new snapshot is written.
+
+        Returns:
+            None
+        """
+        self.path = None if path is None else Path(path)
+        self.history = history
+        self.snapshot_interval = snapshot_interval
+        # order id -> open Order
+        self._orders = {}
+        # ticker -> heap of (level, sequence, order id)
+        self._above = defaultdict(list)
+        # ticker -> heap of (-level, sequence, order id)
+        self._below = defaultdict(list)
+        # heap of (expiry, order id)
+        self._expiry = []
+        # username -> closed Orders, oldest first
+        self._closed = defaultdict(lambda: deque(maxlen=self.history))
+        # order id -> Order taken by `match`, awaiting `complete`
+        self._pending = {}
+        # Heap entries of orders which are no longer open.
+        self._stale = 0
+        self._sequence = itertools.count()
+        self._next_id = 1
+        # Sequence number of the last logged change.
+        self._seq = 0
+        # Number of records in the log and of orders in the snapshot.
+        self._tail = 0
+        self._snapshot_size = 0
+        self._lock = threading.Lock()
+        if self.path is not None:
+            self._log_path = self.path.with_suffix(".log")
+            self._load()
+
+    def _load(self):
+        """
+        This function rebuilds orders from the snapshot and the log records
+        written after it. A partially written last record (crash during
+        append) is discarded.
+
+        Args:
+            None
+
+        Returns:
+            None
+        """
+        if self.path.exists():
+            with open(self.path) as file:
+                document = json.load(file)
+            self._next_id = document["next_id"]
+            self._seq = document.get("seq", 0)
+            for order in document["open"]:
+                order = Order.from_dict(order)
+                self._orders[order.order_id] = order
+            for order in document["closed"]:
+                order = Order.from_dict(order)
+                self._closed[order.username].append(order)
+            self._snapshot_size = len(document["open"]) + len(
+                document["closed"]
+            )
+        if self._log_path.exists():
+            with open(self._log_path, "rb+") as file:
+                offset = 0
+                for line in file:
+                    if not line.endswith(b"\n"):
+                        break
+                    offset += len(line)
+                    record = json.loads(line)
+                    # Records covered by the snapshot remain if writing it
+                    # was interrupted before the log was emptied.
+                    if record["seq"] <= self._seq:
+                        continue
+                    self._replay(record)
+                    self._seq = record["seq"]
+                    self._tail += 1
+                file.truncate(offset)
+        self._rebuild()
+
+    def _replay(self, record):
+        """
+        This function applies a log record to open and closed orders (not to
+        the heaps, which are rebuilt afterwards).
+
+        Args:
+            record: Record written by `_log`.
+
+        Returns:
+            None
+        """
+        order = Order.from_dict(record["order"])
+        self._next_id = max(self._next_id, order.order_id + 1)
+        if order.status == "open":
+            self._orders[order.order_id] = order
+        else:
+            self._orders.pop(order.order_id, None)
+            self._closed[order.username].append(order)
+
+    def _log(self, records):
+        """
+        This function appends records of changed orders to the log, writing
+        a new snapshot once the log outgrows it. Caller must hold the lock.
+
+        Args:
+            records: List of dictionaries with "order" (in JSON format) of
+            an added or changed order.
+
+        Returns:
+            None
+        """
+        if self.path is None or not records:
+            return
+        lines = []
+        for record in records:
+            self._seq += 1
+            record["seq"] = self._seq
+            lines.append(json.dumps(record) + "\n")
+        os.makedirs(self.path.parent, exist_ok=True)
+        with open(self._log_path, "a") as file:
+            file.write("".join(lines))
+            file.flush()
+            os.fsync(file.fileno())
+        self._tail += len(records)
+        if self._tail >= max(self.snapshot_interval, self._snapshot_size):
+            self._snapshot()
+
+    def _snapshot(self):
+        """
+        This function writes all orders to the snapshot and empties the log.
+        Caller must hold the lock.
+
+        Args:
+            None
+
+        Returns:
+            None
+        """
+        # Orders pending execution are stored as open, so they aren't lost if
+        # the server stops before `complete`.
+        open_orders = [
+            order.to_dict()
+            for order in itertools.chain(
+                self._orders.values(), self._pending.values()
+            )
+        ]
+        closed = [
+            order.to_dict()
+            for orders in self._closed.values()
+            for order in orders
+        ]
+        write_json_atomic(
+            self.path,
+            {
+                "seq": self._seq,
+                "next_id": self._next_id,
+                "open": open_orders,
+                "closed": closed,
+            },
+        )
+        with open(self._log_path, "w"):
+            pass
+        self._tail = 0
+        self._snapshot_size = len(open_orders) + len(closed)
+
+    def _index(self, order):
+        """
+        This function adds open order to the heaps. Caller must hold the
+        lock.
+
+        Args:
+            order: Open Order.
+
+        Returns:
+            None
+        """
+        self._orders[order.order_id] = order
+        if order.triggers_above:
+            heap, key = self._above[order.stock_ticker], order.level
+        else:
+            heap, key = self._below[order.stock_ticker], -order.level
+        heapq.heappush(heap, (key, next(self._sequence), order.order_id))
+
+    def _close(self, order, status, reason=None, fill_price=None):
+        """
+        This function records order as closed. Caller must hold the lock.
+
+        Args:
+            order: Order.
+            status: "filled", "cancelled", "expired" or "rejected".
+            reason: Why the order was rejected or None.
+            fill_price: Price at which the order was filled or None.
+
+        Returns:
+            None
+        """
+        order.status = status
+        order.reason = reason
+        order.fill_price = fill_price
+        order.closed = time.time()
+        self._closed[order.username].append(order)
+
+    def place(
+        self,
+        username,
+        action_type,
+        stock_ticker,
+        quantity,
+        order_type,
+        limit_price=None,
+        stop_price=None,
+        time_in_force="GTC",
+        expires=None,
+    ):
+        """
+        This function adds a new open order.
+
+        Args:
+            username: Username of the user placing the order.
+            action_type: "BUY" or "SELL".
+            stock_ticker: Stock Ticker
+            quantity: Stock quantity.
+            order_type: "limit", "stop" or "stop_limit".
+            limit_price: Limit price of limit and stop-limit orders.
+            stop_price: Stop price of stop and stop-limit orders.
+            time_in_force: "GTC" or "DAY".
+            expires: UNIX timestamp after which the order is cancelled or
+            None.
+
+        Returns:
+            The placed Order.
+        """
+        with self._lock:
+            order = Order(
+                self._next_id,
+                username,
+                action_type,
+                stock_ticker,
+                quantity,
+                order_type,
+                limit_price,
+                stop_price,
+                time_in_force,
+                expires=expires,
+            )
+            self._next_id += 1
+            self._index(order)
+            if expires is not None:
+                heapq.heappush(self._expiry, (expires, order.order_id))
+            self._log([{"order": order.to_dict()}])
+        return order
+
+    def cancel(self, username, order_id):
+        """
+        This function cancels an open order of the user.
+
+        Args:
+            username: Username.
+            order_id: Id of the order.
+
+        Returns:
+            True if the order was cancelled, False if it isn't open or
+            belongs to another user.
+        """
+        with self._lock:
+            order = self._orders.get(order_id)
+            if order is None or order.username != username:
+                return False
+            del self._orders[order_id]
+            self._stale += 1
+            self._close(order, "cancelled")
+            self._compact()
+            self._log([{"order": order.to_dict()}])
+        return True
+
+    def orders(self, username):
+        """
+        This function lists orders of the user, closing expired orders
+        first.
+
+        Args:
+            username: Username.
+
+        Returns:
+            List of open orders followed by recently closed ones (newest
+            first), in JSON format.
+        """
+        with self._lock:
+            self._expire(time.time())
+            open_orders = [
+                order.to_dict()
+                for order in self._orders.values()
+                if order.username == username
+            ]
+            closed = [
+                order.to_dict()
+                for order in reversed(self._closed.get(username, ()))
+            ]
+        return open_orders + closed
+
+    def tickers(self):
+        """
+        This function collects tickers with open orders. It is called on
+        every tick of the price refresher, so expired orders are closed
+        first, also when their prices don't change.
+
+        Args:
+            None
+
+        Returns:
+            Set of Stock Tickers.
+        """
+        with self._lock:
+            self._expire(time.time())
+            return {order.stock_ticker for order in self._orders.values()}
+
+    def watches(self, stock_tickers):
+        """
+        This function checks whether any of the tickers has open orders.
+
+        Args:
+            stock_tickers: Iterable of Stock Tickers.
+
+        Returns:
+            True if some ticker has open orders otherwise False.
+        """
+        with self._lock:
+            return any(
+                self._above.get(stock_ticker) or self._below.get(stock_ticker)
+                for stock_ticker in stock_tickers
+            )
+
+    def match(self, prices, now=None):
+        """
+        This function expires orders past their expiry and takes out open
+        orders triggered by the given prices. Stop-limit orders whose stop
+        price was reached become limit orders, which are triggered right away
+        if price is already at their limit. Taken orders remain pending until
+        `complete` is called and are stored as open until then.
+
+        Args:
+            prices: Dictionary of prices (in $) keyed by ticker.
+            now: UNIX timestamp. Defaults to current time.
+
+        Returns:
+            List of tuples of triggered Order and price that triggered it.
+        """
+        now = time.time() if now is None else now
+        triggered = []
+        with self._lock:
+            self._expire(now)
+            records = []
+            for stock_ticker, price in prices.items():
+                while True:
+                    # Heaps are looked up again, as triggered stop-limit
+                    # orders may have created them.
+                    above = self._above.get(stock_ticker)
+                    below = self._below.get(stock_ticker)
+                    if above and above[0][0] <= price:
+                        order_id = heapq.heappop(above)[2]
+                    elif below and -below[0][0] >= price:
+                        order_id = heapq.heappop(below)[2]
+                    else:
+                        break
+                    order = self._orders.pop(order_id, None)
+                    if order is None:
+                        self._stale -= 1
+                        continue
+                    if (
+                        order.order_type == "stop_limit"
+                        and not order.triggered
+                    ):
+                        order.triggered = True
+                        self._index(order)
+                        records.append({"order": order.to_dict()})
+                        continue
+                    # Its removal is logged by `complete`, together with the
+                    # outcome, so replay re-opens it if that never happens.
+                    self._pending[order_id] = order
+                    triggered.append((order, price))
+            self._log(records)
+        return triggered
+
+    def complete(self, outcomes):
+        """
+        This function records outcomes of executing triggered orders.
+
+        Args:
+            outcomes: List of tuples of Order returned by `match`, price at
+            which it was filled (None if it was rejected) and why it was
+            rejected.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            for order, fill_price, reason in outcomes:
+                self._pending.pop(order.order_id, None)
+                if fill_price is None:
+                    self._close(order, "rejected", reason)
+                else:
+                    self._close(order, "filled", fill_price=fill_price)
+            self._log([{"order": order.to_dict()} for order, _, _ in outcomes])
+
+    def _expire(self, now):
+        """
+        This function closes open orders whose expiry has passed. Caller
+        must hold the lock.
+
+        Args:
+            now: UNIX timestamp.
+
+        Returns:
+            True if any order expired otherwise False.
+        """
+        expired = []
+        while self._expiry and self._expiry[0][0] <= now:
+            order = self._orders.pop(heapq.heappop(self._expiry)[1], None)
+            if order is not None:
+                self._stale += 1
+                self._close(order, "expired")
+                expired.append({"order": order.to_dict()})
+        if expired:
+            self._compact()
+            self._log(expired)
+        return bool(expired)
+
+    def _compact(self):
+        """
+        This function rebuilds the heaps without entries of closed orders
+        once they outnumber open orders. Caller must hold the lock.
+
+        Args:
+            None
+
+        Returns:
+            None
+        """
+        if self._stale >= max(1024, len(self._orders)):
+            self._rebuild()
+
+    def _rebuild(self):
+        """
+        This function indexes open orders in new heaps. Caller must hold the
+        lock.
+
+        Args:
+            None
+
+        Returns:
+            None
+        """
+        orders = list(self._orders.values())
+        self._orders = {}
+        self._above.clear()
+        self._below.clear()
+        self._stale = 0
+        for order in orders:
+            self._index(order)
+        self._expiry = [
+            (order.expires, order.order_id)
+            for order in orders
+            if order.expires is not None
+        ]
+        heapq.heapify(self._expiry)
@@ -0,0 +1,304 @@
+class Holding:
+    """This class represents user's position in a single stock."""
+
+    __slots__ = ("name", "quantity", "investment", "cur_price")
+
+    def __init__(self, name, quantity, investment, cur_price):
+        """
+        Constructor for Holding
+
+        Args:
+            name: Stock Ticker.
+            quantity: Number of stocks held.
+            investment: Amount invested in the stock (in $).
+            cur_price: Current price of the stock (in $).
+
+        Returns:
+            None
+        """
+        self.name = name
+        self.quantity = quantity
+        self.investment = investment
+        self.cur_price = cur_price
+
+    @staticmethod
+    def from_dict(stock):
+        """
+        This function creates Holding from its JSON format.
+
+        Args:
+            stock: Dictionary with "name", "quantity", "investment" and
+            "cur_price" fields.
+
+        Returns:
+            Holding
+        """
+        return Holding(
+            stock["name"],
+            stock["quantity"],
+            stock["investment"],
+            stock["cur_price"],
+        )
+
+    def to_dict(self):
+        """
+        This function provides Holding in JSON format.
+
+        Args:
+            None
+
+        Returns:
+            Dictionary with "name", "quantity", "investment" and "cur_price"
+            fields.
+        """
+        return {
+            "name": self.name,
+            "quantity": self.quantity,
+            "investment": self.investment,
+            "cur_price": self.cur_price,
+        }
+
+
+class Portfolio:
+    """
+    This class provides ticker-indexed holdings of a user. Lookups and trades
+    are O(1) regardless of number of holdings, holdings keep the order in
+    which they were bought and total value is maintained incrementally.
+    """
+
+    __slots__ = ("_holdings", "value")
+
+    def __init__(self, holdings=()):
+        """
+        Constructor for Portfolio
+
+        Args:
+            holdings: Iterable of Holding objects.
+
+        Returns:
+            None
+        """
+        self._holdings = {holding.name: holding for holding in holdings}
+        self.revalue()
+
+    @staticmethod
+    def from_list(stocks):
+        """
+        This function creates Portfolio from the "portfolio" list of user's
+        JSON format.
+
+        Args:
+            stocks: List of holdings in JSON format.
+
+        Returns:
+            Portfolio
+        """
+        return Portfolio(Holding.from_dict(stock) for stock in stocks)
+
+    def to_list(self):
+        """
+        This function provides Portfolio as the "portfolio" list of user's
+        JSON format.
+
+        Args:
+            None
+
+        Returns:
+            List of holdings in JSON format.
+        """
+        return [holding.to_dict() for holding in self._holdings.values()]
+
+    def copy(self):
+        """
+        This function provides independent copy of the Portfolio.
+
+        Args:
+            None
+
+        Returns:
+            Portfolio
+        """
+        portfolio = Portfolio()
+        portfolio._holdings = {
+            name: Holding(
+                name, holding.quantity, holding.investment, holding.cur_price
+            )
+            for name, holding in self._holdings.items()
+        }
+        portfolio.value = self.value
+        return portfolio
+
+    def __len__(self):
+        return len(self._holdings)
+
+    def __iter__(self):
+        return iter(self._holdings.values())
+
+    def __contains__(self, stock_ticker):
+        return stock_ticker in self._holdings
+
+    def get(self, stock_ticker):
+        """
+        This function provides holding of the given stock.
+
+        Args:
+            stock_ticker: Stock Ticker
+
+        Returns:
+            Holding or None if stock isn't held.
+        """
+        return self._holdings.get(stock_ticker)
+
+    def tickers(self):
+        """
+        This function lists held stocks.
+
+        Args:
+            None
+
+        Returns:
+            List of Stock Tickers.
+        """
+        return list(self._holdings)
+
+    def buy(self, stock_ticker, quantity, stock_price):
+        """
+        This function adds bought stocks to the portfolio.
+
+        Args:
+            stock_ticker: Stock Ticker
+            quantity: Stock quantity.
+            stock_price: Stock's current price.
+
+        Returns:
+            Updated Holding.
+        """
+        holding = self._holdings.get(stock_ticker)
+        if holding is None:
+            holding = self._holdings[stock_ticker] = Holding(
+                stock_ticker, 0, 0.0, stock_price
+            )
+        self.value -= holding.quantity * holding.cur_price
+        holding.quantity += quantity
+        holding.investment += quantity * stock_price
+        holding.cur_price = stock_price
+        self.value += holding.quantity * holding.cur_price
+        return holding
+
+    def sell(self, stock_ticker, quantity, stock_price):
+        """
+        This function removes sold stocks from the portfolio. Caller must
+        make sure that enough stocks are held.
+
+        Args:
+            stock_ticker: Stock Ticker
+            quantity: Stock quantity.
+            stock_price: Stock's current price.
+
+        Returns:
+            Updated Holding or None if no stocks are left.
+        """
+        holding = self._holdings[stock_ticker]
+        self.value -= holding.quantity * holding.cur_price
+        holding.quantity -= quantity
+        holding.investment -= quantity * stock_price
+        holding.cur_price = stock_price
+        if holding.quantity == 0:
+            del self._holdings[stock_ticker]
+            return None
+        self.value += holding.quantity * holding.cur_price
+        return holding
+
+    def set_price(self, stock_ticker, stock_price):
+        """
+        This function updates current price of the given stock.
+
+        Args:
+            stock_ticker: Stock Ticker
+            stock_price: Stock's current price.
+
+        Returns:
+            None
+        """
+        holding = self._holdings[stock_ticker]
+        self.value += holding.quantity * (stock_price - holding.cur_price)
+        holding.cur_price = stock_price
+
+    def revalue(self):
+        """
+        This function recomputes total value from scratch, discarding
+        rounding errors accumulated by incremental updates.
+
+        Args:
+            None
+
+        Returns:
+            Total value of the portfolio.
+        """
+        self.value = sum(
+            holding.quantity * holding.cur_price
+            for holding in self._holdings.values()
+        )
+        return self.value
+
+    def put(self, holding):
+        """
+        This function stores the given holding, replacing the existing
+        holding of that stock in place.
+
+        Args:
+            holding: Holding
+
+        Returns:
+            None
+        """
+        old = self._holdings.get(holding.name)
+        if old is not None:
+            self.value -= old.quantity * old.cur_price
+        # Assigning to an existing key keeps its position.
+        self._holdings[holding.name] = holding
+        self.value += holding.quantity * holding.cur_price
+
+    def remove(self, stock_ticker):
+        """
+        This function removes holding of the given stock if it is held.
+
+        Args:
+            stock_ticker: Stock Ticker
+
+        Returns:
+            None
+        """
+        holding = self._holdings.pop(stock_ticker, None)
+        if holding is not None:
+            self.value -= holding.quantity * holding.cur_price
+
+
+def decode_user(document):
+    """
+    This function converts user's JSON format to in-memory user data.
+
+    Args:
+        document: User's data in JSON format.
+
+    Returns:
+        User's data with "portfolio" as Portfolio.
+    """
+    data = dict(document)
+    data["portfolio"] = Portfolio.from_list(document["portfolio"])
+    return data
+
+
+def encode_user(data):
+    """
+    This function converts in-memory user data to JSON format read by GUI.
+
+    Args:
+        data: User's data with "portfolio" as Portfolio.
+
+    Returns:
+        User's data in JSON format.
+    """
+    document = dict(data)
+    document["portfolio"] = data["portfolio"].to_list()
+    return document
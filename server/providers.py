@@ -0,0 +1,439 @@
+import math
+import threading
+import time
+import zlib
+import numpy as np
+import pandas as pd
+
+# First date of synthetic daily bars, so bars of a ticker are the same
+# whatever range is requested.
+SYNTHETIC_EPOCH = pd.Timestamp("2000-01-03")
+# Number of synthetic ticks generated at once per ticker.
+SYNTHETIC_CHUNK = 256
+
+
+class PriceProvider:
+    """
+    This class defines interface of upstream market data used by the server.
+    Prices are in quote currency of the ticker. Unknown tickers raise
+    AssertionError("No data found for this ticker."), like yahoo_fin.
+    """
+
+    def live_price(self, stock_ticker):
+        """
+        This function provides latest price of a stock.
+
+        Args:
+            stock_ticker: Stock Ticker
+
+        Returns:
+            Latest price of the given stock.
+        """
+        raise NotImplementedError
+
+    def latest_prices(self, stock_tickers):
+        """
+        This function provides latest prices of many stocks in one call.
+
+        Args:
+            stock_tickers: List of Stock Tickers.
+
+        Returns:
+            Dictionary of latest prices of the stocks for which data was
+            found.
+        """
+        prices = {}
+        for stock_ticker in stock_tickers:
+            try:
+                prices[stock_ticker] = self.live_price(stock_ticker)
+            except AssertionError:
+                pass
+        return prices
+
+    def history(self, stock_ticker, start):
+        """
+        This function provides daily bars of a stock.
+
+        Args:
+            stock_ticker: Stock Ticker
+            start: First date of the bars (pandas.Timestamp).
+
+        Returns:
+            DataFrame of daily bars ("Open", "High", "Low", "Close",
+            "Adj Close" and "Volume") from `start` up to today indexed by
+            date. Empty if no data was found.
+        """
+        raise NotImplementedError
+
+    def fx_rate(self, base, quote):
+        """
+        This function provides an FX rate.
+
+        Args:
+            base: Base currency.
+            quote: Quote currency.
+
+        Returns:
+            Price of one unit of `base` in `quote`.
+        """
+        raise NotImplementedError
+
+
+class YahooProvider(PriceProvider):
+    """
+    This class provides live data from Yahoo Finance (prices and history)
+    and forex-python (FX rates).
+    """
+
+    def __init__(self):
+        """
+        Constructor for YahooProvider
+
+        Args:
+            None
+
+        Returns:
+            None
+        """
+        # Imported here, so offline providers don't need these packages.
+        import yfinance
+        from forex_python.converter import CurrencyRates
+        from yahoo_fin import stock_info
+
+        self._yf = yfinance
+        self._stock_info = stock_info
+        self._currency_rates = CurrencyRates()
+
+    def live_price(self, stock_ticker):
+        return float(self._stock_info.get_live_price(stock_ticker))
+
+    def latest_prices(self, stock_tickers):
+        df = self._yf.download(
+            " ".join(stock_tickers),
+            period="5d",
+            interval="1d",
+            group_by="ticker",
+            threads=True,
+            progress=False,
+        )
+        prices = {}
+        for stock_ticker in stock_tickers:
+            # Columns are only grouped by ticker when many tickers are
+            # requested.
+            closes = (
+                df[stock_ticker]["Close"]
+                if len(stock_tickers) > 1
+                else df["Close"]
+            ).dropna()
+            if len(closes) > 0 and not math.isnan(closes.iloc[-1]):
+                prices[stock_ticker] = float(closes.iloc[-1])
+        return prices
+
+    def history(self, stock_ticker, start):
+        df = self._yf.download(
+            stock_ticker,
+            start=start.strftime("%Y-%m-%d"),
+            interval="1d",
+            progress=False,
+        )
+        if isinstance(df.columns, pd.MultiIndex):
+            df.columns = df.columns.get_level_values(0)
+        if "Close" not in df:
+            return df
+        return df.dropna(subset=["Close"])
+
+    def fx_rate(self, base, quote):
+        return self._currency_rates.get_rate(base, quote)
+
+
+class ReplayProvider(PriceProvider):
+    """
+    This class provides deterministic offline data for tests and load
+    benchmarks. Ticks are replayed from a recording (CSV or Parquet file
+    with "timestamp", "ticker" and "price" columns, optionally "volume") or,
+    without a recording, generated as a random walk seeded by ticker, so
+    every run sees the same prices. Replay clock starts at the first tick
+    and advances `speed` times faster than real time (0 freezes it), and
+    every call waits `latency` seconds to simulate network round trips.
+    """
+
+    def __init__(
+        self,
+        path=None,
+        speed=1.0,
+        latency=0.0,
+        seed=0,
+        tick_interval=60.0,
+        fx_rates=None,
+        clock=time.monotonic,
+    ):
+        """
+        Constructor for ReplayProvider
+
+        Args:
+            path: Recorded ticks (".csv" or ".parquet") or None to generate
+            synthetic ticks for any ticker.
+            speed: Replay seconds per real second.
+            latency: Seconds every call waits before returning.
+            seed: Seed of synthetic ticks.
+            tick_interval: Replay seconds between synthetic ticks.
+            fx_rates: Dictionary of rates keyed by "BASE/QUOTE". Other
+            pairs have rate 1.
+            clock: Function providing real time in seconds.
+
+        Returns:
+            None
+        """
+        self.speed = speed
+        self.latency = latency
+        self.seed = seed
+        self.tick_interval = tick_interval
+        self.fx_rates = dict(fx_rates or {})
+        self._clock = clock
+        self._started = clock()
+        # ticker -> (times in seconds since first tick, prices, volumes)
+        self._ticks = {}
+        self._origin = 0.0
+        self._recorded = path is not None
+        # ticker -> [random generator, generated prices]
+        self._synthetic = {}
+        # ticker -> daily bars aggregated from recorded ticks
+        self._history = {}
+        # Day and business days up to it of synthetic bars, shared by all
+        # tickers.
+        self._calendar = (None, None)
+        self._lock = threading.Lock()
+        if path is not None:
+            self._load(path)
+
+    def _load(self, path):
+        """
+        This function reads recorded ticks.
+
+        Args:
+            path: Path of CSV or Parquet file.
+
+        Returns:
+            None
+        """
+        path = str(path)
+        if path.endswith(".parquet"):
+            df = pd.read_parquet(path)
+        else:
+            df = pd.read_csv(path)
+        df["timestamp"] = pd.to_datetime(df["timestamp"])
+        df = df.sort_values("timestamp", kind="mergesort")
+        self._origin = df["timestamp"].iloc[0]
+        seconds = (df["timestamp"] - self._origin).dt.total_seconds()
+        volumes = df["volume"] if "volume" in df else pd.Series(0, df.index)
+        for stock_ticker, rows in df.groupby("ticker").groups.items():
+            self._ticks[stock_ticker] = (
+                seconds[rows].to_numpy(),
+                df["price"][rows].to_numpy(dtype="f8"),
+                volumes[rows].to_numpy(dtype="f8"),
+            )
+
+    def now(self):
+        """
+        This function provides replay time.
+
+        Args:
+            None
+
+        Returns:
+            Seconds since the first tick.
+        """
+        return (self._clock() - self._started) * self.speed
+
+    def _wait(self):
+        """
+        This function simulates latency of an upstream call.
+
+        Args:
+            None
+
+        Returns:
+            None
+        """
+        if self.latency > 0:
+            time.sleep(self.latency)
+
+    def _ticker_seed(self, stock_ticker):
+        """
+        This function derives seed of a ticker's synthetic data.
+
+        Args:
+            stock_ticker: Stock Ticker
+
+        Returns:
+            Seed, the same in every run.
+        """
+        return zlib.crc32(stock_ticker.encode()) ^ self.seed
+
+    def _synthetic_price(self, stock_ticker, step):
+        """
+        This function provides synthetic price of a ticker after `step`
+        ticks, generating the walk in chunks as replay advances.
+
+        Args:
+            stock_ticker: Stock Ticker
+            step: Number of ticks since start.
+
+        Returns:
+            Price.
+        """
+        with self._lock:
+            entry = self._synthetic.get(stock_ticker)
+            if entry is None:
+                seed = self._ticker_seed(stock_ticker)
+                rng = np.random.default_rng(seed)
+                start = np.array([10.0 + seed % 490])
+                entry = self._synthetic[stock_ticker] = [rng, start]
+            rng, prices = entry
+            while step >= len(prices):
+                steps = np.exp(rng.normal(0, 0.001, SYNTHETIC_CHUNK))
+                prices = np.concatenate(
+                    [prices, prices[-1] * np.cumprod(steps)]
+                )
+            entry[1] = prices
+            return float(prices[step])
+
+    def _price(self, stock_ticker):
+        """
+        This function provides price of a ticker at current replay time.
+
+        Args:
+            stock_ticker: Stock Ticker
+
+        Returns:
+            Price.
+        """
+        if not self._recorded:
+            step = int(self.now() // self.tick_interval)
+            return round(self._synthetic_price(stock_ticker, step), 4)
+        ticks = self._ticks.get(stock_ticker)
+        if ticks is None:
+            raise AssertionError("No data found for this ticker.")
+        index = np.searchsorted(ticks[0], self.now(), side="right") - 1
+        return float(ticks[1][max(index, 0)])
+
+    def live_price(self, stock_ticker):
+        self._wait()
+        return self._price(stock_ticker)
+
+    def latest_prices(self, stock_tickers):
+        # One round trip for the whole batch, like Yahoo's batch download.
+        self._wait()
+        prices = {}
+        for stock_ticker in stock_tickers:
+            try:
+                prices[stock_ticker] = self._price(stock_ticker)
+            except AssertionError:
+                pass
+        return prices
+
+    def history(self, stock_ticker, start):
+        self._wait()
+        if self._recorded:
+            bars = self._recorded_bars(stock_ticker)
+        else:
+            bars = self._synthetic_bars(stock_ticker)
+        return bars.loc[pd.Timestamp(start) :]
+
+    def _recorded_bars(self, stock_ticker):
+        """
+        This function aggregates recorded ticks of a ticker to daily bars.
+
+        Args:
+            stock_ticker: Stock Ticker
+
+        Returns:
+            DataFrame of daily bars.
+        """
+        with self._lock:
+            bars = self._history.get(stock_ticker)
+        if bars is not None:
+            return bars
+        ticks = self._ticks.get(stock_ticker)
+        if ticks is None:
+            return pd.DataFrame()
+        index = self._origin + pd.to_timedelta(ticks[0], unit="s")
+        prices = pd.Series(ticks[1], index=index)
+        bars = prices.resample("D").ohlc().dropna()
+        bars.columns = ["Open", "High", "Low", "Close"]
+        bars["Adj Close"] = bars["Close"]
+        bars["Volume"] = (
+            pd.Series(ticks[2], index=index).resample("D").sum()[bars.index]
+        )
+        with self._lock:
+            self._history[stock_ticker] = bars
+        return bars
+
+    def _synthetic_bars(self, stock_ticker):
+        """
+        This function generates daily bars of a ticker from SYNTHETIC_EPOCH
+        up to today. Every column is drawn from its own generator, so bars
+        of past days don't change as days are added.
+
+        Args:
+            stock_ticker: Stock Ticker
+
+        Returns:
+            DataFrame of daily bars.
+        """
+        today = pd.Timestamp.today().normalize()
+        with self._lock:
+            if self._calendar[0] != today:
+                self._calendar = (
+                    today,
+                    pd.bdate_range(SYNTHETIC_EPOCH, today),
+                )
+            index = self._calendar[1]
+        seed = self._ticker_seed(stock_ticker)
+        returns, spreads, volumes = (
+            np.random.default_rng([seed, column]) for column in range(3)
+        )
+        close = (10.0 + seed % 490) * np.exp(
+            np.cumsum(returns.normal(0, 0.015, len(index)))
+        )
+        spread = np.abs(spreads.normal(0, 0.01, len(index))) * close
+        open_ = np.concatenate([close[:1], close[:-1]])
+        return pd.DataFrame(
+            {
+                "Open": open_,
+                "High": np.maximum(open_, close) + spread,
+                "Low": np.minimum(open_, close) - spread,
+                "Close": close,
+                "Adj Close": close,
+                "Volume": volumes.integers(10**5, 10**7, len(index)),
+            },
+            index=index,
+        )
+
+    def fx_rate(self, base, quote):
+        self._wait()
+        return self.fx_rates.get(f"{base}/{quote}", 1.0)
+
+
+def create_provider(
+    name, path=None, speed=1.0, latency=0.0, seed=0, fx_rates=None
+):
+    """
+    This function creates price provider of the given type.
+
+    Args:
+        name: "yahoo" or "replay".
+        path: Recorded ticks of the replay provider or None.
+        speed: Replay speed of the replay provider.
+        latency: Latency of calls of the replay provider.
+        seed: Seed of synthetic ticks of the replay provider.
+        fx_rates: FX rates of the replay provider keyed by "BASE/QUOTE".
+
+    Returns:
+        PriceProvider
+    """
+    if name == "yahoo":
+        return YahooProvider()
+    if name == "replay":
+        return ReplayProvider(path, speed, latency, seed, fx_rates=fx_rates)
+    raise ValueError(f"Unknown price provider: {name}")
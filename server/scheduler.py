@@ -0,0 +1,212 @@
+import logging
+import threading
+import time
+import pytz
+
+from datetime import datetime, time as clock, timedelta
+from fx import exchange_suffix
+
+logger = logging.getLogger(__name__)
+
+# Exchange suffix -> (timezone, opening time, closing time) of its regular
+# trading session on weekdays. Holidays are not taken into account.
+MARKET_HOURS = {
+    "": ("America/New_York", clock(9, 30), clock(16, 0)),
+    "NS": ("Asia/Kolkata", clock(9, 15), clock(15, 30)),
+    "BO": ("Asia/Kolkata", clock(9, 15), clock(15, 30)),
+    "L": ("Europe/London", clock(8, 0), clock(16, 30)),
+    "IL": ("Europe/London", clock(8, 0), clock(16, 30)),
+    "AX": ("Australia/Sydney", clock(10, 0), clock(16, 0)),
+    "NZ": ("Pacific/Auckland", clock(10, 0), clock(16, 45)),
+    "BE": ("Europe/Berlin", clock(8, 0), clock(22, 0)),
+    "DE": ("Europe/Berlin", clock(9, 0), clock(17, 30)),
+    "F": ("Europe/Berlin", clock(8, 0), clock(22, 0)),
+    "DU": ("Europe/Berlin", clock(8, 0), clock(22, 0)),
+    "HM": ("Europe/Berlin", clock(8, 0), clock(22, 0)),
+    "HA": ("Europe/Berlin", clock(8, 0), clock(22, 0)),
+    "MU": ("Europe/Berlin", clock(8, 0), clock(22, 0)),
+    "SG": ("Europe/Berlin", clock(8, 0), clock(22, 0)),
+    "PA": ("Europe/Paris", clock(9, 0), clock(17, 30)),
+    "AS": ("Europe/Amsterdam", clock(9, 0), clock(17, 30)),
+    "BR": ("Europe/Brussels", clock(9, 0), clock(17, 30)),
+    "MI": ("Europe/Rome", clock(9, 0), clock(17, 30)),
+    "MC": ("Europe/Madrid", clock(9, 0), clock(17, 30)),
+    "LS": ("Europe/Lisbon", clock(8, 0), clock(16, 30)),
+    "VI": ("Europe/Vienna", clock(9, 0), clock(17, 30)),
+    "HE": ("Europe/Helsinki", clock(10, 0), clock(18, 30)),
+    "IR": ("Europe/Dublin", clock(8, 0), clock(16, 30)),
+    "SW": ("Europe/Zurich", clock(9, 0), clock(17, 30)),
+    "ST": ("Europe/Stockholm", clock(9, 0), clock(17, 30)),
+    "OL": ("Europe/Oslo", clock(9, 0), clock(16, 20)),
+    "CO": ("Europe/Copenhagen", clock(9, 0), clock(17, 0)),
+    "TO": ("America/Toronto", clock(9, 30), clock(16, 0)),
+    "V": ("America/Toronto", clock(9, 30), clock(16, 0)),
+    "CN": ("America/Toronto", clock(9, 30), clock(16, 0)),
+    "HK": ("Asia/Hong_Kong", clock(9, 30), clock(16, 0)),
+    "T": ("Asia/Tokyo", clock(9, 0), clock(15, 0)),
+    "SS": ("Asia/Shanghai", clock(9, 30), clock(15, 0)),
+    "SZ": ("Asia/Shanghai", clock(9, 30), clock(15, 0)),
+    "KS": ("Asia/Seoul", clock(9, 0), clock(15, 30)),
+    "KQ": ("Asia/Seoul", clock(9, 0), clock(15, 30)),
+    "SI": ("Asia/Singapore", clock(9, 0), clock(17, 0)),
+    "JK": ("Asia/Jakarta", clock(9, 0), clock(16, 0)),
+    "BK": ("Asia/Bangkok", clock(10, 0), clock(16, 30)),
+    "KL": ("Asia/Kuala_Lumpur", clock(9, 0), clock(17, 0)),
+    "SA": ("America/Sao_Paulo", clock(10, 0), clock(17, 0)),
+    "MX": ("America/Mexico_City", clock(8, 30), clock(15, 0)),
+    "JO": ("Africa/Johannesburg", clock(9, 0), clock(17, 0)),
+    "TA": ("Asia/Jerusalem", clock(9, 59), clock(17, 25)),
+}
+
+
+def is_market_open(stock_ticker, now=None):
+    """
+    This function checks whether exchange of the given ticker is in its
+    regular trading session.
+
+    Args:
+        stock_ticker: Stock Ticker
+        now: Timezone-aware datetime to check at. Defaults to current time.
+
+    Returns:
+        True if market is open otherwise False.
+    """
+    zone, opens, closes = MARKET_HOURS.get(
+        exchange_suffix(stock_ticker), MARKET_HOURS[""]
+    )
+    local = (now or datetime.now(pytz.utc)).astimezone(pytz.timezone(zone))
+    return local.weekday() < 5 and opens <= local.time() < closes
+
+
+def market_close(stock_ticker, now=None):
+    """
+    This function provides end of the current (or, after it has closed,
+    next) trading day of the exchange of the given ticker.
+
+    Args:
+        stock_ticker: Stock Ticker
+        now: Timezone-aware datetime to start from. Defaults to current
+        time.
+
+    Returns:
+        Closing time as UNIX timestamp.
+    """
+    zone, _, closes = MARKET_HOURS.get(
+        exchange_suffix(stock_ticker), MARKET_HOURS[""]
+    )
+    zone = pytz.timezone(zone)
+    local = (now or datetime.now(pytz.utc)).astimezone(zone)
+    day = local.date()
+    if local.time() >= closes:
+        day += timedelta(days=1)
+    while day.weekday() >= 5:
+        day += timedelta(days=1)
+    return zone.localize(datetime.combine(day, closes)).timestamp()
+
+
+class PriceRefresher(threading.Thread):
+    """
+    This class provides background thread which periodically collects the
+    union of tickers held by all users and refreshes their prices in bulk,
+    so that requests read prices from memory instead of waiting for
+    upstream. Tickers whose market is open are refreshed every
+    `open_interval` seconds and the rest every `closed_interval` seconds.
+    """
+
+    def __init__(
+        self,
+        tickers_func,
+        refresh_func,
+        open_interval=30.0,
+        closed_interval=900.0,
+        batch_size=200,
+    ):
+        """
+        Constructor for PriceRefresher
+
+        Args:
+            tickers_func: Function returning set of tickers to keep warm.
+            refresh_func: Function taking list of tickers and a TTL which
+            fetches and stores their prices.
+            open_interval: Refresh interval of tickers whose market is open.
+            closed_interval: Refresh interval of the other tickers.
+            batch_size: Maximum number of tickers refreshed in one call.
+
+        Returns:
+            None
+        """
+        threading.Thread.__init__(self, name="price-refresher", daemon=True)
+        self._tickers_func = tickers_func
+        self._refresh_func = refresh_func
+        self.open_interval = open_interval
+        self.closed_interval = closed_interval
+        self.batch_size = batch_size
+        # ticker -> monotonic time of its last refresh
+        self._last_refresh = {}
+        self._stop_event = threading.Event()
+
+    def run(self):
+        """
+        This function refreshes due tickers until the thread is stopped.
+
+        Args:
+            None
+
+        Returns:
+            None
+        """
+        while not self._stop_event.is_set():
+            try:
+                self.refresh_due()
+            except Exception:
+                logger.exception("Price refresh failed.")
+            self._stop_event.wait(self.open_interval)
+
+    def refresh_due(self):
+        """
+        This function refreshes tickers whose refresh interval has passed.
+
+        Args:
+            None
+
+        Returns:
+            Number of refreshed tickers.
+        """
+        now = time.monotonic()
+        tickers = self._tickers_func()
+        # Forget tickers nobody holds anymore.
+        for stock_ticker in set(self._last_refresh) - set(tickers):
+            del self._last_refresh[stock_ticker]
+        due = {self.open_interval: [], self.closed_interval: []}
+        for stock_ticker in tickers:
+            interval = (
+                self.open_interval
+                if is_market_open(stock_ticker)
+                else self.closed_interval
+            )
+            last_refresh = self._last_refresh.get(stock_ticker)
+            if last_refresh is None or now - last_refresh >= interval:
+                due[interval].append(stock_ticker)
+        for interval, stock_tickers in due.items():
+            # Prices must stay fresh until the refresh after next, so
+            # requests never have to fetch them.
+            ttl = 2 * interval + self.open_interval
+            for i in range(0, len(stock_tickers), self.batch_size):
+                batch = stock_tickers[i : i + self.batch_size]
+                errors = self._refresh_func(batch, ttl)
+                for stock_ticker in batch:
+                    if stock_ticker not in errors:
+                        self._last_refresh[stock_ticker] = now
+        return sum(len(stock_tickers) for stock_tickers in due.values())
+
+    def stop(self):
+        """
+        This function stops the thread after its current refresh.
+
+        Args:
+            None
+
+        Returns:
+            None
+        """
+        self._stop_event.set()
@@ -1,12 +1,192 @@
-from flask import Flask, request, jsonify
+import atexit
+import argparse
+import config
+import gzip
+import hmac
+import logging
+import pandas as pd
+import signal
+import sys
+import time
+
+from cache import QuoteCache
+from concurrent import futures
+from contextlib import contextmanager
+from flask import Flask, Response, g, request, jsonify
 from flask_cors import CORS
-from forex_python.converter import CurrencyRates
+from fx import FXRateProvider, exchange_suffix
 from helpers import DatabaseHandler
-from yahoo_fin import stock_info as si
+from metrics import (
+    REQUEST_SECONDS,
+    UPSTREAM_REQUESTS,
+    UPSTREAM_SECONDS,
+    Gauge,
+    SamplingProfiler,
+    registry,
+)
+from ohlc import RESOLUTIONS, HistoryCache, downsample, resample, to_columns
+from orders import ORDER_TYPES, TIME_IN_FORCE, OrderBook
+from providers import create_provider
+from scheduler import PriceRefresher, market_close
+from snapshots import Snapshotter
+from stream import TickHub, format_event
+
+logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 CORS(app)
-app.config["DEBUG"] = True
+app.config["DEBUG"] = config.DEBUG
+
+# Shared by all routes so that concurrent requests for the same ticker are
+# served by a single upstream fetch.
+quote_cache = QuoteCache(
+    lambda stock_ticker: fetch_live_price(stock_ticker),
+    lambda stock_tickers: download_prices(stock_tickers),
+    ttl=config.QUOTE_TTL,
+    max_size=config.QUOTE_CACHE_SIZE,
+)
+# Streams every price stored in the quote cache to `/stream` clients
+# holding that ticker.
+tick_hub = TickHub(max_subscribers=config.STREAM_MAX_CLIENTS)
+quote_cache.subscribe(tick_hub.publish)
+# Resting limit and stop orders, matched against every price stored in the
+# quote cache. Orders are matched and filled on a single thread, so that
+# fetching threads never wait for fills.
+order_book = OrderBook(config.ORDERS_PATH, history=config.ORDER_HISTORY)
+order_executor = futures.ThreadPoolExecutor(
+    max_workers=1, thread_name_prefix="orders"
+)
+quote_cache.subscribe(lambda prices: schedule_orders(prices))
+# Daily bars shared by all `/history` requests.
+history_cache = HistoryCache(
+    lambda stock_ticker, start: download_history(stock_ticker, start),
+    ttl=config.HISTORY_TTL,
+    max_size=config.HISTORY_CACHE_SIZE,
+)
+# Keeps prices of all held tickers (and tickers with resting orders) warm, so
+# logins don't wait for upstream and orders are matched as prices move.
+price_refresher = PriceRefresher(
+    lambda: DatabaseHandler.storage.all_tickers() | order_book.tickers(),
+    lambda stock_tickers, ttl: prewarm_prices(stock_tickers, ttl),
+    open_interval=config.REFRESH_INTERVAL_OPEN,
+    closed_interval=config.REFRESH_INTERVAL_CLOSED,
+    batch_size=config.MAX_BATCH_TICKERS,
+)
+# Records balance and holdings valuation of every user for `/analytics`.
+snapshotter = Snapshotter(
+    lambda: DatabaseHandler.storage.usernames(),
+    lambda username: DatabaseHandler.snapshot(username, known_prices),
+    interval=config.SNAPSHOT_INTERVAL,
+)
+# Flush pending writes however the process is stopped (including when the
+# app is hosted by an external WSGI server). Handlers run in reverse order.
+atexit.register(DatabaseHandler.close)
+atexit.register(order_executor.shutdown)
+atexit.register(price_refresher.stop)
+atexit.register(snapshotter.stop)
+atexit.register(tick_hub.close)
+# Upstream market data: Yahoo Finance or offline replay (see `config.py`).
+provider = create_provider(
+    config.PRICE_PROVIDER,
+    config.REPLAY_PATH or None,
+    speed=config.REPLAY_SPEED,
+    latency=config.REPLAY_LATENCY,
+    seed=config.REPLAY_SEED,
+    fx_rates=config.REPLAY_FX_RATES,
+)
+# Rates are fetched once per refresh interval and shared by all requests.
+fx_rates = FXRateProvider(
+    lambda base, quote: fetch_fx_rate(base, quote),
+    refresh_interval=config.FX_REFRESH_INTERVAL,
+)
+# Samples stacks of all threads while enabled (see `/profiler`).
+profiler = SamplingProfiler(interval=config.PROFILER_INTERVAL)
+atexit.register(profiler.stop)
+registry.register(
+    Gauge(
+        "pystock_quote_cache_requests_total",
+        "Quote cache lookups by result.",
+        lambda: {
+            (result,): quote_cache.stats()[result]
+            for result in ("hits", "misses", "coalesced")
+        },
+        labels=("result",),
+        metric_type="counter",
+    )
+)
+registry.register(
+    Gauge(
+        "pystock_quote_cache_hit_ratio",
+        "Share of quote cache lookups served from cache.",
+        lambda: quote_cache_hit_ratio(),
+    )
+)
+registry.register(
+    Gauge(
+        "pystock_quote_cache_evictions_total",
+        "Quotes evicted from cache.",
+        lambda: quote_cache.stats()["evictions"],
+        metric_type="counter",
+    )
+)
+registry.register(
+    Gauge(
+        "pystock_quote_cache_size",
+        "Tickers in quote cache.",
+        lambda: quote_cache.stats()["size"],
+    )
+)
+registry.register(
+    Gauge(
+        "pystock_stream_subscribers",
+        "Clients connected to `/stream`.",
+        lambda: tick_hub.stats()["subscribers"],
+    )
+)
+
+
+@app.before_request
+def start_timer():
+    """This function records when handling of the request started."""
+    g.started = time.perf_counter()
+
+
+@app.after_request
+def record_latency(response):
+    """
+    This function records latency of the request by route. It is
+    registered before other hooks, so it runs last and includes them.
+    """
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    REQUEST_SECONDS.observe(
+        time.perf_counter() - g.started,
+        route=route,
+        method=request.method,
+        status=response.status_code,
+    )
+    return response
+
+
+@app.after_request
+def compress(response):
+    """
+    This function gzip compresses large JSON responses if client accepts
+    it (e.g. `/history` bars or big portfolios).
+    """
+    if (
+        config.COMPRESS_MIN_SIZE <= 0
+        or response.direct_passthrough
+        or response.is_streamed
+        or response.mimetype != "application/json"
+        or "Content-Encoding" in response.headers
+        or "gzip" not in request.headers.get("Accept-Encoding", "")
+        or response.content_length < config.COMPRESS_MIN_SIZE
+    ):
+        return response
+    response.set_data(gzip.compress(response.get_data(), compresslevel=5))
+    response.headers["Content-Encoding"] = "gzip"
+    response.vary.add("Accept-Encoding")
+    return response
 
 
 @app.route("/login", methods=["POST"])
@@ -14,7 +194,43 @@ def login():
     """This function handles `POST` requests done on `SERVER_ADDRESS/login`."""
     username = request.form["username"]
     password = request.form["password"]
-    return DatabaseHandler.verify_user(username, password, db_price_func)
+    try:
+        since = parse_since()
+    except ValueError:
+        return jsonify({"error": "Invalid since."})
+    return DatabaseHandler.verify_user(
+        username, password, db_price_func, since
+    )
+
+
+@app.route("/portfolio", methods=["GET", "POST"])
+def portfolio():
+    """
+    This function handles `GET` and `POST` requests done on
+    `SERVER_ADDRESS/portfolio`. The user is authenticated by session token
+    issued by `/login`, sent as `Authorization: Bearer <token>` header or
+    `token` field.
+    """
+    username = DatabaseHandler.sessions.verify(session_token())
+    if username is None:
+        return jsonify({"error": "Session expired. Please log in again."})
+    try:
+        since = parse_since()
+    except ValueError:
+        return jsonify({"error": "Invalid since."})
+    return DatabaseHandler.portfolio(
+        username, db_price_func, since, request.if_none_match
+    )
+
+
+@app.route("/logout", methods=["POST"])
+def logout():
+    """
+    This function handles `POST` requests done on `SERVER_ADDRESS/logout`.
+    """
+    if not DatabaseHandler.sessions.revoke(session_token()):
+        return jsonify({"error": "Session expired. Please log in again."})
+    return jsonify({"ack": "Logged out successfully."})
 
 
 @app.route("/signup", methods=["POST"])
@@ -35,26 +251,180 @@ def live_price():
     This function handles `POST` requests done on `SERVER_ADDRESS/live_price`.
     """
     stock_ticker = request.form["stock_ticker"]
-    price = float(si.get_live_price(stock_ticker))
-    if ".NS" in stock_ticker or ".BO" in stock_ticker:
-        price = price / CurrencyRates().get_rate("USD", "INR")
-    return jsonify({"price": price})
+    return jsonify({"price": db_price_func(stock_ticker)})
+
+
+@app.route("/quotes", methods=["POST"])
+def quotes():
+    """
+    This function handles `POST` requests done on `SERVER_ADDRESS/quotes`.
+    Tickers are supplied either as comma separated `stock_tickers` field or
+    as repeated `stock_ticker` fields.
+    """
+    stock_tickers = request.form.getlist("stock_ticker")
+    for field in request.form.getlist("stock_tickers"):
+        stock_tickers.extend(field.split(","))
+    stock_tickers = [t.strip() for t in stock_tickers if t.strip()]
+    if len(stock_tickers) == 0:
+        return jsonify({"error": "No stock ticker supplied."})
+    if len(stock_tickers) > config.MAX_BATCH_TICKERS:
+        return jsonify(
+            {
+                "error": "At most "
+                f"{config.MAX_BATCH_TICKERS} tickers can be requested."
+            }
+        )
+    return jsonify(batch_price_func(stock_tickers))
+
+
+@app.route("/cache_stats", methods=["GET"])
+def cache_stats():
+    """
+    This function handles `GET` requests done on `SERVER_ADDRESS/cache_stats`.
+    """
+    return jsonify(quote_cache.stats())
+
+
+@app.route("/fx_rates", methods=["GET"])
+def fx_rates_info():
+    """
+    This function handles `GET` requests done on `SERVER_ADDRESS/fx_rates`.
+    """
+    return jsonify(fx_rates.info())
+
+
+@app.route("/history", methods=["GET", "POST"])
+def history():
+    """
+    This function handles `GET` and `POST` requests done on
+    `SERVER_ADDRESS/history`. Bars of `stock_ticker` between `start` and
+    `end` (inclusive, "YYYY-MM-DD") are aggregated to `resolution` ("1d",
+    "1wk" or "1mo") and reduced to at most `max_points` bars by
+    `downsample` ("ohlc" or "lttb").
+    """
+    stock_ticker = request.values.get("stock_ticker", "").strip()
+    resolution = request.values.get("resolution", "1d")
+    method = request.values.get("downsample", "ohlc")
+    try:
+        start = pd.Timestamp(request.values.get("start", "2017-01-01"))
+        end = pd.Timestamp(request.values.get("end", pd.Timestamp.today()))
+        max_points = int(
+            request.values.get("max_points", config.HISTORY_MAX_POINTS)
+        )
+        assert stock_ticker and start <= end
+        assert resolution in RESOLUTIONS and method in ("ohlc", "lttb")
+        assert 0 < max_points <= config.HISTORY_MAX_POINTS
+    except (ValueError, AssertionError):
+        return jsonify({"error": "Invalid history request."})
+    try:
+        bars = history_cache.get(stock_ticker, start.normalize(), end)
+    except AssertionError:
+        return jsonify({"error": "This stock is not available."})
+    bars = downsample(resample(bars, resolution), max_points, method)
+    return jsonify(
+        {
+            "stock_ticker": stock_ticker,
+            "resolution": resolution,
+            "bars": to_columns(bars),
+        }
+    )
+
+
+@app.route("/stream", methods=["GET"])
+def stream():
+    """
+    This function handles `GET` requests done on `SERVER_ADDRESS/stream`.
+    Prices (in $) of stocks held by the user, authenticated by session token
+    like on `/portfolio`, are pushed as Server-Sent Events: a "tick" event
+    with prices keyed by ticker whenever any of them changes, starting with
+    the currently cached prices, and a comment every `STREAM_HEARTBEAT`
+    seconds otherwise. Clients must reconnect to stream tickers bought
+    later.
+    """
+    username = DatabaseHandler.sessions.verify(session_token())
+    if username is None:
+        return jsonify({"error": "Session expired. Please log in again."})
+    data = DatabaseHandler.cached_user(username)
+    if data is None:
+        return jsonify({"error": "No such user exist."})
+    subscription = tick_hub.subscribe(data["portfolio"].tickers())
+    if subscription is None:
+        return jsonify({"error": "Too many streams are open."}), 503
+    subscription.push(quote_cache.peek_many(subscription.stock_tickers))
+    return Response(
+        stream_ticks(subscription),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """
+    This function handles `GET` requests done on `SERVER_ADDRESS/metrics`.
+    Metrics are returned in Prometheus text format.
+    """
+    return Response(
+        registry.render(), content_type="text/plain; version=0.0.4"
+    )
+
+
+@app.route("/profiler", methods=["GET", "POST"])
+def profiler_control():
+    """
+    This function handles `GET` and `POST` requests done on
+    `SERVER_ADDRESS/profiler`. `GET` returns sampled stacks in folded
+    format, `POST` with `action` "start", "stop" or "reset" controls the
+    sampling profiler and returns its state. Only available if `PROFILER`
+    isn't "off", to clients sending `PROFILER_TOKEN` or, if it isn't set, to
+    clients on loopback.
+    """
+    if config.PROFILER == "off":
+        return jsonify({"error": "Profiler is disabled."}), 403
+    if config.PROFILER_TOKEN:
+        allowed = hmac.compare_digest(
+            session_token().encode(), config.PROFILER_TOKEN.encode()
+        )
+    else:
+        allowed = request.remote_addr in ("127.0.0.1", "::1")
+    if not allowed:
+        return jsonify({"error": "Profiler access denied."}), 403
+    if request.method == "GET":
+        return Response(profiler.folded(), content_type="text/plain")
+    action = request.form.get("action")
+    if action == "start":
+        profiler.start()
+    elif action == "stop":
+        profiler.stop()
+    elif action == "reset":
+        profiler.reset()
+    else:
+        return jsonify({"error": "Invalid action."})
+    return jsonify(profiler.info())
 
 
 @app.route("/update_portfolio", methods=["POST"])
 def update_portfolio():
     """
     This function handles `POST` requests done on
-    `SERVER_ADDRESS/update_portfolio`.
+    `SERVER_ADDRESS/update_portfolio`. The user is authenticated by session
+    token like on `/portfolio`.
     """
-    username = request.form["username"]
+    username = DatabaseHandler.sessions.verify(session_token())
+    if username is None:
+        return (
+            jsonify({"error": "Session expired. Please log in again."}),
+            401,
+        )
     action_type = request.form["action_type"]
     stock_ticker = request.form["stock_ticker"]
     quantity = int(request.form["quantity"])
     try:
-        stock_price = float(si.get_live_price(stock_ticker))
-        if ".NS" in stock_ticker or ".BO" in stock_ticker:
-            stock_price = stock_price / CurrencyRates().get_rate("USD", "INR")
+        since = parse_since()
+    except ValueError:
+        return jsonify({"error": "Invalid since."})
+    try:
+        stock_price = db_price_func(stock_ticker)
     except AssertionError:
         return jsonify({"error": "This stock is not available."})
     return DatabaseHandler.update_portfolio(
@@ -64,7 +434,255 @@ def update_portfolio():
         quantity,
         stock_price,
         db_price_func,
+        fx_rates.usd_rate(stock_ticker),
+        since,
+    )
+
+
+@app.route("/place_order", methods=["POST"])
+def place_order():
+    """
+    This function handles `POST` requests done on
+    `SERVER_ADDRESS/place_order`. The user is authenticated by session token
+    like on `/portfolio`. Order (`action_type`, `stock_ticker`, `quantity`,
+    `order_type` = "limit"/"stop"/"stop_limit", `limit_price`, `stop_price`
+    and `time_in_force` = "GTC"/"DAY") is matched against current price
+    right away and then rests until it is triggered, cancelled or expires.
+    """
+    username = DatabaseHandler.sessions.verify(session_token())
+    if username is None:
+        return jsonify({"error": "Session expired. Please log in again."})
+    try:
+        action_type = request.form["action_type"]
+        stock_ticker = request.form["stock_ticker"].strip()
+        quantity = int(request.form["quantity"])
+        order_type = request.form["order_type"]
+        time_in_force = request.form.get("time_in_force", "GTC")
+        limit_price = stop_price = None
+        if order_type in ("limit", "stop_limit"):
+            limit_price = float(request.form["limit_price"])
+            assert limit_price > 0
+        if order_type in ("stop", "stop_limit"):
+            stop_price = float(request.form["stop_price"])
+            assert stop_price > 0
+        assert action_type in ("BUY", "SELL") and stock_ticker
+        assert quantity > 0 and order_type in ORDER_TYPES
+        assert time_in_force in TIME_IN_FORCE
+    except (KeyError, ValueError, AssertionError):
+        return jsonify({"error": "Invalid order."})
+    try:
+        stock_price = db_price_func(stock_ticker)
+    except AssertionError:
+        return jsonify({"error": "This stock is not available."})
+    order = order_book.place(
+        username,
+        action_type,
+        stock_ticker,
+        quantity,
+        order_type,
+        limit_price,
+        stop_price,
+        time_in_force,
+        market_close(stock_ticker) if time_in_force == "DAY" else None,
     )
+    order_executor.submit(
+        match_orders, {stock_ticker: stock_price}, converted=True
+    ).result()
+    return jsonify({"order": order.to_dict()})
+
+
+@app.route("/cancel_order", methods=["POST"])
+def cancel_order():
+    """
+    This function handles `POST` requests done on
+    `SERVER_ADDRESS/cancel_order`. The user is authenticated by session
+    token like on `/portfolio`.
+    """
+    username = DatabaseHandler.sessions.verify(session_token())
+    if username is None:
+        return jsonify({"error": "Session expired. Please log in again."})
+    try:
+        order_id = int(request.form["order_id"])
+    except (KeyError, ValueError):
+        return jsonify({"error": "Invalid order."})
+    if not order_book.cancel(username, order_id):
+        return jsonify({"error": "No such open order."})
+    return jsonify({"ack": "Order has been cancelled."})
+
+
+@app.route("/orders", methods=["GET", "POST"])
+def orders():
+    """
+    This function handles `GET` and `POST` requests done on
+    `SERVER_ADDRESS/orders`. Open orders of the session's user are returned
+    followed by recently closed ones.
+    """
+    username = DatabaseHandler.sessions.verify(session_token())
+    if username is None:
+        return jsonify({"error": "Session expired. Please log in again."})
+    return jsonify({"orders": order_book.orders(username)})
+
+
+@app.route("/analytics", methods=["GET", "POST"])
+def analytics():
+    """
+    This function handles `GET` and `POST` requests done on
+    `SERVER_ADDRESS/analytics`. The user is authenticated by session token
+    like on `/portfolio`. Performance is computed over snapshots between
+    `start` and `end` ("YYYY-MM-DD", both optional).
+    """
+    username = DatabaseHandler.sessions.verify(session_token())
+    if username is None:
+        return jsonify({"error": "Session expired. Please log in again."})
+    try:
+        start, end = (
+            (
+                pd.Timestamp(request.values[field]).timestamp()
+                if request.values.get(field)
+                else None
+            )
+            for field in ("start", "end")
+        )
+        # End date is inclusive.
+        end = None if end is None else end + 86400
+        assert start is None or end is None or start < end
+    except (ValueError, AssertionError):
+        return jsonify({"error": "Invalid analytics request."})
+    return DatabaseHandler.analytics(username, known_prices, start, end)
+
+
+@app.route("/transactions", methods=["POST"])
+def transactions():
+    """
+    This function handles `POST` requests done on
+    `SERVER_ADDRESS/transactions`. The user is authenticated by session token
+    like `/portfolio`.
+    """
+    username = DatabaseHandler.sessions.verify(session_token())
+    if username is None:
+        return jsonify({"error": "Session expired. Please log in again."})
+    try:
+        page = int(request.form.get("page", 1))
+        per_page = int(request.form.get("per_page", 50))
+        assert page > 0 and 0 < per_page <= config.MAX_TRANSACTIONS_PAGE
+    except (ValueError, AssertionError):
+        return jsonify({"error": "Invalid page or per_page."})
+    return DatabaseHandler.transactions(username, page, per_page)
+
+
+def session_token():
+    """
+    This function reads session token of the request.
+
+    Args:
+        None
+
+    Returns:
+        Token from `Authorization: Bearer` header or `token` field.
+    """
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() == "bearer" and token:
+        return token.strip()
+    return request.values.get("token", "")
+
+
+def parse_since():
+    """
+    This function reads portfolio version held by the client from `since`
+    field of the request.
+
+    Args:
+        None
+
+    Returns:
+        Version or None if it isn't supplied.
+    """
+    since = request.values.get("since", "").strip()
+    return int(since) if since else None
+
+
+@contextmanager
+def track_upstream(source, exchange):
+    """
+    This function counts and times a call to upstream data provider.
+
+    Args:
+        source: Kind of the call (e.g. "live_price").
+        exchange: Exchange (or currency pair) the call is for.
+
+    Returns:
+        Context manager wrapping the call.
+    """
+    outcome = "error"
+    try:
+        with UPSTREAM_SECONDS.time(source=source, exchange=exchange):
+            yield
+        outcome = "ok"
+    finally:
+        UPSTREAM_REQUESTS.inc(
+            source=source, exchange=exchange, outcome=outcome
+        )
+
+
+def exchange_label(stock_tickers):
+    """
+    This function provides exchange label of upstream call for the given
+    stocks. Tickers aren't used as labels, as they are unbounded.
+
+    Args:
+        stock_tickers: List of Stock Tickers.
+
+    Returns:
+        Exchange suffix ("US" for US tickers) or "mixed".
+    """
+    exchanges = {
+        exchange_suffix(stock_ticker) or "US" for stock_ticker in stock_tickers
+    }
+    return exchanges.pop() if len(exchanges) == 1 else "mixed"
+
+
+def quote_cache_hit_ratio():
+    """
+    This function provides share of quote cache lookups served from cache.
+
+    Args:
+        None
+
+    Returns:
+        Ratio between 0 and 1 (0 if nothing was looked up).
+    """
+    stats = quote_cache.stats()
+    lookups = stats["hits"] + stats["misses"]
+    return stats["hits"] / lookups if lookups else 0.0
+
+
+def fetch_live_price(stock_ticker):
+    """
+    This function fetches latest price of a stock from upstream.
+
+    Args:
+        stock_ticker: Stock Ticker
+
+    Returns:
+        Latest price of the given stock (in quote currency).
+    """
+    with track_upstream("live_price", exchange_label([stock_ticker])):
+        return provider.live_price(stock_ticker)
+
+
+def fetch_fx_rate(base, quote):
+    """
+    This function fetches an FX rate from upstream.
+
+    Args:
+        base: Base currency.
+        quote: Quote currency.
+
+    Returns:
+        Price of one unit of `base` in `quote`.
+    """
+    with track_upstream("fx", f"{base}/{quote}"):
+        return provider.fx_rate(base, quote)
 
 
 def db_price_func(stock_ticker):
@@ -77,15 +695,192 @@ def db_price_func(stock_ticker):
     Returns:
         Latest price of the given stock (in $).
     """
-    stock_price = float(si.get_live_price(stock_ticker))
-    if ".NS" in stock_ticker or ".BO" in stock_ticker:
-        stock_price = stock_price / CurrencyRates().get_rate("USD", "INR")
-    return stock_price
+    return fx_rates.to_usd(stock_ticker, quote_cache.get(stock_ticker))
+
+
+def batch_price_func(stock_tickers):
+    """
+    This function provides most recent prices of the given stocks.
+
+    Args:
+        stock_tickers: List of Stock Tickers.
+
+    Returns:
+        Dictionary with "prices" (in $) and "errors" fields, both keyed by
+        ticker.
+    """
+    raw_prices, errors = quote_cache.get_many(stock_tickers)
+    prices = {}
+    for stock_ticker, price in raw_prices.items():
+        try:
+            prices[stock_ticker] = fx_rates.to_usd(stock_ticker, price)
+        except Exception as e:
+            errors[stock_ticker] = f"Currency conversion failed: {e}"
+    return {"prices": prices, "errors": errors}
+
+
+def stream_ticks(subscription):
+    """
+    This function generates events of a `/stream` response. Writing the
+    heartbeat fails once client disconnects, which ends the subscription.
+
+    Args:
+        subscription: Subscription of the client.
+
+    Returns:
+        Generator of Server-Sent Events.
+    """
+    try:
+        while True:
+            raw_prices = subscription.next(config.STREAM_HEARTBEAT)
+            if raw_prices is None:
+                return
+            prices = {}
+            for stock_ticker, price in raw_prices.items():
+                try:
+                    prices[stock_ticker] = fx_rates.to_usd(stock_ticker, price)
+                except Exception:
+                    # Sent once the rate is available and price changes.
+                    pass
+            if prices:
+                yield format_event("tick", prices)
+            else:
+                yield ": heartbeat\n\n"
+    finally:
+        tick_hub.unsubscribe(subscription)
+
+
+def schedule_orders(prices):
+    """
+    This function queues matching of resting orders against newly stored
+    prices, if any of their tickers has open orders.
+
+    Args:
+        prices: Dictionary of prices (in quote currency) keyed by ticker.
+
+    Returns:
+        None
+    """
+    if order_book.watches(prices):
+        order_executor.submit(match_orders, prices)
+
+
+def match_orders(prices, converted=False):
+    """
+    This function fills resting orders triggered by the given prices at
+    those prices. Orders which can't be filled (e.g. because of
+    insufficient balance) are rejected.
+
+    Args:
+        prices: Dictionary of prices keyed by ticker.
+        converted: Whether prices are already in $ instead of quote
+        currency.
+
+    Returns:
+        None
+    """
+    usd_prices = {}
+    for stock_ticker, price in prices.items():
+        try:
+            usd_prices[stock_ticker] = (
+                price if converted else fx_rates.to_usd(stock_ticker, price)
+            )
+        except Exception:
+            logger.exception("Currency conversion of %s failed.", stock_ticker)
+    outcomes = []
+    for order, price in order_book.match(usd_prices):
+        try:
+            _, error = DatabaseHandler.trade(
+                order.username,
+                order.action_type,
+                order.stock_ticker,
+                order.quantity,
+                price,
+                fx_rates.usd_rate(order.stock_ticker),
+            )
+        except Exception as e:
+            logger.exception("Filling order %s failed.", order.order_id)
+            error = str(e)
+        outcomes.append((order, None if error is not None else price, error))
+    order_book.complete(outcomes)
+
+
+def known_prices(stock_tickers):
+    """
+    This function provides cached prices of the given stocks, without
+    fetching missing ones.
+
+    Args:
+        stock_tickers: List of Stock Tickers.
+
+    Returns:
+        Dictionary of prices (in $) of the cached stocks.
+    """
+    prices = {}
+    for stock_ticker, price in quote_cache.peek_many(stock_tickers).items():
+        try:
+            prices[stock_ticker] = fx_rates.to_usd(stock_ticker, price)
+        except Exception:
+            pass
+    return prices
+
+
+def prewarm_prices(stock_tickers, ttl):
+    """
+    This function refreshes cached prices and FX rates of the given stocks.
+
+    Args:
+        stock_tickers: List of Stock Tickers.
+        ttl: Seconds for which refreshed prices are fresh.
+
+    Returns:
+        Dictionary of error messages keyed by ticker.
+    """
+    errors = quote_cache.refresh_many(stock_tickers, ttl)
+    for stock_ticker in stock_tickers:
+        if stock_ticker not in errors:
+            try:
+                fx_rates.usd_rate(stock_ticker)
+            except Exception as e:
+                errors[stock_ticker] = f"Currency conversion failed: {e}"
+    return errors
+
+
+def download_prices(stock_tickers):
+    """
+    This function downloads latest prices of many stocks in one request.
+
+    Args:
+        stock_tickers: List of Stock Tickers.
+
+    Returns:
+        Dictionary of latest prices (in quote currency) of the stocks for
+        which data was found.
+    """
+    with track_upstream("quotes", exchange_label(stock_tickers)):
+        return provider.latest_prices(stock_tickers)
+
+
+def download_history(stock_ticker, start):
+    """
+    This function downloads daily bars of a stock.
+
+    Args:
+        stock_ticker: Stock Ticker
+        start: First date of the bars.
+
+    Returns:
+        DataFrame of daily bars from `start` up to today indexed by date.
+    """
+    with track_upstream("history", exchange_label([stock_ticker])):
+        return provider.history(stock_ticker, start)
 
 
 def main():
     """
-    This function is the entry point of this program.
+    This function is the entry point of this program. Server is configured
+    by command line arguments, which default to environment variables (see
+    `config.py`).
 
     Args:
         None
@@ -93,7 +888,41 @@ def main():
     Returns:
         None
     """
-    app.run()
+    parser = argparse.ArgumentParser(description="PyStock API server.")
+    parser.add_argument("--host", default=config.HOST)
+    parser.add_argument("--port", type=int, default=config.PORT)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=config.WORKERS,
+        help="Number of threads serving requests.",
+    )
+    parser.add_argument(
+        "--server",
+        choices=["waitress", "dev"],
+        default=config.SERVER,
+        help="Production WSGI server or Flask's development server.",
+    )
+    parser.add_argument("--debug", action="store_true", default=config.DEBUG)
+    args = parser.parse_args()
+    app.config["DEBUG"] = args.debug
+    # Turn SIGTERM into a normal exit, so in-flight requests are drained and
+    # pending writes are flushed by the `atexit` handler.
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    if config.REFRESH_ENABLED:
+        price_refresher.start()
+    if config.SNAPSHOT_INTERVAL > 0:
+        snapshotter.start()
+    if config.PROFILER == "on":
+        profiler.start()
+    if args.server == "dev":
+        app.run(
+            host=args.host, port=args.port, debug=args.debug, threaded=True
+        )
+    else:
+        from waitress import serve
+
+        serve(app, host=args.host, port=args.port, threads=args.workers)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,270 @@
+import json
+import logging
+import os
+import threading
+import time
+import numpy as np
+
+from pathlib import Path
+from storage import write_json_atomic
+
+logger = logging.getLogger(__name__)
+
+# Record of user's totals (in $) at one point in time.
+TOTALS_DTYPE = np.dtype(
+    [("time", "<f8"), ("balance", "<f8"), ("value", "<f8")]
+)
+# Record of one holding at one point in time. Tickers are stored as indices
+# into the user's ticker list.
+HOLDINGS_DTYPE = np.dtype(
+    [
+        ("time", "<f8"),
+        ("ticker", "<u4"),
+        ("quantity", "<f8"),
+        ("investment", "<f8"),
+        ("price", "<f8"),
+    ]
+)
+
+
+def _read(path, dtype, start=None, end=None):
+    """
+    This function reads records of a time-ordered file, between `start` and
+    `end` only. The file is memory-mapped and the range is found by binary
+    search, so cost depends on the range, not on length of the file. A
+    partially written last record is ignored.
+
+    Args:
+        path: Path of the file.
+        dtype: Record type.
+        start: First UNIX timestamp or None.
+        end: Last UNIX timestamp or None.
+
+    Returns:
+        Array of records (copied out of the file).
+    """
+    count = path.stat().st_size // dtype.itemsize if path.exists() else 0
+    if count == 0:
+        return np.empty(0, dtype)
+    records = np.memmap(path, dtype, mode="r", shape=(count,))
+    times = records["time"]
+    first = 0 if start is None else np.searchsorted(times, start, "left")
+    last = count if end is None else np.searchsorted(times, end, "right")
+    return np.array(records[first:last])
+
+
+def _append(path, records):
+    """
+    This function appends records to a time-ordered file. A partially
+    written last record (crash during append) is cut off first, so that
+    appended records stay aligned.
+
+    Args:
+        path: Path of the file.
+        records: Array of records.
+
+    Returns:
+        None
+    """
+    with open(path, "ab") as file:
+        size = file.tell()
+        if size % records.dtype.itemsize:
+            file.truncate(size - size % records.dtype.itemsize)
+        file.write(records.tobytes())
+
+
+class SnapshotStore:
+    """
+    This class keeps time series of users' balance and holdings valuation
+    in compact append-only binary files: `{directory}/{username}/totals.bin`
+    (one record per snapshot), `holdings.bin` (one record per holding per
+    snapshot) and `tickers.json` (tickers indexed by holding records).
+    """
+
+    def __init__(self, directory="userdata/snapshots"):
+        """
+        Constructor for SnapshotStore
+
+        Args:
+            directory: Directory holding users' snapshots.
+
+        Returns:
+            None
+        """
+        self.directory = Path(directory)
+        # username -> (list of tickers, ticker -> index)
+        self._tickers = {}
+        self._lock = threading.Lock()
+
+    def _ticker_ids(self, username, stock_tickers):
+        """
+        This function maps tickers to indices of the user's ticker list,
+        adding unknown ones to it. Caller must hold the lock.
+
+        Args:
+            username: Username.
+            stock_tickers: List of Stock Tickers.
+
+        Returns:
+            Tuple of array of indices and whether new tickers were added.
+        """
+        entry = self._tickers.get(username)
+        if entry is None:
+            path = self.directory / username / "tickers.json"
+            tickers = []
+            if path.exists():
+                with open(path) as file:
+                    tickers = json.load(file)
+            entry = self._tickers[username] = (
+                tickers,
+                {ticker: i for i, ticker in enumerate(tickers)},
+            )
+        tickers, index = entry
+        added = False
+        for stock_ticker in stock_tickers:
+            if stock_ticker not in index:
+                index[stock_ticker] = len(tickers)
+                tickers.append(stock_ticker)
+                added = True
+        ids = np.fromiter(
+            (index[stock_ticker] for stock_ticker in stock_tickers),
+            "<u4",
+            len(stock_tickers),
+        )
+        return ids, added
+
+    def take(self, data, prices, now=None, persist=True):
+        """
+        This function values user's holdings and balance, appending them to
+        the user's series if `persist` is set.
+
+        Args:
+            data: User's data with "portfolio" as Portfolio.
+            prices: Dictionary of current prices (in $) keyed by ticker.
+            Holdings without price are valued at their last stored price.
+            now: UNIX timestamp of the snapshot. Defaults to current time.
+            persist: Whether snapshot is stored.
+
+        Returns:
+            Tuple of totals record, holdings records and user's ticker list
+            (indexed by the records).
+        """
+        now = time.time() if now is None else now
+        username = data["username"]
+        holdings = list(data["portfolio"])
+        rows = np.empty(len(holdings), HOLDINGS_DTYPE)
+        rows["time"] = now
+        rows["quantity"] = [holding.quantity for holding in holdings]
+        rows["investment"] = [holding.investment for holding in holdings]
+        rows["price"] = [
+            prices.get(holding.name, holding.cur_price) for holding in holdings
+        ]
+        totals = np.array(
+            [
+                (
+                    now,
+                    data["balance"],
+                    float(np.dot(rows["quantity"], rows["price"])),
+                )
+            ],
+            TOTALS_DTYPE,
+        )
+        with self._lock:
+            rows["ticker"], added = self._ticker_ids(
+                username, [holding.name for holding in holdings]
+            )
+            tickers = list(self._tickers[username][0])
+            if persist:
+                directory = self.directory / username
+                os.makedirs(directory, exist_ok=True)
+                # Ticker list is written first, so holding records never
+                # refer to unknown tickers.
+                if added:
+                    write_json_atomic(directory / "tickers.json", tickers)
+                _append(directory / "holdings.bin", rows)
+                _append(directory / "totals.bin", totals)
+        return totals, rows, tickers
+
+    def series(self, username, start=None, end=None):
+        """
+        This function reads the user's snapshots between `start` and `end`.
+
+        Args:
+            username: Username.
+            start: First UNIX timestamp or None.
+            end: Last UNIX timestamp or None.
+
+        Returns:
+            Tuple of totals records, holdings records and user's ticker list
+            (indexed by the records).
+        """
+        directory = self.directory / username
+        with self._lock:
+            self._ticker_ids(username, [])
+            tickers = list(self._tickers[username][0])
+        return (
+            _read(directory / "totals.bin", TOTALS_DTYPE, start, end),
+            _read(directory / "holdings.bin", HOLDINGS_DTYPE, start, end),
+            tickers,
+        )
+
+
+class Snapshotter(threading.Thread):
+    """
+    This class provides background thread which snapshots every user once
+    per `interval` seconds.
+    """
+
+    def __init__(self, usernames_func, snapshot_func, interval=3600.0):
+        """
+        Constructor for Snapshotter
+
+        Args:
+            usernames_func: Function returning usernames of all users.
+            snapshot_func: Function taking username which snapshots the
+            user.
+            interval: Seconds between snapshots of a user.
+
+        Returns:
+            None
+        """
+        threading.Thread.__init__(self, name="snapshotter", daemon=True)
+        self._usernames_func = usernames_func
+        self._snapshot_func = snapshot_func
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def run(self):
+        """
+        This function snapshots all users until the thread is stopped.
+
+        Args:
+            None
+
+        Returns:
+            None
+        """
+        while not self._stop_event.is_set():
+            started = time.monotonic()
+            for username in self._usernames_func():
+                if self._stop_event.is_set():
+                    return
+                try:
+                    self._snapshot_func(username)
+                except Exception:
+                    logger.exception("Snapshot of %s failed.", username)
+            self._stop_event.wait(
+                max(0.0, self.interval - (time.monotonic() - started))
+            )
+
+    def stop(self):
+        """
+        This function stops the thread after its current snapshot.
+
+        Args:
+            None
+
+        Returns:
+            None
+        """
+        self._stop_event.set()
@@ -0,0 +1,532 @@
+import os
+import json
+import config
+import sqlite3
+import tempfile
+import threading
+import time
+
+from pathlib import Path
+from portfolio import Holding, Portfolio, decode_user, encode_user
+
+
+def write_json_atomic(path, data):
+    """
+    This function atomically replaces the given file with data in JSON
+    format. Data is written to a temporary file which is renamed over the
+    target, so a crash never leaves a partially written file behind.
+
+    Args:
+        path: Path of the file.
+        data: Data to be stored.
+
+    Returns:
+        None
+    """
+    path = Path(path)
+    fd, tmp_path = tempfile.mkstemp(
+        dir=path.parent, prefix=f".{path.name}.", suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, "w") as file:
+            json.dump(data, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+class StorageBackend:
+    """
+    This class describes the interface every user storage backend provides.
+    User data is exchanged in the JSON format the API returns, except that
+    "portfolio" is a `portfolio.Portfolio`. Callers
+    are expected to serialize read-modify-write of a single user (see
+    `DatabaseHandler.user_lock`).
+    """
+
+    def user_exists(self, username):
+        """
+        This function checks whether the given user exists.
+
+        Args:
+            username: Username.
+
+        Returns:
+            True if user exists otherwise False.
+        """
+        return self.load_user(username) is not None
+
+    def load_user(self, username):
+        """
+        This function loads the given user's data.
+
+        Args:
+            username: Username.
+
+        Returns:
+            User's data or None if user doesn't exist.
+        """
+        raise NotImplementedError
+
+    def create_user(self, data):
+        """
+        This function stores a new user.
+
+        Args:
+            data: User's data.
+
+        Returns:
+            True if user was created, False if username is already taken.
+        """
+        raise NotImplementedError
+
+    def save_user(self, data, changed=None, trade=None):
+        """
+        This function persists the given user's data.
+
+        Args:
+            data: User's data.
+            changed: Tickers whose holdings changed. If None, all holdings
+            are persisted.
+            trade: Dictionary describing the trade which caused the change
+            (action, ticker, quantity, price, fx_rate, timestamp) or None.
+
+        Returns:
+            None
+        """
+        raise NotImplementedError
+
+    def transactions(self, username, offset=0, limit=50):
+        """
+        This function provides the given user's trades, newest first.
+
+        Args:
+            username: Username.
+            offset: Number of newest trades to skip.
+            limit: Maximum number of trades returned.
+
+        Returns:
+            Tuple of list of trades (action, ticker, quantity, price,
+            fx_rate and timestamp) and total number of trades.
+        """
+        raise NotImplementedError(
+            "Trade history is not kept by this storage backend."
+        )
+
+    def usernames(self):
+        """
+        This function lists all users.
+
+        Args:
+            None
+
+        Returns:
+            List of usernames.
+        """
+        raise NotImplementedError
+
+    def holders(self, stock_ticker):
+        """
+        This function finds all users holding the given stock.
+
+        Args:
+            stock_ticker: Stock Ticker
+
+        Returns:
+            Dictionary of username -> quantity held.
+        """
+        holders = {}
+        for username in self.usernames():
+            holding = self.load_user(username)["portfolio"].get(stock_ticker)
+            if holding is not None and holding.quantity > 0:
+                holders[username] = holding.quantity
+        return holders
+
+    def all_tickers(self):
+        """
+        This function collects tickers held by any user.
+
+        Args:
+            None
+
+        Returns:
+            Set of Stock Tickers.
+        """
+        tickers = set()
+        for username in self.usernames():
+            tickers.update(self.load_user(username)["portfolio"].tickers())
+        return tickers
+
+    def close(self):
+        """
+        This function flushes and releases resources held by the backend.
+
+        Args:
+            None
+
+        Returns:
+            None
+        """
+
+
+class JSONStorage(StorageBackend):
+    """
+    This class stores every user as a JSON document named
+    `{directory}/{username}.json`.
+    """
+
+    def __init__(self, directory="userdata"):
+        """
+        Constructor for JSONStorage
+
+        Args:
+            directory: Directory holding user documents.
+
+        Returns:
+            None
+        """
+        self.directory = Path(directory)
+
+    def _path(self, username):
+        """
+        This function provides path of the given user's document.
+
+        Args:
+            username: Username.
+
+        Returns:
+            Path of the document.
+        """
+        return self.directory / f"{username}.json"
+
+    def user_exists(self, username):
+        return os.path.isfile(self._path(username))
+
+    def load_user(self, username):
+        if not self.user_exists(username):
+            return None
+        with open(self._path(username)) as file:
+            return decode_user(json.load(file))
+
+    def create_user(self, data):
+        if self.user_exists(data["username"]):
+            return False
+        write_json_atomic(self._path(data["username"]), encode_user(data))
+        return True
+
+    def save_user(self, data, changed=None, trade=None):
+        write_json_atomic(self._path(data["username"]), encode_user(data))
+
+    def usernames(self):
+        return sorted(path.stem for path in self.directory.glob("*.json"))
+
+
+class SQLiteStorage(StorageBackend):
+    """
+    This class stores users, their holdings and trades in a SQLite database
+    running in WAL mode. Only holdings touched by a trade are rewritten.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS users (
+            username TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            email TEXT NOT NULL,
+            password TEXT NOT NULL,
+            balance REAL NOT NULL,
+            portfolio_value REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS holdings (
+            username TEXT NOT NULL REFERENCES users(username),
+            ticker TEXT NOT NULL,
+            quantity INTEGER NOT NULL,
+            investment REAL NOT NULL,
+            cur_price REAL NOT NULL,
+            PRIMARY KEY (username, ticker)
+        );
+        CREATE INDEX IF NOT EXISTS holdings_ticker ON holdings(ticker);
+        CREATE TABLE IF NOT EXISTS transactions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT NOT NULL REFERENCES users(username),
+            action TEXT NOT NULL,
+            ticker TEXT NOT NULL,
+            quantity INTEGER NOT NULL,
+            price REAL NOT NULL,
+            fx_rate REAL NOT NULL,
+            timestamp REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS transactions_username
+            ON transactions(username, id);
+        CREATE INDEX IF NOT EXISTS transactions_ticker
+            ON transactions(ticker);
+    """
+
+    def __init__(self, path="userdata/pystock.db"):
+        """
+        Constructor for SQLiteStorage
+
+        Args:
+            path: Path of the database file.
+
+        Returns:
+            None
+        """
+        self.path = str(path)
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        # Connections can't be shared between threads, so each thread
+        # serving requests gets its own.
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(self.SCHEMA)
+
+    def _connection(self):
+        """
+        This function provides connection owned by the calling thread.
+
+        Args:
+            None
+
+        Returns:
+            sqlite3.Connection
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(
+                self.path, timeout=30, check_same_thread=False
+            )
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def user_exists(self, username):
+        return (
+            self._connection()
+            .execute("SELECT 1 FROM users WHERE username = ?", (username,))
+            .fetchone()
+            is not None
+        )
+
+    def load_user(self, username):
+        conn = self._connection()
+        row = conn.execute(
+            "SELECT name, username, email, password, balance, "
+            "portfolio_value FROM users WHERE username = ?",
+            (username,),
+        ).fetchone()
+        if row is None:
+            return None
+        data = dict(
+            zip(
+                (
+                    "name",
+                    "username",
+                    "email",
+                    "password",
+                    "balance",
+                    "portfolio_value",
+                ),
+                row,
+            )
+        )
+        data["portfolio"] = Portfolio(
+            Holding(*row)
+            for row in conn.execute(
+                "SELECT ticker, quantity, investment, cur_price FROM holdings "
+                "WHERE username = ? ORDER BY rowid",
+                (username,),
+            )
+        )
+        return data
+
+    def create_user(self, data):
+        conn = self._connection()
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT INTO users VALUES (?, ?, ?, ?, ?, ?)",
+                    (
+                        data["username"],
+                        data["name"],
+                        data["email"],
+                        data["password"],
+                        data["balance"],
+                        data["portfolio_value"],
+                    ),
+                )
+                self._write_holdings(
+                    conn, data["username"], data["portfolio"], None
+                )
+        except sqlite3.IntegrityError:
+            return False
+        return True
+
+    def save_user(self, data, changed=None, trade=None):
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "UPDATE users SET name = ?, email = ?, password = ?, "
+                "balance = ?, portfolio_value = ? WHERE username = ?",
+                (
+                    data["name"],
+                    data["email"],
+                    data["password"],
+                    data["balance"],
+                    data["portfolio_value"],
+                    data["username"],
+                ),
+            )
+            self._write_holdings(
+                conn, data["username"], data["portfolio"], changed
+            )
+            if trade is not None:
+                conn.execute(
+                    "INSERT INTO transactions (username, action, ticker, "
+                    "quantity, price, fx_rate, timestamp) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        data["username"],
+                        trade["action"],
+                        trade["ticker"],
+                        trade["quantity"],
+                        trade["price"],
+                        trade.get("fx_rate", 1.0),
+                        trade.get("timestamp", time.time()),
+                    ),
+                )
+
+    def _write_holdings(self, conn, username, portfolio, changed):
+        """
+        This function upserts holdings of the given tickers and deletes the
+        ones no longer present in portfolio.
+
+        Args:
+            conn: Connection with an open transaction.
+            username: Username.
+            portfolio: User's Portfolio.
+            changed: Tickers to be written or None for all.
+
+        Returns:
+            None
+        """
+        if changed is None:
+            conn.execute(
+                "DELETE FROM holdings WHERE username = ?", (username,)
+            )
+            changed = portfolio.tickers()
+        for stock_ticker in changed:
+            holding = portfolio.get(stock_ticker)
+            if holding is None:
+                conn.execute(
+                    "DELETE FROM holdings WHERE username = ? AND ticker = ?",
+                    (username, stock_ticker),
+                )
+            else:
+                conn.execute(
+                    "INSERT INTO holdings VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT (username, ticker) DO UPDATE SET "
+                    "quantity = excluded.quantity, "
+                    "investment = excluded.investment, "
+                    "cur_price = excluded.cur_price",
+                    (
+                        username,
+                        stock_ticker,
+                        holding.quantity,
+                        holding.investment,
+                        holding.cur_price,
+                    ),
+                )
+
+    def transactions(self, username, offset=0, limit=50):
+        conn = self._connection()
+        rows = conn.execute(
+            "SELECT action, ticker, quantity, price, fx_rate, timestamp "
+            "FROM transactions WHERE username = ? ORDER BY id DESC "
+            "LIMIT ? OFFSET ?",
+            (username, limit, offset),
+        )
+        trades = [
+            dict(
+                zip(
+                    (
+                        "action",
+                        "ticker",
+                        "quantity",
+                        "price",
+                        "fx_rate",
+                        "timestamp",
+                    ),
+                    row,
+                )
+            )
+            for row in rows
+        ]
+        total = conn.execute(
+            "SELECT COUNT(*) FROM transactions WHERE username = ?",
+            (username,),
+        ).fetchone()[0]
+        return trades, total
+
+    def usernames(self):
+        return [
+            row[0]
+            for row in self._connection().execute(
+                "SELECT username FROM users ORDER BY username"
+            )
+        ]
+
+    def holders(self, stock_ticker):
+        return dict(
+            self._connection().execute(
+                "SELECT username, quantity FROM holdings "
+                "WHERE ticker = ? AND quantity > 0",
+                (stock_ticker,),
+            )
+        )
+
+    def all_tickers(self):
+        return {
+            row[0]
+            for row in self._connection().execute(
+                "SELECT DISTINCT ticker FROM holdings"
+            )
+        }
+
+    def close(self):
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections = []
+        self._local = threading.local()
+
+
+def create_storage(backend, path):
+    """
+    This function creates storage backend of the given kind.
+
+    Args:
+        backend: "json", "sqlite" or "ledger".
+        path: Directory of JSON documents, path of SQLite database or
+        directory of trade ledgers.
+
+    Returns:
+        StorageBackend
+    """
+    if backend == "json":
+        return JSONStorage(path)
+    if backend == "sqlite":
+        return SQLiteStorage(path)
+    if backend == "ledger":
+        # Imported here as ledger builds on this module.
+        from ledger import LedgerStorage
+
+        return LedgerStorage(path, config.LEDGER_SNAPSHOT_INTERVAL)
+    raise ValueError(f"Unknown storage backend: {backend}")
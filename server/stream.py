@@ -0,0 +1,212 @@
+import json
+import threading
+
+
+def format_event(event, data):
+    """
+    This function formats an event of Server-Sent Events stream.
+
+    Args:
+        event: Name of the event.
+        data: JSON serializable payload of the event.
+
+    Returns:
+        Event as string.
+    """
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class Subscription:
+    """
+    This class represents a client streaming prices of some tickers. Prices
+    published while the client is busy are merged, so that a slow client
+    only receives latest price of each ticker instead of a growing backlog.
+    """
+
+    def __init__(self, stock_tickers):
+        """
+        Constructor for Subscription
+
+        Args:
+            stock_tickers: Tickers whose prices are streamed.
+
+        Returns:
+            None
+        """
+        self.stock_tickers = frozenset(stock_tickers)
+        self.closed = False
+        # ticker -> latest price not sent yet
+        self._pending = {}
+        # ticker -> last price sent, so unchanged prices aren't sent again.
+        self._sent = {}
+        self._condition = threading.Condition()
+
+    def push(self, prices):
+        """
+        This function queues prices of the subscribed tickers.
+
+        Args:
+            prices: Dictionary of prices keyed by ticker.
+
+        Returns:
+            None
+        """
+        with self._condition:
+            for stock_ticker, price in prices.items():
+                if self._sent.get(stock_ticker) != price:
+                    self._pending[stock_ticker] = price
+                else:
+                    self._pending.pop(stock_ticker, None)
+            if self._pending:
+                self._condition.notify()
+
+    def next(self, timeout):
+        """
+        This function waits for queued prices.
+
+        Args:
+            timeout: Seconds to wait.
+
+        Returns:
+            Dictionary of prices keyed by ticker (empty if none arrived in
+            time) or None if subscription was closed.
+        """
+        with self._condition:
+            if not self._pending and not self.closed:
+                self._condition.wait(timeout)
+            if self.closed:
+                return None
+            prices, self._pending = self._pending, {}
+            self._sent.update(prices)
+            return prices
+
+    def close(self):
+        """
+        This function ends the subscription, waking up its client.
+
+        Args:
+            None
+
+        Returns:
+            None
+        """
+        with self._condition:
+            self.closed = True
+            self._condition.notify()
+
+
+class TickHub:
+    """
+    This class fans out price updates to streaming clients. Each client
+    subscribes to its tickers and only receives prices of those.
+    """
+
+    def __init__(self, max_subscribers=4):
+        """
+        Constructor for TickHub
+
+        Args:
+            max_subscribers: Maximum number of concurrent subscriptions.
+            Every streaming client holds one serving thread.
+
+        Returns:
+            None
+        """
+        self.max_subscribers = max_subscribers
+        # ticker -> set of Subscription
+        self._subscribers = {}
+        self._active = set()
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def subscribe(self, stock_tickers):
+        """
+        This function registers a new client.
+
+        Args:
+            stock_tickers: Tickers whose prices are streamed.
+
+        Returns:
+            Subscription or None if too many clients are subscribed.
+        """
+        subscription = Subscription(stock_tickers)
+        with self._lock:
+            if self._closed or len(self._active) >= self.max_subscribers:
+                return None
+            self._active.add(subscription)
+            for stock_ticker in subscription.stock_tickers:
+                self._subscribers.setdefault(stock_ticker, set()).add(
+                    subscription
+                )
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """
+        This function removes a client.
+
+        Args:
+            subscription: Subscription of the client.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            for stock_ticker in subscription.stock_tickers:
+                subscribers = self._subscribers.get(stock_ticker)
+                if subscribers is not None and subscription in subscribers:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._subscribers[stock_ticker]
+            self._active.discard(subscription)
+        subscription.close()
+
+    def publish(self, prices):
+        """
+        This function queues prices for clients subscribed to them.
+
+        Args:
+            prices: Dictionary of prices keyed by ticker.
+
+        Returns:
+            None
+        """
+        updates = {}
+        with self._lock:
+            for stock_ticker, price in prices.items():
+                for subscription in self._subscribers.get(stock_ticker, ()):
+                    updates.setdefault(subscription, {})[stock_ticker] = price
+        for subscription, subscribed_prices in updates.items():
+            subscription.push(subscribed_prices)
+
+    def close(self):
+        """
+        This function ends all subscriptions, e.g. on shutdown.
+
+        Args:
+            None
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._closed = True
+            subscriptions = list(self._active)
+        for subscription in subscriptions:
+            subscription.close()
+
+    def stats(self):
+        """
+        This function provides counters of the hub.
+
+        Args:
+            None
+
+        Returns:
+            Dictionary with number of subscribers and streamed tickers.
+        """
+        with self._lock:
+            return {
+                "subscribers": len(self._active),
+                "max_subscribers": self.max_subscribers,
+                "tickers": len(self._subscribers),
+            }
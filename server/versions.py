@@ -0,0 +1,138 @@
+import threading
+import time
+
+from collections import OrderedDict
+
+
+class _UserVersions:
+    """This class represents versions of one user's portfolio."""
+
+    __slots__ = ("version", "known_since", "totals", "holdings", "removed")
+
+    def __init__(self, version):
+        """
+        Constructor for _UserVersions
+
+        Args:
+            version: Version at which tracking of the user started.
+
+        Returns:
+            None
+        """
+        self.version = version
+        # Changes before this version are unknown.
+        self.known_since = version
+        self.totals = None
+        # ticker -> (quantity, investment, cur_price, version of change)
+        self.holdings = {}
+        # ticker -> version at which it was sold entirely
+        self.removed = {}
+
+
+class PortfolioVersions:
+    """
+    This class assigns versions to users' portfolios as they are sent to
+    clients, remembering which version changed each holding, so that a
+    client holding an older version can be sent only the holdings which
+    changed since. Versions are only kept in memory; they start from the
+    server's start time in milliseconds, so versions issued before a restart
+    are recognized as unknown. Least recently seen users are forgotten once
+    `max_users` users are tracked.
+    """
+
+    def __init__(self, max_users=10000):
+        """
+        Constructor for PortfolioVersions
+
+        Args:
+            max_users: Maximum number of users whose versions are kept.
+
+        Returns:
+            None
+        """
+        self.max_users = max_users
+        self._version = int(time.time() * 1000)
+        # username -> _UserVersions
+        self._users = OrderedDict()
+        self._lock = threading.Lock()
+
+    def observe(self, data, since=None):
+        """
+        This function records current state of user's portfolio, giving it
+        a new version if anything changed since it was last observed, and
+        lists holdings which changed after the version held by the client.
+
+        Args:
+            data: User's data with "portfolio" as Portfolio.
+            since: Version held by the client or None.
+
+        Returns:
+            Tuple of version of the user's portfolio and changes since
+            `since`: tuple of list of changed tickers and list of tickers
+            sold entirely, or None if they are unknown (or not requested).
+        """
+        totals = (
+            data["balance"],
+            data["portfolio_value"],
+            tuple(sorted(data.get("stale_prices", ()))),
+        )
+        holdings = {
+            holding.name: (
+                holding.quantity,
+                holding.investment,
+                holding.cur_price,
+            )
+            for holding in data["portfolio"]
+        }
+        with self._lock:
+            user = self._users.get(data["username"])
+            if user is None:
+                self._version += 1
+                user = self._users[data["username"]] = _UserVersions(
+                    self._version
+                )
+                while len(self._users) > self.max_users:
+                    self._users.popitem(last=False)
+            self._users.move_to_end(data["username"])
+            changed = [
+                stock_ticker
+                for stock_ticker, values in holdings.items()
+                if user.holdings.get(stock_ticker, (None,))[:3] != values
+            ]
+            removed = [
+                stock_ticker
+                for stock_ticker in user.holdings
+                if stock_ticker not in holdings
+            ]
+            if user.totals is not None and (
+                changed or removed or user.totals != totals
+            ):
+                self._version += 1
+                user.version = self._version
+            user.totals = totals
+            for stock_ticker in changed:
+                user.holdings[stock_ticker] = holdings[stock_ticker] + (
+                    user.version,
+                )
+                user.removed.pop(stock_ticker, None)
+            for stock_ticker in removed:
+                del user.holdings[stock_ticker]
+                user.removed[stock_ticker] = user.version
+            if (
+                since is None
+                or since < user.known_since
+                or since > user.version
+            ):
+                return user.version, None
+            return user.version, (
+                [
+                    stock_ticker
+                    for stock_ticker, values in user.holdings.items()
+                    if values[3] > since
+                ],
+                [
+                    stock_ticker
+                    for stock_ticker, version in user.removed.items()
+                    if version > since
+                ],
+            )
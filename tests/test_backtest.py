@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+
+from backtest import (
+    STARTING_BALANCE,
+    RSIReversion,
+    SMACrossover,
+    backtest,
+    simulate,
+)
+
+
+def make_bars(close):
+    close = np.asarray(close, dtype=float)
+    return pd.DataFrame(
+        {
+            "Open": close,
+            "High": close,
+            "Low": close,
+            "Close": close,
+            "Adj Close": close,
+            "Volume": 1.0,
+        },
+        index=pd.date_range("2020-01-01", periods=len(close), freq="B"),
+    )
+
+
+def test_simulate_without_signal_keeps_balance():
+    # Default slow SMA needs 200 bars, so target never changes.
+    bars = make_bars(np.linspace(100, 150, 150))
+    equity, trades = simulate(bars, SMACrossover())
+    assert len(trades) == 0
+    assert list(trades.columns)[:3] == ["date", "action", "quantity"]
+    assert (equity == STARTING_BALANCE).all()
+    assert equity.index.equals(bars.index)
+
+
+def test_simulate_flat_rsi_in_process_pool():
+    bars = {"FLAT": make_bars(np.full(300, 100.0))}
+    results = backtest(bars, RSIReversion, {"low": [20, 30]}, processes=2)
+    assert [result["metrics"]["trades"] for result in results] == [0, 0]
+    assert all(
+        result["metrics"]["final_equity"] == STARTING_BALANCE
+        for result in results
+    )
+
+
+def test_simulate_trades_whole_stocks():
+    bars = make_bars(np.linspace(30, 60, 16))
+    equity, trades = simulate(bars, SMACrossover(fast=1, slow=3), fill="close")
+    assert trades["error"].isna().all()
+    assert (trades["quantity"] % 1 == 0).all()
+    # Bought 294 stocks at 34 once 3 bars were known, held until the end.
+    assert trades[["action", "quantity", "price"]].values.tolist() == [
+        ["BUY", 294, 34.0]
+    ]
+    assert equity.iloc[-1] == STARTING_BALANCE - 294 * 34 + 294 * 60